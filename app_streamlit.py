@@ -1,42 +1,75 @@
+import os
+import threading
 import cv2
 import streamlit as st
-from utils.mapping import load_calibration, pixel_to_robot
+from utils.camera import Camera
+from utils.mapping import load_calibration, load_workspace_roi
+from utils.writer import annotate
 from perception.detector import ObjectDetector
-import os
+from perception.pipeline import VisionPipeline
+
+
+@st.cache_resource
+def get_state():
+    """One pipeline per app process, shared by reruns, and the camera it streams from"""
+    pipeline = VisionPipeline(ObjectDetector(), load_calibration(), roi=load_workspace_roi())
+    return {"pipeline": pipeline, "camera_index": None, "lock": threading.Lock()}
 
-root_path = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
+def get_pipeline(camera_index):
+    """
+    The shared pipeline, streaming from camera_index
+
+    Switching index stops the previous camera. When the camera does not
+    open, pipeline.camera is None and opening is retried on the next call.
+    """
+    state = get_state()
+    pipeline = state["pipeline"]
+    with state["lock"]:
+        if state["camera_index"] != camera_index:
+            if pipeline.camera is not None:
+                pipeline.camera.stop()
+                pipeline.camera = None
+                state["camera_index"] = None
+            try:
+                camera = Camera(camera_index)
+            except RuntimeError as e:
+                st.warning(f"{e} Detecting the image file instead.")
+            else:
+                camera.start()
+                pipeline.camera = camera
+                state["camera_index"] = camera_index
+    return pipeline
 
-# Get the directory where app_streamlit.py is located
-current_dir = os.path.dirname(__file__)
-# Go up one level to the project root, then into 'outputs'
-OUTPUT_FOLDER = os.path.join(current_dir, "..", "outputs")
-image_path = os.path.join(OUTPUT_FOLDER, "last_capture.jpg")
 
 st.title("MG400 Vision System")
 
 # Sidebar Controls
 st.sidebar.header("Settings")
 mode = st.sidebar.radio("Operation Mode", ["Plan", "Execute"])
-color = st.sidebar.selectbox("Target Color", ["any", "red", "blue", "green"])
+color = st.sidebar.selectbox("Target Color", ["any", "all", "red", "blue", "green"])
+camera_index = st.sidebar.number_input("Camera Index", min_value=0, value=0, step=1)
+image_path = st.sidebar.text_input("Image File (without a camera)",
+                                   os.path.join("outputs", "camera_detection.png"))
 confirm_exec = st.sidebar.checkbox("Safety: Confirm Execution")
 
 if st.button("Capture & Detect"):
-    img = cv2.imread(image_path)  # Capture logic here
-    H = load_calibration()
-    detector = ObjectDetector()
-
-    results = detector.find_objects(img, color)
-
-    for obj in results:
-        u, v = obj["pixel_center"]
-        rx, ry = pixel_to_robot(u, v, H)
-
-        # Annotate image
-        cv2.circle(img, (u, v), 10, (0, 255, 0), -1)
-        cv2.putText(img, f"X:{rx:.1f} Y:{ry:.1f}", (u+15, v),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    pipeline = get_pipeline(int(camera_index))
+    if pipeline.camera is not None:
+        # Next frame from the camera's ring buffer, never a file on disk
+        result = pipeline.run_once(color)
+        if result is None:
+            st.error(pipeline.camera.error or "Camera capture failed.")
+            st.stop()
+    else:
+        frame = cv2.imread(image_path)
+        if frame is None:
+            st.error(f"{image_path} not found.")
+            st.stop()
+        result = pipeline.process(frame, color)
+    results = result["detections"]
 
+    img = annotate(result["frame"], results, result["targets"])
     st.image(img, channels="BGR", caption="Processed Scene")
 
     if mode == "Execute" and confirm_exec:
@@ -0,0 +1,139 @@
+"""
+Command throughput: blocking DobotApi vs the asyncio client
+
+Against the local simulator, sends the same commands three ways:
+    - sync: DobotApiDashboard, one round-trip per call (sendRecvMsg)
+    - async, awaited one by one: same round-trips on the event loop
+    - async, pipelined: all commands in flight at once, written in one send
+
+for a burst of dashboard queries, and for queueing one pick-and-place
+sequence (MovJ/MovL/DO/wait commands) before the arm starts it (median of
+PICK_REPEATS sequences). The simulator runs in this process, so both
+clients share the interpreter with it: compare the modes, not the
+absolute numbers.
+
+Run from the project root:
+    python -m benchmarks.bench_async [--commands 500] [--ip 127.0.0.1]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+from robot.dobot_api import DobotApiDashboard
+from robot.dobot_async import ConnectRobotAsync, WaitStateAsync
+from robot.simulator import MG400Simulator
+
+PICK_REPEATS = 20
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def sync_burst(ip, commands):
+    with quiet():
+        dashboard = DobotApiDashboard(ip, 29999)
+        start = time.perf_counter()
+        for _ in range(commands):
+            dashboard.RobotMode()
+        elapsed = time.perf_counter() - start
+        dashboard.close()
+    return elapsed
+
+
+def queue_pick(dashboard, move):
+    """The command sequence of MG400Controller.pick_and_place_queued"""
+    return [move.MovJ(300, -50, -75, 0), move.MovL(300, -50, -165, 0),
+            dashboard.DO(1, 1), dashboard.wait(300),
+            move.MovL(300, -50, -75, 0),
+            move.MovJIO(275, -125, -75, 0, "{0,100,1,0}", "{0,100,2,1}"),
+            dashboard.wait(300), dashboard.DO(2, 0)]
+
+
+async def async_runs(ip, commands):
+    dashboard, move, feed = await ConnectRobotAsync(ip, log=False)
+    await dashboard.EnableRobot()
+    await WaitStateAsync(feed.state, lambda s: s.enabled, ("enabled",), timeout=2.0)
+
+    start = time.perf_counter()
+    for _ in range(commands):
+        await dashboard.RobotMode()
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*[dashboard.RobotMode() for _ in range(commands)])
+    pipelined = time.perf_counter() - start
+
+    times = []
+    for _ in range(PICK_REPEATS):
+        start = time.perf_counter()
+        await asyncio.gather(*queue_pick(dashboard, move))
+        times.append(time.perf_counter() - start)
+    queued_pick = statistics.median(times)
+    await move.Sync()
+
+    # The event loop stays free while the arm moves
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    task = asyncio.get_running_loop().create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*queue_pick(dashboard, move))
+    await move.Sync()
+    motion = time.perf_counter() - start
+    task.cancel()
+
+    await dashboard.aclose()
+    await move.aclose()
+    await feed.aclose()
+    return serial, pipelined, queued_pick, ticks / motion
+
+
+def sync_pick(ip):
+    from robot.dobot_api import DobotApiMove
+    with quiet():
+        dashboard = DobotApiDashboard(ip, 29999)
+        move = DobotApiMove(ip, 30003)
+        times = []
+        for _ in range(PICK_REPEATS):
+            start = time.perf_counter()
+            queue_pick(dashboard, move)
+            times.append(time.perf_counter() - start)
+        move.Sync()
+        dashboard.close()
+        move.close()
+    return statistics.median(times)
+
+
+def run_benchmark(ip="127.0.0.1", commands=500):
+    with MG400Simulator(ip):
+        sync_s = sync_burst(ip, commands)
+        serial_s, pipelined_s, async_pick_s, tick_rate = asyncio.run(async_runs(ip, commands))
+        sync_pick_s = sync_pick(ip)
+
+    print(f"{commands} dashboard queries")
+    print(f"  sync DobotApi:       {sync_s * 1000:7.1f} ms ({commands / sync_s:8.0f} cmd/s)")
+    print(f"  async, one by one:   {serial_s * 1000:7.1f} ms ({commands / serial_s:8.0f} cmd/s)")
+    print(f"  async, pipelined:    {pipelined_s * 1000:7.1f} ms ({commands / pipelined_s:8.0f} cmd/s)")
+    print(f"Queueing one pick sequence (8 commands, median of {PICK_REPEATS})")
+    print(f"  sync DobotApi:       {sync_pick_s * 1000:7.2f} ms")
+    print(f"  async, pipelined:    {async_pick_s * 1000:7.2f} ms")
+    print(f"Event loop ticks while the arm moved: {tick_rate:.0f}/s (1 ms sleeps)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio client benchmark")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--commands", type=int, default=500)
+    args = parser.parse_args()
+    run_benchmark(args.ip, args.commands)
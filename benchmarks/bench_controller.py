@@ -0,0 +1,121 @@
+"""
+MG400Controller benchmark against the local simulator
+
+Starts robot/simulator.py on a loopback address and measures:
+    - connect + setup time of MG400Controller, and until the first motion
+    - dashboard command round-trip latency
+    - feedback packet rate on port 30004
+    - pick_and_place cycle time, blocking and queued (pick_and_place_queued)
+    - CPU used by the calling thread per blocking cycle
+    - share of the blocking cycle the arm is moving (feedback telemetry)
+
+Run from the project root:
+    python -m benchmarks.bench_controller [--picks N] [--ip 127.0.0.1]
+"""
+
+import argparse
+import contextlib
+import io
+import socket
+import time
+import numpy as np
+from robot.main import MG400Controller
+from robot.simulator import MG400Simulator, FEED_PORT
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the per-command prints of the Dobot API while timing"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def feedback_rate(ip, duration=1.0):
+    """Packets per second received on the feedback port"""
+    sock = socket.create_connection((ip, FEED_PORT))
+    sock.settimeout(1.0)
+    received = 0
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        received += len(sock.recv(65536))
+    sock.close()
+    return received / 1440 / duration
+
+
+def run_benchmark(ip="127.0.0.1", picks=2, targets=None):
+    if targets is None:
+        targets = [(300.0, -50.0), (350.0, 50.0), (275.0, 100.0)]
+
+    with MG400Simulator(ip):
+        start = time.monotonic()
+        with quiet():
+            bot = MG400Controller(ip=ip)
+        setup_s = time.monotonic() - start
+        with quiet():
+            home = bot.state.snapshot()["pose"]
+            x, y = targets[0]
+            bot.move.MovJ(x, y, bot.safe_z, bot.safe_r)
+            bot.state.wait_for(lambda s: s.running, fields=("running",), timeout=5.0)
+            first_motion_s = time.monotonic() - start
+            # Back to the start pose so the timed cycles are unaffected
+            bot.move.MovJ(*home[:4])
+            bot.move.Sync()
+
+        with quiet():
+            latencies = []
+            for _ in range(200):
+                t0 = time.perf_counter()
+                bot.dashboard.RobotMode()
+                latencies.append(time.perf_counter() - t0)
+        latencies = np.array(latencies) * 1000.0
+
+        rate = feedback_rate(ip)
+
+        cycle_times = []
+        blocking_start = time.monotonic()
+        cpu_start = time.thread_time()
+        for i in range(picks):
+            x, y = targets[i % len(targets)]
+            t0 = time.monotonic()
+            with quiet():
+                bot.pick_and_place(x, y)
+            cycle_times.append(time.monotonic() - t0)
+        # CPU spent by the calling thread, mostly waiting for motion to finish
+        wait_cpu_ms = (time.thread_time() - cpu_start) / picks * 1000.0
+        # Where the blocking cycle time went, from the feedback history
+        moves = bot.telemetry.moves(blocking_start, time.monotonic())
+        moving = bot.telemetry.utilization(blocking_start, time.monotonic())
+
+        batch = [targets[i % len(targets)] for i in range(picks)]
+        t0 = time.monotonic()
+        with quiet():
+            bot.run_queued(batch)
+        queued_s = (time.monotonic() - t0) / picks
+
+        with quiet():
+            bot.disconnect()
+
+    print(f"Connect + setup:        {setup_s:.2f} s (first motion after {first_motion_s:.2f} s)")
+    print(f"Dashboard round-trip:   median {np.median(latencies):.3f} ms, "
+          f"p99 {np.percentile(latencies, 99):.3f} ms")
+    print(f"Feedback rate:          {rate:.0f} packets/s")
+    print(f"Pick-and-place cycle:   mean {np.mean(cycle_times):.2f} s "
+          f"over {picks} picks ({60.0 / np.mean(cycle_times):.1f} picks/min)")
+    print(f"Caller CPU per cycle:   {wait_cpu_ms:.1f} ms")
+    print(f"Arm moving:             {moving * 100:.0f}% of blocking cycle time, "
+          f"{len(moves) / picks:.1f} moves/pick, peak TCP "
+          f"{max(m['peak_speed'] for m in moves):.0f} mm/s, "
+          f"mean gap between moves {np.mean([m['idle_after'] for m in moves[:-1]]) * 1000:.0f} ms")
+    print(f"Queued cycle:           mean {queued_s:.2f} s "
+          f"over {picks} picks ({60.0 / queued_s:.1f} picks/min)")
+    return {"setup_s": setup_s, "first_motion_s": first_motion_s, "latency_ms": latencies,
+            "feedback_rate": rate, "cycle_s": cycle_times, "queued_s": queued_s,
+            "wait_cpu_ms": wait_cpu_ms}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MG400Controller benchmark")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--picks", type=int, default=2)
+    args = parser.parse_args()
+    run_benchmark(args.ip, args.picks)
@@ -0,0 +1,109 @@
+"""
+Per-job overhead: one main.py process per job vs the resident cell daemon
+
+Against the local simulator, measures:
+    - plan job as a fresh `python main.py --local` process (imports,
+      calibration, detector, image, plan) vs `python main.py` handing the
+      job to a running cell daemon
+    - the same plan job sent with send_job() from a running process
+    - the daemon round-trip of a status job (protocol overhead only)
+    - an execute job on a cold session (connect + enable + picks) vs on
+      the daemon's warm robot session
+
+Run from the project root:
+    python -m benchmarks.bench_daemon [--runs 3] [--ip 127.0.0.1]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from cell_daemon import BASE_DIR, CellDaemon, CellSession, parse_job
+from main import send_job
+from robot.simulator import MG400Simulator
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def ignore(line):
+    pass
+
+
+def run_main(*args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "main.py", *args], cwd=BASE_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def run_benchmark(ip="127.0.0.1", runs=3):
+    path = os.path.join(tempfile.mkdtemp(), "cell.sock")
+    plan = ["--mode", "plan", "--output-format", "skip"]
+    execute = {"mode": "execute", "motion": "queued", "output_format": "skip"}
+
+    with MG400Simulator(ip):
+        cold_plan = [run_main(*plan, "--local") for _ in range(runs)]
+
+        cold_execute = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            with quiet():
+                session = CellSession(robot_ip=ip, stream=False)
+                session.run_job(parse_job(execute))
+                session.close()
+            cold_execute.append(time.perf_counter() - start)
+
+        with quiet():
+            session = CellSession(robot_ip=ip)
+            server = CellDaemon(session, path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            send_job(dict(execute), path, ignore)  # connect the robot once
+            warm_plan = [run_main(*plan, "--socket", path) for _ in range(runs)]
+            plan_jobs = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                send_job({"mode": "plan", "output_format": "skip"}, path, ignore)
+                plan_jobs.append(time.perf_counter() - start)
+            status = []
+            for _ in range(20):
+                start = time.perf_counter()
+                send_job({"mode": "status"}, path, ignore)
+                status.append(time.perf_counter() - start)
+            warm_execute = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                send_job(dict(execute), path, ignore)
+                warm_execute.append(time.perf_counter() - start)
+        finally:
+            server.shutdown()
+            server.server_close()
+            with quiet():
+                session.close()
+
+    print(f"Plan job, main.py --local process:   {np.median(cold_plan) * 1000:7.0f} ms")
+    print(f"Plan job, main.py -> cell daemon:    {np.median(warm_plan) * 1000:7.0f} ms")
+    print(f"Plan job, send_job() -> cell daemon: {np.median(plan_jobs) * 1000:7.0f} ms")
+    print(f"Daemon status round-trip:            {np.median(status) * 1000:7.2f} ms")
+    print(f"Execute job (2 picks), cold session: {np.median(cold_execute):7.2f} s")
+    print(f"Execute job (2 picks), warm daemon:  {np.median(warm_execute):7.2f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cell daemon benchmark")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.ip, args.runs)
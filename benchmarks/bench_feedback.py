@@ -0,0 +1,173 @@
+"""
+Feedback parsing benchmark: legacy GetFeed loop vs FeedbackReader
+
+Reads the same feedback stream two ways:
+    - legacy: recv() pieces concatenated into bytes, np.frombuffer and a
+      hex() string comparison of test_value per packet (the old GetFeed)
+    - reader: FeedbackReader, recv_into preallocated slots and an integer
+      magic check
+
+and reports CPU time and peak transient allocation per packet, first on
+an in-memory stream (parsing cost only), then live against the simulator
+(feedback sent every --period seconds). With --replay the in-memory stream
+is a recording made with robot/recorder.py, replayed at maximum speed, so
+runs on real feedback data are repeatable.
+
+Run from the project root:
+    python -m benchmarks.bench_feedback [--packets N] [--period 0.001] [--replay run.feed]
+"""
+
+import argparse
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from robot.dobot_api import MyType
+from robot.dobot_controller import FeedbackReader, FEEDBACK_MAGIC, FEEDBACK_SIZE
+from robot.recorder import ReplaySource
+from robot.simulator import FEED_PORT
+
+
+class MemoryStream:
+    """Serves a byte stream through recv/recv_into in socket-sized chunks"""
+
+    def __init__(self, data, chunk=4096):
+        self.data = memoryview(data)
+        self.chunk = chunk
+        self.pos = 0
+
+    def recv(self, size):
+        n = min(size, self.chunk, len(self.data) - self.pos)
+        piece = bytes(self.data[self.pos:self.pos + n])
+        self.pos += n
+        return piece
+
+    def recv_into(self, buffer, nbytes=0):
+        n = min(len(buffer), self.chunk, len(self.data) - self.pos)
+        buffer[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def legacy_read(sock):
+    """One packet the way GetFeed used to read and unpack it"""
+    hasRead = 0
+    data = bytes()
+    while hasRead < 1440:
+        temp = sock.recv(1440 - hasRead)
+        if len(temp) > 0:
+            hasRead += len(temp)
+            data += temp
+    feedInfo = np.frombuffer(data, dtype=MyType)
+    if hex((feedInfo['test_value'][0])) == '0x123456789abcdef':
+        return (feedInfo["tool_vector_actual"][0], feedInfo['isRunQueuedCmd'][0],
+                feedInfo['EnableStatus'][0], feedInfo['ErrorStatus'][0],
+                feedInfo['RunningStatus'][0], int(feedInfo['digital_outputs'][0]))
+    return None
+
+
+def reader_read(reader):
+    """One packet the way GetFeed reads and unpacks it now"""
+    packet = reader.read()
+    return (packet["tool_vector_actual"].copy(), packet['isRunQueuedCmd'][0],
+            packet['EnableStatus'][0], packet['ErrorStatus'][0],
+            packet['RunningStatus'][0], int(packet['digital_outputs']))
+
+
+def measure(read_one, packets):
+    """(CPU us per packet, bytes of transient allocations per packet)"""
+    start = time.thread_time()
+    for _ in range(packets):
+        read_one()
+    cpu_us = (time.thread_time() - start) / packets * 1e6
+
+    # Peak traced memory while reading one packet, above what was live before
+    sample = min(packets, 200)
+    transient = 0
+    tracemalloc.start()
+    for _ in range(sample):
+        tracemalloc.reset_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        read_one()
+        transient += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return cpu_us, transient / sample
+
+
+def stream_of(packets):
+    data = np.zeros(packets, MyType)
+    data["test_value"] = FEEDBACK_MAGIC
+    return data.tobytes()
+
+
+def run_memory(packets, replay=None):
+    if replay is not None:
+        legacy_stream = ReplaySource(replay, speed=None, loop=True)
+        reader = FeedbackReader(ReplaySource(replay, speed=None, loop=True))
+    else:
+        data = stream_of(packets * 2 + 400)
+        legacy_stream = MemoryStream(data)
+        reader = FeedbackReader(MemoryStream(data))
+    return (measure(lambda: legacy_read(legacy_stream), packets),
+            measure(lambda: reader_read(reader), packets))
+
+
+def run_live(ip, packets, period):
+    # The simulator runs in its own process so that its allocations are not
+    # traced together with the reader's
+    sim = subprocess.Popen([sys.executable, "-m", "robot.simulator", "--ip", ip,
+                            "--feedback-period", str(period)],
+                           stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 10.0
+        while True:
+            try:
+                socket.create_connection((ip, FEED_PORT), timeout=1.0).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+        results = []
+        for mode in ("legacy", "reader"):
+            sock = socket.create_connection((ip, FEED_PORT))
+            sock.settimeout(1.0)
+            if mode == "legacy":
+                results.append(measure(lambda: legacy_read(sock), packets))
+            else:
+                reader = FeedbackReader(sock)
+                results.append(measure(lambda: reader_read(reader), packets))
+            sock.close()
+        return results
+    finally:
+        sim.terminate()
+        sim.wait()
+
+
+def report(title, legacy, reader):
+    print(title)
+    print(f"  legacy GetFeed:  {legacy[0]:7.1f} us CPU/packet, {legacy[1]:7.0f} B allocated/packet")
+    print(f"  FeedbackReader:  {reader[0]:7.1f} us CPU/packet, {reader[1]:7.0f} B allocated/packet")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feedback parser benchmark")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--packets", type=int, default=2000)
+    parser.add_argument("--period", type=float, default=0.001,
+                        help="Simulator feedback period in seconds")
+    parser.add_argument("--replay", default=None, metavar="PATH",
+                        help="Use this feedback recording as the in-memory stream")
+    args = parser.parse_args()
+
+    if args.replay:
+        report(f"Replayed recording {args.replay}",
+               *run_memory(args.packets, args.replay))
+    else:
+        report(f"In-memory stream ({FEEDBACK_SIZE}-byte packets, 4 KiB reads)",
+               *run_memory(args.packets))
+    report(f"Simulator feed, {1 / args.period:.0f} packets/s",
+           *run_live(args.ip, args.packets, args.period))
@@ -0,0 +1,75 @@
+"""
+Multi-robot demo: picks per minute with 1, 2, ... arms in one process
+
+Starts one simulator per arm on its own loopback address (127.0.0.1,
+127.0.0.2, ...; the Dobot ports are fixed), connects an MG400Controller to
+each and lets a PickCoordinator spread the same batch of targets over
+them. The arms stand side by side along Y, every target reachable by all.
+
+Run from the project root:
+    python -m benchmarks.bench_multi_robot [--arms 3] [--picks 6]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+from robot.coordinator import PickCoordinator
+from robot.main import MG400Controller
+from robot.simulator import MG400Simulator
+
+ARM_SPACING = 60.0  # mm between arm bases along Y
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def make_targets(picks, seed=0):
+    """Targets in the shared frame, inside every arm's workspace"""
+    rng = np.random.default_rng(seed)
+    return [tuple(p) for p in np.c_[rng.uniform(280, 400, picks),
+                                    rng.uniform(0, 100, picks)]]
+
+
+def run_arms(arms, targets, motion):
+    ips = [f"127.0.0.{i + 1}" for i in range(arms)]
+    origins = [(0.0, i * ARM_SPACING) for i in range(arms)]
+    simulators = [MG400Simulator(ip) for ip in ips]
+    with contextlib.ExitStack() as stack:
+        for sim in simulators:
+            stack.enter_context(sim)
+        with quiet():
+            robots = [MG400Controller(ip=ip) for ip in ips]
+            coordinator = PickCoordinator(robots, origins, motion=motion)
+            with coordinator:
+                t0 = time.monotonic()
+                coordinator.submit(targets)
+                coordinator.wait_idle()
+                elapsed = time.monotonic() - t0
+            for bot in robots:
+                bot.disconnect()
+    return elapsed, coordinator.picked
+
+
+def run_benchmark(max_arms=3, picks=6, motion="blocking"):
+    targets = make_targets(picks)
+    baseline = None
+    for arms in range(1, max_arms + 1):
+        elapsed, picked = run_arms(arms, targets, motion)
+        rate = sum(picked) / elapsed * 60.0
+        baseline = baseline or rate
+        print(f"{arms} arm(s): {sum(picked)} picks in {elapsed:.2f} s "
+              f"-> {rate:.1f} picks/min ({rate / baseline:.2f}x), per arm {picked}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-robot coordinator demo")
+    parser.add_argument("--arms", type=int, default=3)
+    parser.add_argument("--picks", type=int, default=6)
+    parser.add_argument("--motion", choices=["blocking", "queued"], default="blocking")
+    args = parser.parse_args()
+    run_benchmark(args.arms, args.picks, args.motion)
@@ -0,0 +1,189 @@
+"""
+Sequential batches vs pipelined perception and motion
+
+A rendered camera scene stands in for the table: red parts appear as the
+arm works, vanish when the simulated suction cup grabs them, and the arm (with
+the part it carries) is drawn over the table, so an unmasked detection
+would see the carried part as a new target. The cell runs repeated execute
+jobs until every part is picked:
+    - sequential: capture, detect, pick the whole batch, capture again
+    - pipelined: frames are detected one after the other while the arm
+      moves, with the arm masked out; new parts join the pending queue
+
+Reported per mode: time to clear the table, picks (and phantom picks
+that matched no part), jobs, and the share of the time the arm moved.
+--latency adds a capture delay per frame, as with a slow (high
+resolution, network) camera that still streams at its frame rate; the
+sequential cell waits for it after every batch, the pipelined one while
+the arm moves. Parts arrive on grabs rather than on the clock, so both
+modes get the same work in every run.
+
+Run from the project root:
+    python -m benchmarks.bench_pipelined [--ip 127.0.0.1] [--latency 0.0 0.5 1.0]
+"""
+
+import argparse
+import collections
+import contextlib
+import io
+import threading
+import time
+import cv2
+import numpy as np
+from cell_daemon import CellSession, parse_job
+from robot.simulator import MG400Simulator
+from utils.camera import Camera
+from utils.mapping import load_calibration, robot_to_pixels
+
+# (grabs before it arrives, X, Y): three parts on the table, then one more
+# each time the arm grabs one, until twelve have arrived
+SPOTS = [(300.0, -50.0), (350.0, 50.0), (400.0, 0.0), (330.0, 100.0),
+         (380.0, -100.0), (260.0, 60.0), (410.0, 90.0), (300.0, 20.0)]
+ARRIVALS = [(max(0, i - 2),) + SPOTS[i % len(SPOTS)] for i in range(12)]
+PART_RADIUS = 15.0  # mm
+
+
+class SceneSource:
+    """cv2.VideoCapture stand-in rendering the simulated table"""
+
+    def __init__(self, sim, H, arrivals=ARRIVALS, fps=30.0, latency=0.0, size=(1920, 1080)):
+        self.sim = sim
+        self.H = H
+        self.arrivals = sorted(arrivals)
+        self.interval = 1.0 / fps
+        self.latency = latency
+        self.size = size
+        self.background = np.full((size[1], size[0], 3), 128, np.uint8)
+        self.px_per_mm = 1.0 / 0.217  # calibration.json scale
+        self.start = time.monotonic()
+        self.table = []       # (X, Y) of parts lying on the table
+        self.grabbed = []     # (X, Y) where parts were grabbed
+        self.carrying = False
+        self._arrived = 0
+        self._next_time = self.start
+        self._in_flight = collections.deque()  # (due time, frame) being "transferred"
+        self._lock = threading.Lock()
+        self._pose = sim.pose.copy()
+        # Follow the simulator at 100 Hz, whatever the frame rate
+        self._tracker = threading.Thread(target=self._track)
+        self._tracker.daemon = True
+        self._tracker.start()
+
+    def _track(self):
+        while True:
+            with self.sim._lock:
+                pose = self.sim.pose.copy()
+                grip = bool(self.sim.digital_outputs & 1)
+            with self._lock:
+                self._pose = pose
+                self._update(pose, grip)
+            time.sleep(0.01)
+
+    def finished(self):
+        with self._lock:
+            return self._arrived == len(self.arrivals) and not self.table and not self.carrying
+
+    def _update(self, pose, grip):
+        grabs = len(self.grabbed)
+        while self._arrived < len(self.arrivals) and self.arrivals[self._arrived][0] <= grabs:
+            self.table.append(self.arrivals[self._arrived][1:])
+            self._arrived += 1
+        if grip and not self.carrying:
+            for part in self.table:
+                if np.hypot(part[0] - pose[0], part[1] - pose[1]) <= 10.0 and pose[2] <= -160.0:
+                    self.table.remove(part)
+                    self.grabbed.append(part)
+                    self.carrying = True
+                    break
+        elif not grip:
+            self.carrying = False  # released in the bin
+
+    def _disc(self, frame, xy, radius_mm, color):
+        u, v = robot_to_pixels([xy], self.H)[0]
+        cv2.circle(frame, (int(round(u)), int(round(v))), int(radius_mm * self.px_per_mm),
+                   color, -1)
+
+    def read(self):
+        # Frames are rendered at the frame rate and each one is returned
+        # latency later: a slow camera delays frames, it does not drop them
+        while True:
+            now = time.monotonic()
+            if self._in_flight and self._in_flight[0][0] <= now:
+                return True, self._in_flight.popleft()[1]
+            if self._next_time <= now:
+                self._next_time = max(self._next_time + self.interval, now)
+                self._in_flight.append((now + self.latency, self._render()))
+                continue
+            due = self._next_time
+            if self._in_flight:
+                due = min(due, self._in_flight[0][0])
+            time.sleep(due - now)
+
+    def _render(self):
+        with self._lock:
+            pose = self._pose
+            frame = self.background.copy()
+            for part in self.table:
+                self._disc(frame, part, PART_RADIUS, (0, 0, 255))
+            # The arm over the table: links from the base, then the tool
+            base, tool = robot_to_pixels([(0.0, 0.0), pose[:2]], self.H)
+            cv2.line(frame, tuple(int(c) for c in base), tuple(int(c) for c in tool),
+                     (200, 200, 200), int(60 * self.px_per_mm))
+            self._disc(frame, pose[:2], 30.0, (220, 220, 220))
+            if self.carrying:
+                self._disc(frame, pose[:2], PART_RADIUS, (0, 0, 255))
+        return frame
+
+    def isOpened(self):
+        return True
+
+    def set(self, prop_id, value):
+        return False
+
+    def release(self):
+        pass
+
+
+def run_mode(ip, H, motion, latency=0.0, timeout=90.0):
+    with MG400Simulator(ip) as sim, contextlib.redirect_stdout(io.StringIO()):
+        scene = SceneSource(sim, H, latency=latency)
+        session = CellSession(0, ip, camera=Camera(source=scene))
+        session.capture_latency = latency + 0.05
+        session.robot("segments")
+        job = parse_job({"mode": "execute", "camera": 0, "color": "red",
+                         "motion": motion, "output_format": "skip"})
+        start = time.monotonic()
+        picked, jobs = [], 0
+        while not scene.finished() and time.monotonic() - start < timeout:
+            result = session.run_job(job)
+            jobs += 1
+            picked += result["order"][:result["picked"]]
+        elapsed = time.monotonic() - start
+        moving = session.bot.telemetry.utilization(start, time.monotonic())
+        session.close()
+    grabbed = np.array(scene.grabbed).reshape(-1, 2)
+    phantom = sum(1 for xy in picked
+                  if not len(grabbed) or np.min(np.linalg.norm(grabbed - xy, axis=1)) > 10.0)
+    return {"elapsed": elapsed, "picked": len(picked), "phantom": phantom,
+            "parts": len(scene.grabbed), "jobs": jobs, "moving": moving}
+
+
+def run_benchmark(ip="127.0.0.1", latencies=(0.0, 0.5, 1.0)):
+    H = load_calibration("calibration.json")
+    print(f"{len(ARRIVALS)} parts: 3 on the table, one more arriving on each grab")
+    for latency in latencies:
+        print(f"Capture latency {latency * 1000:.0f} ms")
+        for motion in ("blocking", "pipelined"):
+            r = run_mode(ip, H, motion, latency)
+            name = "sequential" if motion == "blocking" else motion
+            print(f"  {name:10s} cleared in {r['elapsed']:5.1f} s, {r['parts']} parts picked, "
+                  f"{r['phantom']} phantom picks, {r['jobs']} jobs, arm moving {r['moving'] * 100:.0f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipelined perception benchmark")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0, 0.5, 1.0],
+                        help="Capture latencies to compare (s)")
+    args = parser.parse_args()
+    run_benchmark(args.ip, args.latency)
@@ -0,0 +1,70 @@
+"""
+Pyramid (coarse-to-fine) detection benchmark
+
+Times ObjectDetector at full resolution against pyramid_levels 1-3 on the
+sample images and checks that every pyramid result matches the full
+resolution pixel_center within one pixel and has the same shape label.
+
+Run from the project root:
+    python -m benchmarks.bench_pyramid [image_path ...]
+"""
+
+import os
+import sys
+import time
+import cv2
+from perception.detector import ObjectDetector
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_IMAGES = [
+    os.path.join(BASE_DIR, "outputs", "camera_detection.png"),
+    os.path.join(BASE_DIR, "outputs", "last_capture.jpg"),
+]
+
+
+def time_call(fn, repeats=10):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def results_match(reference, candidate):
+    key = lambda obj: (obj["color"], obj["pixel_center"])
+    reference, candidate = sorted(reference, key=key), sorted(candidate, key=key)
+    if len(reference) != len(candidate):
+        return False
+    for a, b in zip(reference, candidate):
+        (ua, va), (ub, vb) = a["pixel_center"], b["pixel_center"]
+        if a["shape"] != b["shape"] or abs(ua - ub) > 1 or abs(va - vb) > 1:
+            return False
+    return True
+
+
+def run_benchmark(*image_paths):
+    full = ObjectDetector()
+    pyramids = {level: ObjectDetector(pyramid_levels=level) for level in (1, 2, 3)}
+
+    for image_path in image_paths or DEFAULT_IMAGES:
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"Error: {image_path} not found.")
+            continue
+        print(f"\n--- {os.path.basename(image_path)} "
+              f"({image.shape[1]}x{image.shape[0]}) ---")
+
+        for color_name in ("any", "all", "red"):
+            reference = full.find_objects(image, color_name)
+            full_ms = time_call(lambda: full.find_objects(image, color_name))
+            line = f"{color_name:>4} full: {full_ms:6.2f} ms"
+            for level, detector in pyramids.items():
+                ms = time_call(lambda: detector.find_objects(image, color_name))
+                match = results_match(
+                    reference, detector.find_objects(image, color_name))
+                line += f" | L{level}: {ms:6.2f} ms {'ok' if match else 'MISMATCH'}"
+            print(line + f" ({len(reference)} objects)")
+
+
+if __name__ == "__main__":
+    run_benchmark(*sys.argv[1:])
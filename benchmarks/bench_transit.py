@@ -0,0 +1,95 @@
+"""
+Transit benchmark: three-segment sequence vs one Arch/Jump motion
+
+Against the local simulator, times the transit from a pick point (at
+pick_z) to the box (at place_z) done either as MovL up to safe_z, MovJ
+across and MovL down, each waited on through feedback, or as a single
+blended Jump with LimZ = safe_z. Full pick-and-place cycles are timed in
+both transit modes as well.
+
+Run from the project root:
+    python -m benchmarks.bench_transit [--repeats N] [--ip 127.0.0.1]
+"""
+
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+from robot.dobot_controller import MoveJ, MoveL, WaitMotionDone
+from robot.main import MG400Controller
+from robot.simulator import MG400Simulator
+
+PICKS = [(300.0, -50.0), (350.0, 50.0), (275.0, 100.0)]
+
+
+@contextlib.contextmanager
+def quiet():
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def move_and_wait(bot, move_fn, point):
+    move_fn(bot.move, point)
+    WaitMotionDone(point, bot.arrive_tolerance, bot.move_timeout, bot.state)
+
+
+def transit_segments(bot, start, end):
+    move_and_wait(bot, MoveL, [start[0], start[1], bot.safe_z, bot.safe_r])
+    move_and_wait(bot, MoveJ, [end[0], end[1], bot.safe_z, bot.safe_r])
+    move_and_wait(bot, MoveL, end)
+
+
+def transit_arch(bot, start, end):
+    bot.move.Jump(*end)
+    WaitMotionDone(end, bot.arrive_tolerance, bot.move_timeout, bot.state)
+
+
+def time_transits(bot, transit, repeats):
+    px, py, _ = bot.drop_location
+    place = [px, py, bot.place_z, bot.safe_r]
+    times = []
+    for i in range(repeats):
+        x, y = PICKS[i % len(PICKS)]
+        pick = [x, y, bot.pick_z, bot.safe_r]
+        # Start every transit from rest at the pick point
+        bot.move.MovJ(*pick)
+        WaitMotionDone(pick, bot.arrive_tolerance, bot.move_timeout, bot.state)
+        t0 = time.monotonic()
+        transit(bot, pick, place)
+        times.append(time.monotonic() - t0)
+    return np.mean(times)
+
+
+def time_cycles(bot, repeats):
+    t0 = time.monotonic()
+    for i in range(repeats):
+        bot.pick_and_place(*PICKS[i % len(PICKS)])
+    return (time.monotonic() - t0) / repeats
+
+
+def run_benchmark(ip="127.0.0.1", repeats=3):
+    with MG400Simulator(ip):
+        with quiet():
+            bot = MG400Controller(ip=ip, transit="arch")
+            segments_s = time_transits(bot, transit_segments, repeats)
+            arch_s = time_transits(bot, transit_arch, repeats)
+
+            bot.transit = "segments"
+            cycle_segments_s = time_cycles(bot, repeats)
+            bot.transit = "arch"
+            cycle_arch_s = time_cycles(bot, repeats)
+            bot.disconnect()
+
+    print(f"Transit pick -> box   segments: {segments_s:.3f} s   "
+          f"arch: {arch_s:.3f} s   ({(1 - arch_s / segments_s) * 100:.0f}% faster)")
+    print(f"Pick-and-place cycle  segments: {cycle_segments_s:.3f} s   "
+          f"arch: {cycle_arch_s:.3f} s   ({(1 - cycle_arch_s / cycle_segments_s) * 100:.0f}% faster)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arch vs segment transit benchmark")
+    parser.add_argument("--ip", default="127.0.0.1")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run_benchmark(args.ip, args.repeats)
@@ -0,0 +1,597 @@
+"""
+Resident cell daemon
+
+Keeps everything a pick job needs warm between jobs: OpenCV and the
+detector, the calibration, the camera (grabbing continuously) and a
+connected, enabled MG400Controller. main.py sends its plan / execute jobs
+here over a Unix socket instead of paying that start-up cost every run.
+
+Protocol: one JSON object per line. The client sends a job with the
+main.py options,
+    {"mode": "plan", "color": "red", "shape": "any", "image": "...", ...}
+and the daemon streams back
+    {"event": "log", "message": "..."}   output of the job, line by line
+    {"event": "result", ...}             summary when the job is done
+    {"event": "error", "message": "..."} instead, if the job failed
+after which the next job can be sent on the same connection. Jobs run one
+at a time; {"mode": "status"} reports the session without running a job.
+
+Run from the project root:
+    python cell_daemon.py [--socket /tmp/mg400-cell.sock] [--camera 0] [--ip 192.168.1.6]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+from perception.detector import ObjectDetector
+from perception.pipeline import VisionPipeline, ImageFileSink
+from utils.mapping import (load_calibration, load_workspace_roi, arm_footprint, arm_covers,
+                           ROBOT_WORKSPACE)
+from robot.main import MG400Controller, DROP_LOCATIONS, ROBOT_IP
+from robot.dobot_controller import SetupRobot
+from planning.sequencer import CycleCostModel, plan_picks
+from planning.pick_queue import PickQueue
+from utils.camera import Camera
+from utils.writer import AsyncImageWriter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
+DEFAULT_SOCKET = "/tmp/mg400-cell.sock"
+
+# Job options and their defaults (the main.py CLI flags)
+JOB_DEFAULTS = {
+    "mode": "plan",                 # "plan", "execute" or "status"
+    "color": "any",
+    "shape": "any",
+    "camera": None,                 # index of the session camera to capture from instead of image
+    "image": os.path.join(OUTPUT_DIR, "camera_detection.png"),
+    "save_capture": False,
+    "motion": "blocking",           # "blocking", "queued" or "pipelined"
+    "transit": "segments",          # "segments" or "arch"
+    "sequence": "optimized",        # "optimized" or "discovery"
+    "bins": None,                   # [[X, Y], ...] drop bins, None: DROP_LOCATIONS
+    "output_format": "png",         # "png", "jpg" or "skip"
+}
+JOB_CHOICES = {
+    "mode": ("plan", "execute", "status"),
+    "motion": ("blocking", "queued", "pipelined"),
+    "transit": ("segments", "arch"),
+    "sequence": ("optimized", "discovery"),
+    "output_format": ("png", "jpg", "skip"),
+}
+
+
+def parse_job(request):
+    """
+    Fill in the defaults of a job request and validate it
+
+    Raises:
+        ValueError: unknown option or invalid value
+    """
+    if not isinstance(request, dict):
+        raise ValueError("A job must be a JSON object")
+    unknown = set(request) - set(JOB_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown job options: {', '.join(sorted(unknown))}")
+    job = dict(JOB_DEFAULTS, **request)
+    for name, choices in JOB_CHOICES.items():
+        if job[name] not in choices:
+            raise ValueError(f"Invalid {name}: {job[name]} (expected one of {', '.join(choices)})")
+    camera = job["camera"]
+    if camera is not None and (isinstance(camera, bool) or not isinstance(camera, int)):
+        raise ValueError(f"Invalid camera: {camera} (expected a camera index)")
+    return job
+
+
+def reachable_targets(targets):
+    """Drop the targets outside the robot workspace"""
+    x_min, x_max, y_min, y_max = ROBOT_WORKSPACE
+    return [(x, y) for x, y in targets
+            if not ((x > x_max or x < x_min) and (y > y_max or y < y_min))]
+
+
+class CellSession:
+    """
+    Everything a job needs, created once
+
+    The robot is connected on the first execute job and kept enabled; a
+    later job re-runs setup only if the feedback shows it disabled or in
+    error.
+
+    Args:
+        camera_index: camera to keep open (None: jobs read image files)
+        robot_ip: MG400 address
+        record_path: record the robot feedback of the whole session
+        stream: grab camera frames continuously (daemon) instead of
+            reading one frame per capture (one-shot local run)
+        camera: Camera to use instead of opening camera_index (which
+            still names it for the jobs)
+    """
+
+    def __init__(self, camera_index=None, robot_ip=ROBOT_IP, record_path=None, stream=True,
+                 camera=None):
+        calibration_path = os.path.join(BASE_DIR, "calibration.json")
+        self.H = load_calibration(calibration_path)
+        # Only the reachable workspace is searched for targets
+        self.roi = load_workspace_roi(calibration_path)
+        print("Success: Calibration loaded.")
+
+        # Perception Pipeline (frames stay in memory between stages)
+        self.pipeline = VisionPipeline(ObjectDetector(), self.H, roi=self.roi)
+        self.camera = camera
+        self.camera_index = camera_index
+        if camera is None and camera_index is not None:
+            self.camera = Camera(camera_index)
+        if self.camera is not None:
+            if stream:
+                self.camera.start()
+            self.pipeline.camera = self.camera
+
+        self.robot_ip = robot_ip
+        self.record_path = record_path
+        self.bot = None
+        # Seconds from exposure to the frame's timestamp; the arm is masked
+        # at every pose it had in that window
+        self.capture_latency = 0.05
+        self._writers = {}  # output format -> AsyncImageWriter
+        self.lock = threading.RLock()  # one job at a time
+        self.jobs = 0
+
+    def robot(self, transit):
+        """The connected controller, set up for transit"""
+        if self.bot is None:
+            self.bot = MG400Controller(ip=self.robot_ip, transit=transit,
+                                       record_path=self.record_path)
+            return self.bot
+        if not self.bot.state.check(lambda s: s.enabled and not s.error):
+            print("Robot not enabled, running setup again...")
+            SetupRobot(self.bot.dashboard, speed_ratio=50, acc_ratio=50, state=self.bot.state)
+        if transit != self.bot.transit:
+            self.bot.transit = transit
+            if transit == "arch":
+                self.bot.setup_arch()
+        return self.bot
+
+    def writer(self, fmt):
+        """Background writer of the annotated outputs/last_detection image"""
+        if fmt not in self._writers:
+            self._writers[fmt] = AsyncImageWriter(
+                os.path.join(OUTPUT_DIR, "last_detection.png"), fmt=fmt)
+        return self._writers[fmt]
+
+    def status(self):
+        bot = self.bot
+        return {"jobs": self.jobs,
+                "camera": None if self.camera is None else self.camera_index,
+                "robot": None if bot is None else {"ip": bot.ip, "transit": bot.transit,
+                                                   "enabled": bot.state.check(lambda s: s.enabled),
+                                                   "error": bot.state.check(lambda s: s.error)}}
+
+    def run_job(self, job):
+        """
+        Detect, plan and (in execute mode) pick
+
+        Args:
+            job: options as returned by parse_job
+
+        Returns:
+            dict: JSON-serializable summary ("detections", "targets",
+            "order", "bins", "estimated_time", "picked", "image", ...),
+            or for a status job the session status
+        """
+        if job["mode"] == "status":
+            # Not a job: answered at once, even while one runs, and not counted
+            return self.status()
+        with self.lock:
+            start = time.monotonic()
+            result = self._run_job(job)
+            self.jobs += 1
+            result["elapsed"] = time.monotonic() - start
+            return result
+
+    def _run_job(self, job):
+        # Create outputs folder if missing
+        if not os.path.exists(OUTPUT_DIR):
+            os.makedirs(OUTPUT_DIR)
+
+        # Annotated output is rendered and written in the background
+        writer = self.writer(job["output_format"])
+        sinks = [writer]
+        if job["save_capture"]:
+            sinks.append(ImageFileSink(os.path.join(OUTPUT_DIR, "camera_detection.png")))
+        self.pipeline.sinks = sinks
+
+        # Capture Image
+        image = None
+        if job["camera"] is not None:
+            if self.camera is None:
+                raise RuntimeError("No camera: start the session with a camera index")
+            if job["camera"] != self.camera_index:
+                raise RuntimeError(f"Camera {job['camera']} requested, but the session has "
+                                   f"camera {self.camera_index} open")
+            print("Taking photo...")
+            frame, timestamp = self.camera.capture(latency=self.capture_latency)
+            if frame is None:
+                raise RuntimeError(self.camera.error or "Camera capture failed.")
+            # The arm may be over the table: ignore its footprint
+            exclude, _ = self._arm_mask(timestamp)
+            result = self.pipeline.process(frame, job["color"], job["shape"], timestamp,
+                                           exclude=exclude)
+            if result["hidden"]:
+                print(f"{len(result['hidden'])} object(s) under the arm skipped")
+        else:
+            image = cv2.imread(job["image"])
+            if image is None:
+                raise RuntimeError(f"{job['image']} not found.")
+            result = self.pipeline.process(image, job["color"], job["shape"])
+
+        found_objs = result["detections"]
+        targets_for_robot = result["targets"]
+
+        print(f"\n--- RESULTS ({job['mode'].upper()} MODE) ---")
+        if not found_objs:
+            print("No targets found matching criteria.")
+
+        # Coordinate Mapping (done by the pipeline)
+        for obj, (rx, ry) in zip(found_objs, targets_for_robot):
+            u, v = obj["pixel_center"]
+            print(
+                f"Found {obj['shape']} at Pixel({u}, {v}) -> Robot({rx:.1f}, {ry:.1f})")
+
+        print("targets_for_robot", targets_for_robot)
+
+        # Pick Sequencing
+        reachable = reachable_targets(targets_for_robot)
+        drop_z = DROP_LOCATIONS[0][2]
+        bins = [[x, y, drop_z] for x, y in job["bins"]] if job["bins"] else DROP_LOCATIONS
+        plan = plan_picks(reachable, bins, CycleCostModel(transit=job["transit"]))
+        if job["sequence"] == "optimized":
+            reachable = plan["targets"]
+            drops = [bins[b] for b in plan["bins"]]
+            print(f"Pick order ({plan['method']}): {plan['order']}, bins {plan['bins']}")
+            print(f"Estimated cycle {plan['estimated_time']:.1f} s vs {plan['discovery_time']:.1f} s "
+                  f"in discovery order (saves {plan['saved']:.1f} s)")
+        else:
+            drops = [bins[0]] * len(reachable)
+
+        # Execution Mode Gate
+        picked = 0
+        if job["mode"] == "execute" and targets_for_robot and job["motion"] == "pipelined":
+            reachable, drops = self._run_pipelined(job, reachable, bins, image)
+            picked = len(reachable)
+        elif job["mode"] == "execute" and targets_for_robot:
+            bot = self.robot(job["transit"])
+            if job["motion"] == "queued":
+                bot.run_queued(reachable, drops)
+            else:
+                for (x, y), drop in zip(reachable, drops):
+                    bot.pick_and_place(x, y, drop)
+            picked = len(reachable)
+        elif job["mode"] == "execute":
+            print("Execution skipped: No targets found.")
+
+        # Finish writing outputs for UI
+        writer.flush()
+        if writer.path:
+            print(f"Annotated image saved to {os.path.relpath(writer.path, BASE_DIR)}")
+
+        return {"mode": job["mode"],
+                "detections": [{"shape": obj["shape"], "color": obj["color"],
+                                "pixel_center": [int(c) for c in obj["pixel_center"]]}
+                               for obj in found_objs],
+                "targets": [[float(x), float(y)] for x, y in targets_for_robot],
+                "order": [[float(x), float(y)] for x, y in reachable],
+                "bins": [[float(c) for c in drop] for drop in drops],
+                "estimated_time": float(plan["estimated_time"]),
+                "picked": picked,
+                "image": writer.path}
+
+    def _arm_poses(self, bot, timestamp, spacing=20.0):
+        """
+        Tool (x, y) positions from the feedback history while a frame was
+        taken, at most spacing mm apart along the path
+        """
+        if bot.telemetry is not None:
+            rows = bot.telemetry.window(timestamp - self.capture_latency, timestamp)
+            if len(rows):
+                kept = []
+                for xy in rows["tool_vector_actual"][:, :2]:
+                    if not kept or np.hypot(*(xy - kept[-1])) >= spacing:
+                        kept.append(xy)
+                return np.array(kept)
+        pose = bot.state.snapshot()["pose"]
+        return [] if pose is None else [pose[:2]]
+
+    def _arm_mask(self, timestamp):
+        """
+        The arm's footprint when a frame was taken: (pixel polygons to
+        exclude, function telling which robot (x, y) points it covered)
+        """
+        if self.bot is None:
+            return None, None
+        poses = self._arm_poses(self.bot, timestamp)
+        if not len(poses):
+            return None, None
+        exclude = [polygon for xy in poses for polygon in arm_footprint(xy, self.H)]
+        return exclude, lambda points: np.any([arm_covers(points, xy) for xy in poses], axis=0)
+
+    def _run_pipelined(self, job, targets, bins, image=None):
+        """
+        Pick while detecting the newest frames
+
+        While the arm picks, a thread detects one camera frame after the
+        other, each with the arm's footprint at capture time (from the
+        feedback history, projected into the image) excluded. New targets
+        join the PickQueue as soon as they are seen, so a part that
+        arrives during a pick is usually queued before the pick ends.
+        Already picked ones are dropped, and the next pick is planned from
+        what is pending. When nothing is pending, a frame exposed after
+        that moment decides whether the job is done.
+
+        Args:
+            image: the job's input image, re-detected when there is no camera
+
+        Returns:
+            tuple: (picked (x, y) in order, drop bin of each)
+        """
+        bot = self.robot(job["transit"])
+        cost_model = CycleCostModel.for_controller(bot)
+        queue = PickQueue()
+        queue.merge(targets)
+        trigger = threading.Event()
+        stop = threading.Event()
+        detected = threading.Condition()
+        newest = [0.0]  # exposure time of the last detected frame
+        failure = [None]  # what stopped the perception thread
+
+        def perceive():
+            try:
+                while not stop.is_set():
+                    if job["camera"] is not None:
+                        # Whichever frame arrives next: detection keeps up
+                        # with the camera or skips the frames it missed
+                        frame, timestamp = self.camera.capture(timeout=1.0 + self.capture_latency)
+                        if frame is None:
+                            raise RuntimeError(self.camera.error or "Camera capture failed.")
+                        exposed = timestamp - self.capture_latency
+                    else:
+                        # A still image never changes: detect it on request
+                        trigger.wait()
+                        trigger.clear()
+                        if stop.is_set():
+                            return
+                        frame, timestamp = image, time.monotonic()
+                        exposed = None
+                    exclude, covered = self._arm_mask(timestamp)
+                    result = self.pipeline.process(frame, job["color"], job["shape"], timestamp,
+                                                   exclude=exclude)
+                    added = queue.merge(reachable_targets(result["targets"]), covered, exposed,
+                                        hidden=result["hidden"])
+                    if added:
+                        print(f"{added} new target(s) detected during motion")
+                    with detected:
+                        newest[0] = timestamp if exposed is None else exposed
+                        detected.notify_all()
+            except Exception as e:
+                with detected:
+                    failure[0] = e
+                    detected.notify_all()
+
+        def check_perception():
+            if failure[0] is not None:
+                raise RuntimeError(f"Perception failed during the job: {failure[0]}") from failure[0]
+
+        worker = threading.Thread(target=perceive)
+        worker.daemon = True
+        worker.start()
+        picked, drops = [], []
+        try:
+            while True:
+                check_perception()
+                pose = bot.state.snapshot()["pose"]
+                start = None if pose is None else pose[:2]
+                pick = queue.next(bins, cost_model, start)
+                if pick is None:
+                    # Nothing pending: decide on a frame taken now
+                    requested = time.monotonic()
+                    trigger.set()
+                    with detected:
+                        detected.wait_for(lambda: newest[0] >= requested or failure[0] is not None,
+                                          timeout=5.0 + self.capture_latency)
+                    check_perception()
+                    pick = queue.next(bins, cost_model, start)
+                    if pick is None:
+                        break
+                (x, y), b = pick
+                bot.pick_and_place(x, y, bins[b])
+                queue.done()
+                picked.append((x, y))
+                drops.append(bins[b])
+        finally:
+            stop.set()
+            trigger.set()
+            worker.join(timeout=5.0)
+        print(f"Pipelined: {len(picked)} picks, {queue.frames - 1} frames detected during the job")
+        return picked, drops
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+        if self.camera is not None:
+            self.camera.stop()
+            self.camera = None
+        if self.bot is not None:
+            self.bot.disconnect()
+            self.bot = None
+
+
+class _LogStream:
+    """stdout replacement that also sends every printed line to the client"""
+
+    def __init__(self, send, echo):
+        self.send = send
+        self.echo = echo
+        self._partial = ""
+
+    def write(self, text):
+        self.echo.write(text)
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.send({"event": "log", "message": line})
+        return len(text)
+
+    def flush(self):
+        if self._partial:
+            self.send({"event": "log", "message": self._partial})
+            self._partial = ""
+        self.echo.flush()
+
+
+class _JobOutput:
+    """
+    The daemon's sys.stdout: routes each job's output to its client
+
+    A job handler thread registers the _LogStream of its job; output of
+    every other thread (camera grabbing, feedback, image writers, other
+    clients) goes to the daemon's own stdout only.
+    """
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def job(self, stream):
+        """Send what this thread prints to stream until the block ends"""
+        self._local.stream = stream
+        try:
+            yield stream
+        finally:
+            self._local.stream = None
+            stream.flush()
+
+    def _target(self):
+        return getattr(self._local, "stream", None) or self.stdout
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stdout, name)
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.connected = True
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                job = parse_job(json.loads(line))
+            except ValueError as e:
+                self.send({"event": "error", "message": str(e)})
+                continue
+            output = self.server.output
+            try:
+                with output.job(_LogStream(self.send, output.stdout)):
+                    result = self.server.session.run_job(job)
+            except Exception as e:
+                print(f"Job failed: {e}")
+                self.send({"event": "error", "message": str(e)})
+                continue
+            self.send(dict(result, event="result"))
+
+    def send(self, message):
+        # A client that went away does not stop the job (the arm may be moving)
+        if not self.connected:
+            return
+        try:
+            self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+            self.wfile.flush()
+        except OSError:
+            self.connected = False
+
+
+class CellDaemon(socketserver.ThreadingUnixStreamServer):
+    """Unix-socket job server around a CellSession"""
+
+    daemon_threads = True
+
+    def __init__(self, session, path=DEFAULT_SOCKET):
+        if os.path.exists(path):
+            if _daemon_running(path):
+                raise RuntimeError(f"A cell daemon is already listening on {path}")
+            os.unlink(path)  # left behind by a daemon that did not shut down
+        self.session = session
+        self.path = path
+        super().__init__(path, _JobHandler)
+        self.output = _JobOutput(sys.stdout)
+        sys.stdout = self.output
+
+    def server_close(self):
+        super().server_close()
+        if sys.stdout is self.output:
+            sys.stdout = self.output.stdout
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def _daemon_running(path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        probe.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident vision + MG400 cell daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket to listen on")
+    parser.add_argument("--camera", type=int, default=None,
+                        help="Keep this camera index open for camera jobs")
+    parser.add_argument("--ip", default=ROBOT_IP, help="MG400 address")
+    parser.add_argument("--connect", action="store_true",
+                        help="Connect and enable the robot now instead of on the first execute job")
+    parser.add_argument("--transit", choices=["segments", "arch"], default="segments",
+                        help="Transit mode used with --connect")
+    parser.add_argument("--record", type=str, default=None, metavar="PATH",
+                        help="Record the raw robot feedback of the session to this file")
+    args = parser.parse_args()
+
+    try:
+        session = CellSession(args.camera, args.ip, args.record)
+    except Exception as e:
+        print(f"Error: Could not start the session. {e}")
+        return
+    if args.connect:
+        session.robot(args.transit)
+    try:
+        with CellDaemon(session, args.socket) as server:
+            print(f"Cell daemon listening on {args.socket}")
+            server.serve_forever()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,67 @@
-import cv2
-import os
+"""
+Dobot Integrated Vision System - command line
+
+Sends the job to the resident cell daemon (cell_daemon.py) when one is
+running, so OpenCV, the calibration, the camera and the robot session are
+already warm; otherwise runs the job in this process.
+"""
+
 import argparse
-import numpy as np
-from perception.detector import ObjectDetector
-from utils.mapping import load_calibration, pixel_to_robot
-from robot.main import MG400Controller
-# from utils.camera import Camera
+import json
+import os
+import socket
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
+DEFAULT_SOCKET = "/tmp/mg400-cell.sock"
+
+
+def send_job(job, path=DEFAULT_SOCKET, on_log=print):
+    """
+    Run a job on the cell daemon, passing its output lines to on_log
+
+    Returns:
+        dict: the job result
+
+    Raises:
+        OSError: no daemon is listening on path
+        RuntimeError: the daemon reported an error
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(job) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                message = json.loads(line)
+                event = message.pop("event")
+                if event == "log":
+                    on_log(message["message"])
+                elif event == "result":
+                    return message
+                else:
+                    raise RuntimeError(message["message"])
+    raise ConnectionError("Cell daemon closed the connection")
+
+
+def run_local(job, record_path=None):
+    """Run a job in this process, without the daemon"""
+    # OpenCV and the robot stack are only imported when there is no daemon
+    from cell_daemon import CellSession
+
+    try:
+        session = CellSession(job["camera"], record_path=record_path, stream=False)
+    except Exception as e:
+        # Calibration, workspace ROI or camera: report what actually failed
+        print(f"Error: Could not start the session. {type(e).__name__}: {e}")
+        return None
+    try:
+        return session.run_job(job)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return None
+    finally:
+        session.close()
 
 
 def run_main():
@@ -19,80 +71,50 @@ def run_main():
     parser.add_argument(
         "--mode", choices=["plan", "execute"], required=True, help="Mode of operation")
     parser.add_argument("--color", type=str, default="any",
-                        help="Filter by color: red, blue, green")
+                        help="Filter by color: red, blue, green, or all (every color in one pass)")
     parser.add_argument("--shape", type=str, default="any",
                         help="Filter by shape: circle, square")
+    parser.add_argument("--camera", type=int, default=None,
+                        help="Capture live from this camera index instead of reading --image")
+    parser.add_argument("--image", type=str, default=os.path.join(OUTPUT_DIR, "camera_detection.png"),
+                        help="Input image used when no --camera is given")
+    parser.add_argument("--save-capture", action="store_true",
+                        help="Also write the processed frame to outputs/camera_detection.png")
+    parser.add_argument("--motion", choices=["blocking", "queued", "pipelined"], default="blocking",
+                        help="blocking: wait for each step; queued: stream all picks into the controller queue; "
+                             "pipelined: detect new frames while the arm picks")
+    parser.add_argument("--transit", choices=["segments", "arch"], default="segments",
+                        help="segments: MovL up / MovJ across / MovL down; arch: one Jump per transit")
+    parser.add_argument("--sequence", choices=["optimized", "discovery"], default="optimized",
+                        help="optimized: order picks and bins for the shortest estimated cycle; discovery: detection order")
+    parser.add_argument("--bin", type=float, nargs=2, action="append", metavar=("X", "Y"),
+                        help="Drop bin in robot coordinates (repeat for several bins; default: the controller's drop location)")
+    parser.add_argument("--record", type=str, default=None, metavar="PATH",
+                        help="Record the raw robot feedback to this file (see robot/recorder.py)")
+    parser.add_argument("--output-format", choices=["png", "jpg", "skip"], default="png",
+                        help="Format of the annotated outputs/last_detection image")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET,
+                        help="Unix socket of the cell daemon")
+    parser.add_argument("--local", action="store_true",
+                        help="Run in this process even if a cell daemon is running")
     args = parser.parse_args()
 
-    # Create outputs folder if missing
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
-
-    # 2. Initialization
-    try:
-        H = load_calibration(os.path.join(BASE_DIR, "calibration.json"))
-        print("Success: Calibration loaded.")
-    except Exception as e:
-        print(f"Error: Could not load calibration. {e}")
-        return
-
-    # 3. Capture Image and Read
-    # cam = Camera(1)
-    # print("Taking photo...")
-    # Call the method and store the returned image
-    # cam.get_frame()
-    image_path = os.path.join(OUTPUT_DIR, "camera_detection.png")
-    image = cv2.imread(image_path)
-    if image is None:
-        print(f"Error: {image_path} not found.")
-        return
-
-    # Keep a copy for annotation
-    display_img = image.copy()
-
-    # 4. Perception Pipeline
-    detector = ObjectDetector()
-    found_objs = detector.find_objects(image, args.color, args.shape)
-
-    targets_for_robot = []
-
-    print(f"\n--- RESULTS ({args.mode.upper()} MODE) ---")
-    if not found_objs:
-        print("No targets found matching criteria.")
-
-    for obj in found_objs:
-        u, v = obj["pixel_center"]
-        shape_type = obj["shape"]
-
-        # 5. Coordinate Mapping
-        rx, ry = pixel_to_robot(u, v, H)
-        targets_for_robot.append((rx, ry))
-
-        # 6. Annotation
-        cv2.circle(display_img, (u, v), 12, (0, 255, 0), 2)
-        text = f"{shape_type} | X:{rx:.1f} Y:{ry:.1f}"
-        cv2.putText(display_img, text, (u+15, v-15),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-        print(
-            f"Found {shape_type} at Pixel({u}, {v}) -> Robot({rx:.1f}, {ry:.1f})")
-
-    # 7. Save outputs for UI
-    cv2.imwrite(os.path.join(OUTPUT_DIR, "last_detection.png"), display_img)
-    print(f"Annotated image saved to outputs/last_detection.png")
-
-    print("targets_for_robot", targets_for_robot)
-
-    # 8. Execution Mode Gate
-    if args.mode == "execute" and targets_for_robot:
-        bot = MG400Controller()
-        for x, y in targets_for_robot:
-            if ((x > 425 or x < 250) and (y > 125 or y < -150)):
-                continue
-            bot.pick_and_place(x, y)
-        bot.disconnect()
-    elif args.mode == "execute":
-        print("Execution skipped: No targets found.")
+    job = {"mode": args.mode, "color": args.color, "shape": args.shape,
+           "camera": args.camera, "image": os.path.abspath(args.image),
+           "save_capture": args.save_capture, "motion": args.motion,
+           "transit": args.transit, "sequence": args.sequence, "bins": args.bin,
+           "output_format": args.output_format}
+
+    # Feedback recording is per process, so it runs locally
+    if not (args.local or args.record):
+        try:
+            return send_job(job, args.socket)
+        except (FileNotFoundError, ConnectionRefusedError):
+            pass  # no daemon running
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return None
+    return run_local(job, args.record)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+"""
+Compact, array-backed detection results
+
+A DetectionBatch stores every detection of a frame in one structured NumPy
+array, so filtering, sorting and pixel -> robot mapping work on the whole
+batch at once. Iterating or indexing with an int still yields the plain
+dicts ("pixel_center", "shape", "color", ...) that find_objects used to
+return.
+"""
+
+import numpy as np
+from utils.mapping import pixels_to_robot
+
+SHAPES = ("square", "circle")
+
+DETECTION_DTYPE = np.dtype([
+    ("pixel_center", np.int32, (2,)),   # (u, v)
+    ("robot_xy", np.float64, (2,)),     # (X, Y) in mm, NaN until mapped
+    ("area", np.float64),
+    ("circularity", np.float64),
+    ("bbox", np.int32, (4,)),           # (x, y, w, h)
+    ("color_id", np.int16),             # index into color_names
+    ("shape_id", np.int8),              # index into SHAPES
+    ("timestamp", np.float64),          # frame capture time (monotonic)
+    ("hidden", np.bool_),               # touches an excluded region (e.g. the arm)
+])
+
+
+def new_detections(size, timestamp=0.0):
+    """Zeroed DETECTION_DTYPE array with robot_xy unmapped (NaN)"""
+    data = np.zeros(size, DETECTION_DTYPE)
+    data["robot_xy"] = np.nan
+    data["timestamp"] = timestamp
+    return data
+
+
+class DetectionBatch:
+    """
+    Args:
+        data: structured array with DETECTION_DTYPE
+        color_names: names indexed by the color_id field
+        hidden: optional DetectionBatch of the objects find_objects left
+            out because they touch an excluded region
+    """
+
+    def __init__(self, data=None, color_names=(), hidden=None):
+        if data is None:
+            data = np.zeros(0, DETECTION_DTYPE)
+        self.data = data
+        self.color_names = tuple(color_names)
+        self.hidden = hidden
+
+    @classmethod
+    def from_dicts(cls, detections, color_names=(), timestamp=0.0):
+        """Build a batch from find_objects-style dicts"""
+        color_names = list(color_names)
+        data = new_detections(len(detections), timestamp)
+        for i, obj in enumerate(detections):
+            if obj["color"] not in color_names:
+                color_names.append(obj["color"])
+            row = data[i]
+            row["pixel_center"] = obj["pixel_center"]
+            row["shape_id"] = SHAPES.index(obj["shape"])
+            row["color_id"] = color_names.index(obj["color"])
+            row["area"] = obj.get("area", 0.0)
+            row["circularity"] = obj.get("circularity", 0.0)
+            row["bbox"] = obj.get("bbox", (0, 0, 0, 0))
+            if "robot" in obj:
+                row["robot_xy"] = obj["robot"]
+        return cls(data, color_names)
+
+    @classmethod
+    def concatenate(cls, batches):
+        """Join batches, remapping color ids onto one shared name list"""
+        color_names = []
+        parts = []
+        for batch in batches:
+            for name in batch.color_names:
+                if name not in color_names:
+                    color_names.append(name)
+            part = batch.data.copy()
+            remap = np.array([color_names.index(name)
+                              for name in batch.color_names] or [0], np.int16)
+            part["color_id"] = remap[part["color_id"]]
+            parts.append(part)
+        data = np.concatenate(parts) if parts else None
+        return cls(data, color_names)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        for i in range(len(self.data)):
+            yield self._to_dict(i)
+
+    def __getitem__(self, index):
+        """int -> dict; slice, boolean mask or index array -> DetectionBatch"""
+        if isinstance(index, (int, np.integer)):
+            return self._to_dict(index)
+        return DetectionBatch(self.data[index], self.color_names)
+
+    def __repr__(self):
+        return f"DetectionBatch({len(self)} detections)"
+
+    def _to_dict(self, i):
+        row = self.data[i]
+        u, v = row["pixel_center"]
+        obj = {"pixel_center": (int(u), int(v)),
+               "shape": SHAPES[row["shape_id"]],
+               "color": self.color_names[row["color_id"]],
+               "area": float(row["area"]),
+               "circularity": float(row["circularity"]),
+               "bbox": tuple(int(x) for x in row["bbox"]),
+               "timestamp": float(row["timestamp"])}
+        if not np.isnan(row["robot_xy"]).any():
+            obj["robot"] = tuple(float(x) for x in row["robot_xy"])
+        return obj
+
+    def to_dicts(self):
+        return list(self)
+
+    # Vectorized views
+
+    @property
+    def pixel_centers(self):
+        return self.data["pixel_center"]
+
+    @property
+    def robot_xy(self):
+        return self.data["robot_xy"]
+
+    @property
+    def shapes(self):
+        return np.array(SHAPES)[self.data["shape_id"]]
+
+    @property
+    def colors(self):
+        return np.array(self.color_names or [""])[self.data["color_id"]]
+
+    def shape_mask(self, shape_type):
+        """Boolean mask of detections with this shape ("any" matches all)"""
+        if shape_type == "any":
+            return np.ones(len(self), bool)
+        return self.data["shape_id"] == SHAPES.index(shape_type)
+
+    def color_mask(self, color_name):
+        """Boolean mask of detections with this color ("any" matches all)"""
+        if color_name == "any":
+            return np.ones(len(self), bool)
+        if color_name not in self.color_names:
+            return np.zeros(len(self), bool)
+        return self.data["color_id"] == self.color_names.index(color_name)
+
+    def filter(self, mask):
+        return self[np.asarray(mask, bool)]
+
+    def sort_by(self, field, descending=False):
+        """Sorted copy; field is a scalar field name such as "area" """
+        order = np.argsort(self.data[field], kind="stable")
+        if descending:
+            order = order[::-1]
+        return self[order]
+
+    def map_to_robot(self, H):
+        """Fill robot_xy for the whole batch with one homography call"""
+        if len(self):
+            self.data["robot_xy"] = pixels_to_robot(self.data["pixel_center"], H)
+        return self.data["robot_xy"]
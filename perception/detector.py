@@ -1,10 +1,17 @@
 import cv2
+import hashlib
+import json
+import os
 import numpy as np
 import matplotlib.pyplot as plt
+from perception.detections import DetectionBatch, SHAPES, new_detections
+
+LUT_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache")
 
 
 class ObjectDetector:
-    def __init__(self):
+    def __init__(self, segmentation="hsv", pyramid_levels=0,
+                 lut_bits=5, lut_cache_dir=LUT_CACHE_DIR):
         # HSV Ranges: [Hue, Saturation, Value]
         # Red often spans two ranges (0-10 and 170-180)
         self.colors = {
@@ -12,31 +19,375 @@ class ObjectDetector:
             "blue": ([100, 150, 50], [130, 255, 255]),
             "green": ([40, 100, 50], [80, 255, 255])
         }
+        # Further ranges of a color, applied by both backends (red wraps
+        # around hue 180)
+        self.extra_ranges = {
+            "red": [([170, 150, 50], [180, 255, 255])]
+        }
+        self._build_class_luts()
+
+        # Segmentation backend for labeling all colors: "hsv" (cvtColor +
+        # per-channel tables) or "lut" (one precomputed quantized BGR ->
+        # color class lookup). Single-color masks always go through
+        # cvtColor + inRange, which measured faster than the lookup.
+        if segmentation not in ("hsv", "lut"):
+            raise ValueError(f"Unknown segmentation backend: {segmentation}")
+        self.segmentation = segmentation
+        if segmentation == "lut":
+            self._load_bgr_lut(lut_bits, lut_cache_dir)
+
+        # Coarse-to-fine mode: find candidates on an image downscaled by
+        # 2**pyramid_levels, then refine each one on a full-resolution patch
+        self.pyramid_levels = pyramid_levels
+
+        # Full-resolution noise filters
+        self.min_area = 800
+        self.kernel_size = 5
+
+        # Pixels analysed around the ROI, so an object across its edge is
+        # still measured whole (only objects wider than this are dropped)
+        self.roi_margin = 128
+
+    def _build_class_luts(self):
+        """Precompute the tables used to label every color in one pass.
+
+        Each HSV range is a box, so a pixel falls in range i exactly when bit i
+        is set in the per-channel tables for H, S and V. ANDing the three
+        channel lookups gives a bitmask of matching ranges, and a second table
+        turns that bitmask into a label (1-based index into self.colors, 0 for
+        background). Supports up to 8 ranges, extra_ranges included.
+        """
+        ranges = [(label, box) for label, color_name in enumerate(self.colors, start=1)
+                  for box in self._color_ranges(color_name)]
+        if len(ranges) > 8:
+            raise ValueError("At most 8 color ranges can be labeled in one pass")
+
+        channel_bits = np.zeros((3, 256), np.uint8)
+        values = np.arange(256)
+        for i, (_, (lower, upper)) in enumerate(ranges):
+            for c in range(3):
+                inside = (values >= lower[c]) & (values <= upper[c])
+                channel_bits[c, inside] |= np.uint8(1 << i)
+        self._channel_bits = channel_bits
+
+        # Lowest set bit wins when ranges overlap (ranges are in color order)
+        range_labels = [label for label, _ in ranges] + [0] * (8 - len(ranges))
+        bits_to_label = np.zeros(256, np.uint8)
+        for bits in range(1, 256):
+            bits_to_label[bits] = range_labels[(bits & -bits).bit_length() - 1]
+        self._bits_to_label = bits_to_label
+
+    def _color_ranges(self, color_name):
+        """All (lower, upper) HSV boxes of one color"""
+        return [self.colors[color_name]] + self.extra_ranges.get(color_name, [])
+
+    def _load_bgr_lut(self, bits, cache_dir):
+        """Load (or build and cache) the quantized BGR -> label table.
 
-    def find_objects(self, image, color_name="any", shape_type="any"):
-        # 1. Convert to HSV
-        hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+        The cache file name is a hash of the ranges and quantization, so the
+        table is rebuilt only when the ranges change.
+        """
+        key = json.dumps([self.colors, self.extra_ranges, bits], sort_keys=True)
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(cache_dir, f"color_lut_{digest}.npy")
 
-        # 2. Color Masking
-        if color_name in self.colors:
-            lower, upper = self.colors[color_name]
-            mask = cv2.inRange(hsv, np.array(lower), np.array(upper))
+        if os.path.exists(path):
+            table = np.load(path)
+        else:
+            table = self._build_bgr_lut(bits)
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, table)
+
+        # Per-channel tables that shift each quantized channel into place,
+        # so the table index is built with cv2.LUT + bitwise_or
+        shift = 8 - bits
+        index_dtype = np.uint16 if 3 * bits <= 16 else np.int32
+        levels = np.arange(256) >> shift
+        self._bgr_index_luts = [
+            (levels << (2 * bits)).astype(index_dtype),
+            (levels << bits).astype(index_dtype),
+            levels.astype(index_dtype),
+        ]
+        self._bgr_lut = table
+
+    def _build_bgr_lut(self, bits):
+        """Classify the center of every quantized BGR cell with the HSV ranges"""
+        n = 1 << bits
+        centers = (np.arange(n) << (8 - bits)) + (1 << (7 - bits))
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        cells = np.stack([b, g, r], axis=-1).astype(np.uint8).reshape(-1, 1, 3)
+        hsv = cv2.cvtColor(cells, cv2.COLOR_BGR2HSV)
+
+        table = np.zeros(len(cells), np.uint8)
+        for label, color_name in enumerate(self.colors, start=1):
+            for lower, upper in self._color_ranges(color_name):
+                inside = cv2.inRange(hsv, np.array(lower),
+                                     np.array(upper)).ravel() > 0
+                # Lowest label wins when ranges overlap
+                table[inside & (table == 0)] = label
+        return table
+
+    def classify_bgr(self, image):
+        """Label a BGR image through the precomputed lookup (same labels as label_colors)"""
+        b, g, r = cv2.split(image)
+        index = cv2.LUT(b, self._bgr_index_luts[0])
+        cv2.bitwise_or(index, cv2.LUT(g, self._bgr_index_luts[1]), dst=index)
+        cv2.bitwise_or(index, cv2.LUT(r, self._bgr_index_luts[2]), dst=index)
+        return np.take(self._bgr_lut, index)
+
+    def label_colors(self, hsv):
+        """Return a uint8 label image: 0 = background, i + 1 = i-th color"""
+        h, s, v = cv2.split(hsv)
+        bits = cv2.LUT(h, self._channel_bits[0])
+        cv2.bitwise_and(bits, cv2.LUT(s, self._channel_bits[1]), dst=bits)
+        cv2.bitwise_and(bits, cv2.LUT(v, self._channel_bits[2]), dst=bits)
+        return cv2.LUT(bits, self._bits_to_label)
+
+    def find_objects(self, image, color_name="any", shape_type="any", roi=None,
+                     exclude=None):
+        """
+        Detect objects of one color (or "any" / "all") and shape
+
+        Args:
+            image: BGR image
+            color_name: a key of self.colors, "any" (dark objects) or "all"
+            shape_type: "circle", "square" or "any"
+            roi: optional (N, 2) pixel polygon; only objects whose centroid
+                lies inside it are returned (the frame is cropped to its
+                bounding box plus roi_margin, objects cut by the crop are
+                dropped)
+            exclude: optional list of (N, 2) pixel polygons, e.g. the arm's
+                footprint (see utils.mapping.arm_footprint); objects that
+                touch them are left out, in the batch's hidden attribute
+
+        Returns:
+            DetectionBatch: iterates as dicts with "pixel_center", "shape",
+            "color", "area", "circularity" and "bbox"
+        """
+        crop, offset, excluded = self._crop_to_roi(image, roi, exclude, self.roi_margin)
+        color_names = list(self.colors)
+        if color_name != "all" and color_name not in color_names:
+            color_names.append(color_name)
+
+        if self.pyramid_levels > 0:
+            data = self._find_pyramid(crop, color_name, shape_type, excluded, color_names)
+        else:
+            segmented = self._segment(crop, color_name, self.kernel_size)
+            data = self._analyze(segmented, color_name, shape_type, color_names, excluded)
+        self._shift_results(data, offset)
+        if roi is not None:
+            data = data[self._inside_roi(data, roi, offset, crop.shape, image.shape)]
+        if excluded is None:
+            return DetectionBatch(data, color_names)
+        hidden = data["hidden"]
+        return DetectionBatch(data[~hidden], color_names,
+                              hidden=DetectionBatch(data[hidden], color_names))
+
+    def find_all_objects(self, image, shape_type="any", roi=None, exclude=None):
+        """Detect every configured color from a single HSV conversion"""
+        return self.find_objects(image, "all", shape_type, roi, exclude)
+
+    def _segment(self, image, color_name, kernel_size):
+        """Cleaned 0/255 mask for one color, or cleaned label image for "all"."""
+        if color_name == "all":
+            # 1. Convert to HSV once and label all colors in one pass
+            if self.segmentation == "lut":
+                labels = self.classify_bgr(image)
+            else:
+                hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+                labels = self.label_colors(hsv)
+
+            # 2. Morphology on the union of all colors
+            _, mask = cv2.threshold(labels, 0, 255, cv2.THRESH_BINARY)
+        elif color_name in self.colors:
+            # 1. Convert to HSV
+            hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+
+            # 2. Color Masking (every range of the color)
+            mask = None
+            for lower, upper in self._color_ranges(color_name):
+                in_range = cv2.inRange(hsv, np.array(lower), np.array(upper))
+                mask = in_range if mask is None else cv2.bitwise_or(mask, in_range)
         else:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             _, mask = cv2.threshold(gray, 110, 255, cv2.THRESH_BINARY_INV)
 
         # 3. Morphology (Cleaning the mask)
-        kernel = np.ones((5, 5), np.uint8)
-        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+        if kernel_size > 1:
+            kernel = np.ones((kernel_size, kernel_size), np.uint8)
+            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+        if color_name == "all":
+            return cv2.bitwise_and(labels, labels, mask=mask)
+        return mask
+
+    def _color_masks(self, segmented, color_name):
+        """Yield (color, mask) pairs from a _segment result"""
+        if color_name != "all":
+            yield color_name, segmented
+            return
+        # Split the label image per color for contour analysis
+        for label, name in enumerate(self.colors, start=1):
+            yield name, cv2.compare(segmented, label, cv2.CMP_EQ)
+
+    def _analyze(self, segmented, color_name, shape_type, color_names, excluded=None):
+        parts = [self._analyze_mask(mask, color_names.index(name), shape_type, excluded)
+                 for name, mask in self._color_masks(segmented, color_name)]
+        return np.concatenate(parts)
+
+    def _find_pyramid(self, image, color_name, shape_type, excluded, color_names):
+        """
+        Coarse-to-fine detection
+
+        Blobs are found on the image downscaled by 2**pyramid_levels, with the
+        morphology kernel and area threshold scaled to match. Each candidate is
+        then re-segmented on a full-resolution patch around it, so the
+        returned center, circularity and area filter are the full-resolution
+        ones.
+        """
+        scale = 2 ** self.pyramid_levels
+        height, width = image.shape[:2]
+        # A multiple of scale keeps every halving on the exact 2x INTER_AREA
+        # path (an odd size, e.g. an ROI crop, is several times slower); the
+        # trimmed edge is still covered by the full-resolution patches
+        small = image[:height - height % scale, :width - width % scale]
+        for _ in range(self.pyramid_levels):
+            small = cv2.resize(small, (small.shape[1] // 2, small.shape[0] // 2),
+                               interpolation=cv2.INTER_AREA)
+
+        # 1. Candidates on the coarse level (loose area threshold; the exact
+        # one is applied after refinement)
+        coarse_kernel = max(1, int(round(self.kernel_size / scale)))
+        coarse_min_area = 0.5 * self.min_area / scale**2
+        segmented = self._segment(small, color_name, coarse_kernel)
+
+        # Margin covers the coarse bbox error plus the opening's reach
+        margin = 2 * scale + self.kernel_size
+        parts = []
+        seen = set()
+        for name, mask in self._color_masks(segmented, color_name):
+            color_id = color_names.index(name)
+            contours, _ = cv2.findContours(
+                mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            found = new_detections(len(contours))
+            count = 0
+            for cnt in contours:
+                if cv2.contourArea(cnt) < coarse_min_area:
+                    continue
 
+                # 2. Refine on a full-resolution patch
+                x, y, w, h = cv2.boundingRect(cnt)
+                x0 = max(x * scale - margin, 0)
+                y0 = max(y * scale - margin, 0)
+                x1 = min((x + w) * scale + margin, width)
+                y1 = min((y + h) * scale + margin, height)
+                patch = self._segment(image[y0:y1, x0:x1], color_name, self.kernel_size)
+                _, patch_mask = next(
+                    m for m in self._color_masks(patch, color_name) if m[0] == name)
+
+                # Keep the patch blob closest to the coarse candidate
+                M = cv2.moments(cnt)
+                if M["m00"] == 0:
+                    continue
+                expected = ((M["m10"] / M["m00"] + 0.5) * scale - x0,
+                            (M["m01"] / M["m00"] + 0.5) * scale - y0)
+                fine_contours, _ = cv2.findContours(
+                    patch_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                fine = self._describe_contours(
+                    fine_contours, color_id, shape_type,
+                    None if excluded is None else excluded[y0:y1, x0:x1])
+                if not len(fine):
+                    continue
+                dist = np.sum((fine["pixel_center"] - expected)**2, axis=1)
+                best = fine[np.argmin(dist):np.argmin(dist) + 1]
+                self._shift_results(best, (x0, y0))
+
+                key = (color_id,) + tuple(int(c) for c in best["pixel_center"][0])
+                if key not in seen:
+                    seen.add(key)
+                    found[count] = best[0]
+                    count += 1
+            parts.append(found[:count])
+        return np.concatenate(parts)
+
+    @staticmethod
+    def _crop_to_roi(image, roi, exclude=None, margin=0):
+        """Crop to the bounding box of the ROI polygon, plus margin pixels.
+
+        The polygon itself is not masked in: an object crossing the
+        workspace edge would be cut into fragments with shifted centroids.
+        Returns the cropped view, its (x, y) offset and a mask of the
+        exclude polygons in the crop (None when there is nothing to exclude).
+        Excluded pixels are not masked out either, for the same reason: an
+        object under the arm is found whole and marked hidden.
+        """
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = 0, 0, width, height
+        if roi is not None:
+            roi = np.asarray(roi, dtype=np.int32).reshape(-1, 2)
+            x0, y0 = np.clip(roi.min(axis=0) - margin, 0, [width, height])
+            x1, y1 = np.clip(roi.max(axis=0) + 1 + margin, 0, [width, height])
+        excluded = None
+        if exclude:
+            excluded = np.zeros((y1 - y0, x1 - x0), np.uint8)
+            # One at a time: fillPoly leaves the overlap of several polygons unfilled
+            for polygon in exclude:
+                polygon = np.asarray(polygon, dtype=np.int32).reshape(-1, 2) - (x0, y0)
+                cv2.fillPoly(excluded, [polygon], 255)
+        return image[y0:y1, x0:x1], (int(x0), int(y0)), excluded
+
+    @staticmethod
+    def _inside_roi(data, roi, offset, crop_shape, image_shape):
+        """
+        Boolean mask of the detections that belong to the ROI
+
+        A detection is kept when its centroid lies inside the polygon and
+        the crop did not cut it off (touching the crop border is fine where
+        that border is the frame's own edge).
+        """
+        roi = np.asarray(roi, dtype=np.int32).reshape(-1, 1, 2)
+        x0, y0 = offset
+        x1, y1 = x0 + crop_shape[1], y0 + crop_shape[0]
+        height, width = image_shape[:2]
+        x, y, w, h = data["bbox"].T
+        cut = (((x <= x0) & (x0 > 0)) | ((y <= y0) & (y0 > 0))
+               | ((x + w >= x1) & (x1 < width)) | ((y + h >= y1) & (y1 < height)))
+        inside = np.array([cv2.pointPolygonTest(roi, (float(u), float(v)), False) >= 0
+                           for u, v in data["pixel_center"]], bool).reshape(-1)
+        return inside & ~cut
+
+    @staticmethod
+    def _shift_results(data, offset):
+        """Move detections from crop to image coordinates, in place"""
+        if offset != (0, 0):
+            data["pixel_center"] += offset
+            data["bbox"][:, :2] += offset
+        return data
+
+    def _analyze_mask(self, mask, color_id, shape_type, excluded=None):
         # 4. Contour Analysis
         contours, _ = cv2.findContours(
             mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return self._describe_contours(contours, color_id, shape_type, excluded)
+
+    def _describe_contours(self, contours, color_id, shape_type, excluded=None):
+        """
+        Detections array for the contours that pass the filters
 
-        results = []
+        Values are written straight into the columns of one preallocated
+        DETECTION_DTYPE array, without an intermediate object per blob.
+        A blob overlapping the excluded mask (same coordinates as the
+        contours) is marked hidden.
+        """
+        data = new_detections(len(contours))
+        centers, bboxes = data["pixel_center"], data["bbox"]
+        areas, circularities = data["area"], data["circularity"]
+        shape_ids, hidden = data["shape_id"], data["hidden"]
+        circle_id, square_id = SHAPES.index("circle"), SHAPES.index("square")
+        count = 0
         for cnt in contours:
             area = cv2.contourArea(cnt)
-            if area < 800:
+            if area < self.min_area:
                 continue  # Filter small noise
 
             # 5. Circularity (Lesson 5 Shape Descriptor)
@@ -52,10 +403,19 @@ class ObjectDetector:
 
             # Calculate Center (u, v)
             M = cv2.moments(cnt)
-            if M["m00"] != 0:
-                u = int(M["m10"] / M["m00"])
-                v = int(M["m01"] / M["m00"])
-                results.append(
-                    {"pixel_center": (u, v), "shape": detected_shape, "color": color_name})
-
-        return results
+            if M["m00"] == 0:
+                continue
+            centers[count] = (int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"]))
+            shape_ids[count] = circle_id if detected_shape == "circle" else square_id
+            areas[count] = area
+            circularities[count] = circularity
+            bboxes[count] = x, y, w, h = cv2.boundingRect(cnt)
+            if excluded is not None and excluded[y:y + h, x:x + w].any():
+                blob = np.zeros((h, w), np.uint8)
+                cv2.drawContours(blob, [cnt], -1, 255, -1, offset=(-x, -y))
+                hidden[count] = cv2.countNonZero(
+                    cv2.bitwise_and(blob, excluded[y:y + h, x:x + w])) > 0
+            count += 1
+        data = data[:count]
+        data["color_id"] = color_id
+        return data
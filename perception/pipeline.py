@@ -0,0 +1,84 @@
+"""
+In-memory capture -> detect -> map pipeline
+
+Frames, detections and robot targets are handed from Camera to
+ObjectDetector to the homography mapping as in-memory objects. Writing
+images to disk is an optional sink attached to the pipeline, not the
+transport between stages.
+"""
+
+import os
+import time
+import cv2
+
+
+class ImageFileSink:
+    """Sink that writes each processed frame to an image file"""
+
+    def __init__(self, path, params=None):
+        self.path = path
+        self.params = params or []
+
+    def __call__(self, result):
+        folder = os.path.dirname(self.path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        cv2.imwrite(self.path, result["frame"], self.params)
+
+
+class VisionPipeline:
+    """
+    Args:
+        detector: ObjectDetector instance
+        H: 3x3 pixel -> robot homography
+        camera: optional Camera used by run_once()
+        roi: optional workspace polygon passed to the detector
+        sinks: callables receiving every result dict (e.g. ImageFileSink)
+    """
+
+    def __init__(self, detector, H, camera=None, roi=None, sinks=()):
+        self.detector = detector
+        self.H = H
+        self.camera = camera
+        self.roi = roi
+        self.sinks = list(sinks)
+
+    def process(self, frame, color_name="any", shape_type="any", timestamp=None,
+                exclude=None):
+        """
+        Detect and map objects in an in-memory frame
+
+        Args:
+            exclude: optional pixel polygons to ignore (e.g. the arm)
+
+        Returns:
+            dict: "frame", "timestamp", "detections" (DetectionBatch with
+            robot_xy filled in), "targets" (robot (X, Y) per detection,
+            same order) and "hidden" (robot (X, Y) of the objects touching
+            the exclude polygons, not targets)
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        detections = self.detector.find_objects(
+            frame, color_name, shape_type, roi=self.roi, exclude=exclude)
+        detections.data["timestamp"] = timestamp
+        targets = [tuple(xy) for xy in detections.map_to_robot(self.H)]
+        hidden = []
+        if detections.hidden is not None:
+            hidden = [tuple(xy) for xy in detections.hidden.map_to_robot(self.H)]
+
+        result = {"frame": frame, "timestamp": timestamp,
+                  "detections": detections, "targets": targets, "hidden": hidden}
+        for sink in self.sinks:
+            sink(result)
+        return result
+
+    def run_once(self, color_name="any", shape_type="any", timeout=1.0):
+        """Capture a frame from the camera and process it"""
+        if self.camera is None:
+            raise RuntimeError("VisionPipeline has no camera")
+        frame, timestamp = self.camera.capture(timeout)
+        if frame is None:
+            return None
+        return self.process(frame, color_name, shape_type, timestamp)
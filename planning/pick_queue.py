@@ -0,0 +1,136 @@
+"""
+Pending picks merged across frames
+
+In pipelined execution a new frame is detected while the arm is still
+picking, so the same object shows up in frame after frame. PickQueue keeps
+one entry per physical object: detections within tolerance of a pending
+target refresh it (and move it to where it was last seen), those near the
+target being picked or already picked are dropped, and pending targets that
+stop being detected (while not hidden under the arm) are removed. Objects
+the detector saw touching the arm's footprint are hidden too: they keep the
+targets near them alive but never add one, as their position may be the
+arm's as much as theirs. A picked spot only drops detections in frames
+exposed before the pick ended: the part left with the gripper, so anything
+a later frame shows there (a part put there since, or one the gripper
+missed) is picked again. The next pick is chosen by re-running plan_picks
+over what is pending, from where the arm is.
+"""
+
+import threading
+import time
+import numpy as np
+from planning.sequencer import plan_picks
+
+
+class PickQueue:
+    """
+    Args:
+        tolerance: mm within which two detections are the same object
+        max_misses: frames a pending target may go undetected (while not
+            covered by the arm) before it is dropped
+    """
+
+    def __init__(self, tolerance=15.0, max_misses=2):
+        self.tolerance = tolerance
+        self.max_misses = max_misses
+        self.pending = []   # [x, y, misses]
+        self.picked = []    # (x, y, time.monotonic() of the end of the pick)
+        self.active = None  # (x, y) being picked
+        self.frames = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self.pending)
+
+    def _near(self, xy, points):
+        if not len(points):
+            return np.zeros(0, bool)
+        return np.linalg.norm(np.asarray(points, dtype=np.float64)[:, :2] - xy, axis=1) <= self.tolerance
+
+    def merge(self, targets, covered=None, timestamp=None, hidden=()):
+        """
+        Fold the targets of one frame into the queue
+
+        Args:
+            targets: robot (x, y) detected in the frame
+            covered: optional function (N, 2) points -> (N,) bool, True where
+                the arm hid that point in the frame (not counted as a miss)
+            timestamp: time.monotonic() the frame was exposed; None for a
+                still image, which never shows a picked spot again
+            hidden: robot (x, y) of objects touching the arm in the frame;
+                the points near them count as covered
+
+        Returns:
+            int: targets added
+        """
+        hidden = [np.asarray(xy, dtype=np.float64) for xy in hidden]
+
+        def under_arm(points):
+            points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+            result = np.zeros(len(points), bool)
+            if covered is not None:
+                result |= np.asarray(covered(points), bool)
+            for xy in hidden:
+                result |= self._near(xy, points)
+            return result
+
+        added = 0
+        with self._lock:
+            self.frames += 1
+            existing = len(self.pending)
+            seen = np.zeros(existing, bool)
+            if timestamp is not None:
+                # Frames exposed after a pick ended see its spot as it is
+                self.picked = [p for p in self.picked if timestamp < p[2]]
+            done = [p[:2] for p in self.picked]
+            if self.active is not None:
+                done.append(self.active)
+            for x, y in targets:
+                xy = np.array([x, y], dtype=np.float64)
+                if self._near(xy, done).any():
+                    continue
+                match = self._near(xy, self.pending)
+                if match.any():
+                    seen |= match[:existing]
+                    # The newest sighting wins: an earlier one may have been
+                    # a part of the object partly hidden by the arm
+                    i = np.flatnonzero(match)[0]
+                    self.pending[i][:2] = [float(x), float(y)]
+                    continue
+                self.pending.append([float(x), float(y), 0])
+                added += 1
+
+            under = under_arm([p[:2] for p in self.pending])
+            kept = []
+            for i, entry in enumerate(self.pending):
+                found = i >= existing or seen[i]
+                entry[2] = 0 if found or under[i] else entry[2] + 1
+                if entry[2] <= self.max_misses:
+                    kept.append(entry)
+            self.pending = kept
+        return added
+
+    def next(self, bins, cost_model=None, start=None):
+        """
+        Take the first pick of the best plan over the pending targets
+
+        Returns:
+            tuple: ((x, y), bin index), or None when nothing is pending
+        """
+        with self._lock:
+            if not self.pending:
+                return None
+            targets = [(x, y) for x, y, _ in self.pending]
+            plan = plan_picks(targets, bins, cost_model, start=start)
+            first = plan["order"][0]
+            x, y, _ = self.pending.pop(first)
+            self.active = (x, y)
+            return (x, y), plan["bins"][0]
+
+    def done(self):
+        """The active pick finished"""
+        with self._lock:
+            if self.active is not None:
+                self.picked.append(self.active + (time.monotonic(),))
+                self.active = None
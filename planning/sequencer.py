@@ -0,0 +1,281 @@
+"""
+Pick-sequence optimizer
+
+Orders the pick targets (and chooses a drop bin for each pick) to minimize
+the estimated cycle time, instead of running them in contour-discovery
+order. A cycle is: transit from where the arm is to the target, pick, transit
+to a bin, release. The order-dependent part is the transit time, estimated
+by CycleCostModel; the pick/release part is the same for every order.
+
+Planning is an open path from the start pose through every target, where
+going from target i to target j costs the best detour through a bin that i
+may be dropped in. Small batches are solved exactly (Held-Karp), larger
+ones with nearest neighbour + 2-opt.
+"""
+
+import math
+import numpy as np
+
+# Batches up to this size are solved exactly (2^n * n^2 work)
+EXACT_LIMIT = 9
+
+
+def trapezoid_time(distance, speed, acc):
+    """Rest-to-rest duration of a trapezoidal profile (vectorized)"""
+    distance = np.abs(np.asarray(distance, dtype=np.float64))
+    full_speed = distance / speed + speed / acc
+    triangle = 2.0 * np.sqrt(distance / acc)
+    return np.where(speed * speed / acc >= distance, triangle, full_speed)
+
+
+class CycleCostModel:
+    """
+    Estimated MG400 move times between pick targets and drop bins
+
+    The defaults match MG400Controller (hover/pick/place heights, 50% speed
+    and acceleration ratios) and the arm limits used by robot/simulator.py.
+
+    Args:
+        space: "joint" - MovJ time from J1 rotation and reach/height change
+            (the slowest axis dominates), or "cartesian" - straight-line time
+            at the linear speed
+        transit: "segments" (MovL up, MovJ across, MovL down) or "arch" (one
+            Jump from pick height to place height), as in MG400Controller
+        speed_ratio, acc_ratio: SpeedJ/SpeedL and AccJ/AccL percentages
+    """
+
+    def __init__(self, space="joint", transit="segments", speed_ratio=50,
+                 acc_ratio=50, safe_z=-75.0, pick_z=-165.0, place_z=-75.0,
+                 grip_time=0.3, release_time=0.3, joint_speed=300.0,
+                 joint_acc=1500.0, linear_speed=1000.0, linear_acc=4000.0):
+        if space not in ("joint", "cartesian"):
+            raise ValueError(f"Unknown cost space: {space}")
+        if transit not in ("segments", "arch"):
+            raise ValueError(f"Unknown transit mode: {transit}")
+        self.space = space
+        self.transit = transit
+        self.safe_z = safe_z
+        self.pick_z = pick_z
+        self.place_z = place_z
+        self.grip_time = grip_time
+        self.release_time = release_time
+        self.joint_speed = joint_speed * speed_ratio / 100.0
+        self.joint_acc = joint_acc * acc_ratio / 100.0
+        self.linear_speed = linear_speed * speed_ratio / 100.0
+        self.linear_acc = linear_acc * acc_ratio / 100.0
+
+    @classmethod
+    def for_controller(cls, bot, space="joint", speed_ratio=50, acc_ratio=50):
+        """Model matching the heights, dwells and transit of an MG400Controller"""
+        return cls(space=space, transit=bot.transit, speed_ratio=speed_ratio,
+                   acc_ratio=acc_ratio, safe_z=bot.safe_z, pick_z=bot.pick_z,
+                   place_z=bot.place_z, grip_time=bot.grip_time,
+                   release_time=bot.release_time)
+
+    def transit_times(self, src, dst):
+        """
+        Transit time from every point in src to every point in dst
+
+        Args:
+            src: (N, 2) robot XY in mm
+            dst: (M, 2) robot XY in mm
+
+        Returns:
+            np.ndarray: (N, M) seconds
+        """
+        src = np.asarray(src, dtype=np.float64).reshape(-1, 2)
+        dst = np.asarray(dst, dtype=np.float64).reshape(-1, 2)
+        delta = dst[None, :, :] - src[:, None, :]
+        planar = np.hypot(delta[..., 0], delta[..., 1])
+
+        if self.transit == "arch":
+            # Lift, traverse and descend blended into one linear profile
+            length = (self.safe_z - self.pick_z) + planar + (self.safe_z - self.place_z)
+            return trapezoid_time(length, self.linear_speed, self.linear_acc)
+
+        if self.space == "cartesian":
+            return trapezoid_time(planar, self.linear_speed, self.linear_acc)
+
+        # MovJ between hover points: J1 turns by the polar angle difference,
+        # J2/J3 change the reach; all axes finish together
+        theta_src = np.degrees(np.arctan2(src[:, 1], src[:, 0]))
+        theta_dst = np.degrees(np.arctan2(dst[:, 1], dst[:, 0]))
+        d_theta = (theta_dst[None, :] - theta_src[:, None] + 180.0) % 360.0 - 180.0
+        d_rho = np.hypot(dst[:, 0], dst[:, 1])[None, :] - np.hypot(src[:, 0], src[:, 1])[:, None]
+        return np.maximum(trapezoid_time(d_theta, self.joint_speed, self.joint_acc),
+                          trapezoid_time(d_rho, self.linear_speed, self.linear_acc))
+
+    def pick_overhead(self):
+        """Order-independent time per pick: vertical moves and gripper dwells"""
+        dwell = self.grip_time + self.release_time
+        if self.transit == "arch":
+            return dwell
+        vertical = float(trapezoid_time(self.safe_z - self.pick_z,
+                                        self.linear_speed, self.linear_acc))
+        return 2.0 * vertical + dwell
+
+
+def _route_cost(order, start_costs, pair_costs, end_costs):
+    if not order:
+        return 0.0
+    cost = start_costs[order[0]] + end_costs[order[-1]]
+    for i, j in zip(order, order[1:]):
+        cost += pair_costs[i, j]
+    return float(cost)
+
+
+def _solve_exact(start_costs, pair_costs, end_costs):
+    """Held-Karp over open paths with a fixed start and free end"""
+    n = len(start_costs)
+    cost = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.int64)
+    for j in range(n):
+        cost[1 << j, j] = start_costs[j]
+    # Every subset of a mask is numerically smaller, so it is final by now
+    for mask in range(1, 1 << n):
+        for last in range(n):
+            if not mask & (1 << last) or not np.isfinite(cost[mask, last]):
+                continue
+            candidates = cost[mask, last] + pair_costs[last]
+            for j in range(n):
+                if mask & (1 << j):
+                    continue
+                if candidates[j] < cost[mask | (1 << j), j]:
+                    cost[mask | (1 << j), j] = candidates[j]
+                    parent[mask | (1 << j), j] = last
+
+    mask = (1 << n) - 1
+    last = int(np.argmin(cost[mask] + end_costs))
+    order = []
+    while last >= 0:
+        order.append(last)
+        previous = int(parent[mask, last])
+        mask &= ~(1 << last)
+        last = previous
+    return order[::-1]
+
+
+def _nearest_neighbour(start_costs, pair_costs):
+    n = len(start_costs)
+    visited = np.zeros(n, bool)
+    current = int(np.argmin(start_costs))
+    order = [current]
+    visited[current] = True
+    for _ in range(n - 1):
+        costs = np.where(visited, np.inf, pair_costs[current])
+        current = int(np.argmin(costs))
+        order.append(current)
+        visited[current] = True
+    return order
+
+
+def _two_opt(order, start_costs, pair_costs, end_costs):
+    """
+    Reverse segments of the route while that shortens it
+
+    The costs need not be symmetric (bins allowed per target differ), so a
+    reversed segment is re-priced in the backward direction using prefix
+    sums of the forward and backward edge costs along the route.
+    """
+    n = len(order)
+    if n < 3:
+        return order
+    # Augmented matrix: index n is the start pose, n + 1 the virtual end.
+    # Edges into the start or out of the end are never priced (zero).
+    M = np.zeros((n + 2, n + 2))
+    M[:n, :n] = pair_costs
+    M[n, :n] = start_costs
+    M[:n, n + 1] = end_costs
+
+    route = np.array([n] + list(order) + [n + 1])
+    improved = True
+    while improved:
+        improved = False
+        forward = np.concatenate([[0.0], np.cumsum(M[route[:-1], route[1:]])])
+        backward = np.concatenate([[0.0], np.cumsum(M[route[1:], route[:-1]])])
+        for a in range(1, n):
+            b = np.arange(a + 1, n + 1)
+            # Forward costs inside the segment become backward costs
+            delta = (M[route[a - 1], route[b]] + M[route[a], route[b + 1]]
+                     + (backward[b] - backward[a]) - (forward[b] - forward[a])
+                     - M[route[a - 1], route[a]] - M[route[b], route[b + 1]])
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                route[a:b[k] + 1] = route[a:b[k] + 1][::-1]
+                improved = True
+                break
+    return [int(i) for i in route[1:-1]]
+
+
+def plan_picks(targets, bins, cost_model=None, start=None, target_bins=None,
+               exact_limit=EXACT_LIMIT):
+    """
+    Order the picks and pick a drop bin for each
+
+    Args:
+        targets: list of (x, y) robot coordinates, in discovery order
+        bins: list of drop bin (x, y[, z]) robot coordinates
+        cost_model: CycleCostModel (default: controller defaults)
+        start: (x, y) where the arm is before the first pick (default: first bin)
+        target_bins: optional list, per target, of the bin indices it may be
+            dropped in (e.g. sorting by color); None allows every bin
+        exact_limit: largest batch solved exactly
+
+    Returns:
+        dict: "order" (indices into targets), "targets" (reordered (x, y)),
+        "bins" (bin index per pick), "estimated_time" and "discovery_time"
+        (seconds for the whole batch), "saved" (seconds) and "method"
+    """
+    if cost_model is None:
+        cost_model = CycleCostModel()
+    n = len(targets)
+    bins_xy = np.asarray([b[:2] for b in bins], dtype=np.float64).reshape(-1, 2)
+    if len(bins_xy) == 0:
+        raise ValueError("At least one drop bin is required")
+    if start is None:
+        start = bins_xy[0]
+    if n == 0:
+        return {"order": [], "targets": [], "bins": [], "estimated_time": 0.0,
+                "discovery_time": 0.0, "saved": 0.0, "method": "empty"}
+    points = np.asarray(targets, dtype=np.float64).reshape(-1, 2)
+
+    to_bin = cost_model.transit_times(points, bins_xy)      # (n, m)
+    from_bin = cost_model.transit_times(bins_xy, points)    # (m, n)
+    if target_bins is not None:
+        allowed = np.zeros(to_bin.shape, bool)
+        for i, choices in enumerate(target_bins):
+            allowed[i, list(range(len(bins_xy)) if choices is None else choices)] = True
+        to_bin = np.where(allowed, to_bin, np.inf)
+
+    # Going from target i to target j detours through i's best bin
+    via_bin = to_bin[:, :, None] + from_bin[None, :, :]     # (n, m, n)
+    pair_bins = np.argmin(via_bin, axis=1)
+    pair_costs = np.take_along_axis(via_bin, pair_bins[:, None, :], axis=1)[:, 0, :]
+    end_bins = np.argmin(to_bin, axis=1)
+    end_costs = to_bin[np.arange(n), end_bins]
+    start_costs = cost_model.transit_times([start[:2]], points)[0]
+
+    if n <= exact_limit:
+        order = _solve_exact(start_costs, pair_costs, end_costs)
+        method = "exact"
+    else:
+        order = _nearest_neighbour(start_costs, pair_costs)
+        order = _two_opt(order, start_costs, pair_costs, end_costs)
+        method = "nearest-neighbour + 2-opt"
+
+    discovery = list(range(n))
+    overhead = n * cost_model.pick_overhead()
+    estimated = _route_cost(order, start_costs, pair_costs, end_costs) + overhead
+    baseline = _route_cost(discovery, start_costs, pair_costs, end_costs) + overhead
+    if not math.isfinite(estimated):
+        raise ValueError("A target has no allowed drop bin")
+
+    drops = [int(pair_bins[i, j]) for i, j in zip(order, order[1:])]
+    drops.append(int(end_bins[order[-1]]))
+    return {"order": order,
+            "targets": [tuple(targets[i]) for i in order],
+            "bins": drops,
+            "estimated_time": estimated,
+            "discovery_time": baseline,
+            "saved": baseline - estimated,
+            "method": method}
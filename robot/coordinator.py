@@ -0,0 +1,167 @@
+"""
+Multi-arm pick coordinator
+
+Distributes pick targets over several MG400Controller instances working
+the same area (e.g. a shared conveyor seen by one camera). Targets are
+given in one shared frame; each arm has its base at an origin in that
+frame and a reachable workspace in its own frame. A target goes to the
+arm that can reach it and would finish it first, counting the estimated
+time of the picks already assigned to that arm. Every arm runs its picks
+on its own worker thread.
+"""
+
+import queue
+import threading
+import numpy as np
+from planning.sequencer import CycleCostModel
+from utils.mapping import ROBOT_WORKSPACE
+
+
+class PickCoordinator:
+    """
+    Args:
+        robots: connected MG400Controller instances
+        origins: (x, y) of each robot base in the shared target frame
+            (default: every robot at (0, 0))
+        workspace: (x_min, x_max, y_min, y_max) reachable area, in each
+            robot's own frame
+        motion: "blocking" (pick_and_place per target) or "queued" (each
+            worker streams whatever is waiting with run_queued)
+    """
+
+    def __init__(self, robots, origins=None, workspace=ROBOT_WORKSPACE,
+                 motion="blocking"):
+        if motion not in ("blocking", "queued"):
+            raise ValueError(f"Unknown motion mode: {motion}")
+        self.robots = list(robots)
+        n = len(self.robots)
+        if origins is None:
+            origins = np.zeros((n, 2))
+        self.origins = np.asarray(origins, dtype=np.float64).reshape(n, 2)
+        self.workspace = workspace
+        self.motion = motion
+        self.models = [CycleCostModel.for_controller(bot) for bot in self.robots]
+
+        self._cond = threading.Condition()
+        self._queues = [queue.Queue() for _ in range(n)]
+        self._threads = []
+        # Estimated seconds of assigned, unfinished picks per robot
+        self.load = [0.0] * n
+        self.pending = [0] * n
+        self.picked = [0] * n
+        self.unreachable = 0
+
+    def to_local(self, index, x, y):
+        """Shared-frame (x, y) -> robot index's own frame"""
+        ox, oy = self.origins[index]
+        return x - ox, y - oy
+
+    def reachable(self, index, x, y):
+        x_min, x_max, y_min, y_max = self.workspace
+        lx, ly = self.to_local(index, x, y)
+        return x_min <= lx <= x_max and y_min <= ly <= y_max
+
+    def pick_time(self, index, x, y):
+        """Estimated seconds for robot index to pick (x, y) and return to its bin"""
+        model = self.models[index]
+        drop = self.robots[index].drop_location[:2]
+        transit = model.transit_times([drop], [self.to_local(index, x, y)])[0, 0]
+        return 2.0 * transit + model.pick_overhead()
+
+    def assign(self, x, y):
+        """Index of the robot that would finish (x, y) first, or None if unreachable"""
+        best, best_finish = None, None
+        with self._cond:
+            for i in range(len(self.robots)):
+                if not self.reachable(i, x, y):
+                    continue
+                finish = self.load[i] + self.pick_time(i, x, y)
+                if best is None or finish < best_finish:
+                    best, best_finish = i, finish
+        return best
+
+    def submit(self, targets):
+        """
+        Assign targets (shared frame) to robots and queue them
+
+        Returns:
+            list: robot index per target, None where no robot reaches it
+        """
+        assigned = []
+        for x, y in targets:
+            index = self.assign(x, y)
+            assigned.append(index)
+            if index is None:
+                print(f"Target ({x:.1f}, {y:.1f}) is out of reach of every robot")
+                with self._cond:
+                    self.unreachable += 1
+                continue
+            estimate = self.pick_time(index, x, y)
+            with self._cond:
+                self.load[index] += estimate
+                self.pending[index] += 1
+            self._queues[index].put((*self.to_local(index, x, y), estimate))
+        return assigned
+
+    def start(self):
+        """Start one worker thread per robot"""
+        if self._threads:
+            return self
+        for index in range(len(self.robots)):
+            worker = threading.Thread(target=self._worker, args=(index,))
+            worker.daemon = True
+            worker.start()
+            self._threads.append(worker)
+        return self
+
+    def _worker(self, index):
+        robot = self.robots[index]
+        jobs = self._queues[index]
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            batch = [job]
+            if self.motion == "queued":
+                # Stream everything already waiting in one controller queue
+                while True:
+                    try:
+                        job = jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        jobs.put(None)
+                        break
+                    batch.append(job)
+            try:
+                if self.motion == "queued":
+                    robot.run_queued([(x, y) for x, y, _ in batch])
+                else:
+                    robot.pick_and_place(batch[0][0], batch[0][1])
+            except Exception as e:
+                print(f"Robot {robot.ip} pick failed: {e}")
+            with self._cond:
+                for _, _, estimate in batch:
+                    self.load[index] = max(0.0, self.load[index] - estimate)
+                self.pending[index] -= len(batch)
+                self.picked[index] += len(batch)
+                self._cond.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted pick is done; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not any(self.pending), timeout)
+
+    def stop(self):
+        """Let the workers finish their queues, then end them"""
+        for jobs in self._queues:
+            jobs.put(None)
+        for worker in self._threads:
+            worker.join()
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,11 +1,14 @@
 # Dobot Python API from https://github.com/Dobot-Arm/TCP-IP-4Axis-Python
+import contextlib
 import socket
 import threading
 from tkinter import Text, END
 import datetime
+import time
 import numpy as np
 import os
 import json
+import re
 
 alarmControllerFile = "files/alarm_controller.json"
 alarmServoFile = "files/alarm_servo.json"
@@ -103,12 +106,130 @@ def alarmAlarmJsonFile():
     return dataController, dataServo
 
 
+# Command replies ("ErrorID,{values},Cmd(...);") end with ';' or a newline
+REPLY_END = re.compile(b"[;\n]")
+
+
+def split_replies(buffer):
+    """
+    Take the complete replies off the front of a receive buffer
+
+    Args:
+        buffer: bytearray of received data; the complete replies are
+            removed from it, a partial reply stays for the next read
+
+    Returns:
+        list: reply strings including their ';' (empty frames are dropped)
+    """
+    replies = []
+    start = 0
+    for match in REPLY_END.finditer(buffer):
+        frame = bytes(buffer[start:match.end()]).strip()
+        if frame and frame != b";":
+            replies.append(frame.decode("utf-8", errors="replace"))
+        start = match.end()
+    del buffer[:start]
+    return replies
+
+
+def reply_key(command):
+    """Command text as a reply echoes it (no whitespace or trailing ';')"""
+    return "".join(command.split()).rstrip(";")
+
+
+def match_reply(reply, commands):
+    """
+    Which command a reply answers
+
+    Args:
+        reply: DobotReply
+        commands: reply_key() of the commands awaiting a reply, oldest first
+
+    Returns:
+        int: index into commands, or None if the reply echoes none of them
+        (a late reply to a command that was given up on). A reply without
+        an echoed command answers the oldest command.
+    """
+    if not commands:
+        return None
+    if not reply.command:
+        return 0
+    key = reply_key(reply.command)
+    for i, command in enumerate(commands):
+        if command == key:
+            return i
+    return None
+
+
+def _parse_value(token):
+    token = token.strip()
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        return token
+
+
+class DobotReply(str):
+    """
+    One command reply, parsed
+
+    Still the reply string ("0,{1.0,2.0},GetPose();"), with:
+        error_id: int ErrorID (0 = success), None if the reply is malformed
+        values: the {...} contents as a list of numbers (nested lists for
+            replies like GetErrorID), strings where a value is not numeric
+        command: the echoed command, e.g. "GetPose()"
+    """
+
+    def __new__(cls, text):
+        reply = super().__new__(cls, text)
+        reply.error_id, reply.values, reply.command = None, [], ""
+        body = text.strip().rstrip(";")
+        head, brace, rest = body.partition(",{")
+        # The values end at the brace matching the opening one; the echoed
+        # command may contain braces of its own (MovJIO(...,{0,100,1,0}))
+        depth, end = 1, -1
+        for i, char in enumerate(rest):
+            depth += {"{": 1, "}": -1}.get(char, 0)
+            if depth == 0:
+                end = i
+                break
+        if not brace or end < 0:
+            return reply
+        inner, command = rest[:end], rest[end + 1:]
+        try:
+            reply.error_id = int(head)
+        except ValueError:
+            return reply
+        reply.command = command.lstrip(",")
+        if inner.strip():
+            try:
+                reply.values = json.loads("[" + inner + "]")
+            except ValueError:
+                reply.values = [_parse_value(token) for token in inner.split(",")]
+        return reply
+
+    @property
+    def ok(self):
+        return self.error_id == 0
+
+
 class DobotApi:
-    def __init__(self, ip, port, *args, timeout_s=5.0):
+    def __init__(self, ip, port, *args, timeout_s=5.0, reply_timeout_s=10.0):
         self.ip = ip
         self.port = port
         self.socket_dobot = 0
         self.__globalLock = threading.Lock()
+        self.reply_timeout_s = reply_timeout_s  # read deadline per reply, None: wait forever
+        self._received = bytearray()  # data after the last complete reply
+        self._replies = []            # complete replies not yet returned
+        self._outstanding = []        # [command key, reply] awaiting a reply, oldest first
+        self._last_sent = None        # entry of the last command sent
+        self._batch_owner = None      # thread inside batch(), see sendRecvMsg
+        self._batch_sent = []
         self.text_log: Text = None
         if args:
             self.text_log = args[0]
@@ -134,29 +255,89 @@ class DobotApi:
             print(text)
 
     def send_data(self, string):
+        self.log(f"Send to {self.ip}:{self.port}: {string}")
+        self.socket_dobot.sendall(str.encode(string, 'utf-8'))
+        self._last_sent = [reply_key(string), None]
+        self._outstanding.append(self._last_sent)
+        return self._last_sent
+
+    def _next_reply(self, deadline):
+        """Next complete reply, reading the socket until deadline"""
+        while not self._replies:
+            if deadline is None:
+                self.socket_dobot.settimeout(None)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No reply from {self.ip}:{self.port} "
+                                       f"within {self.reply_timeout_s}s")
+                self.socket_dobot.settimeout(remaining)
+            try:
+                data = self.socket_dobot.recv(4096)
+            except socket.timeout:
+                continue
+            if not data:
+                raise ConnectionError(f"Connection to {self.ip}:{self.port} closed")
+            self._received += data
+            self._replies.extend(split_replies(self._received))
+        return self._replies.pop(0)
+
+    def wait_reply(self, timeout=-1):
+        """
+    Read the reply to the last command sent
+
+    Replies are framed on ';' / newline, so a reply split over several
+    reads or several replies in one read are handled. Each reply is matched
+    to its command by the command it echoes; late replies of commands that
+    timed out earlier match nothing and are discarded.
+
+    Args:
+        timeout: read deadline in seconds, None to wait forever
+            (default: reply_timeout_s)
+
+    Returns:
+        DobotReply
+
+    Raises:
+        TimeoutError: no reply within the deadline
+        ConnectionError: the controller closed the connection
+    """
+        return self._collect_replies([self._last_sent], timeout)[0]
+
+    def _collect_replies(self, entries, timeout=-1):
+        """Replies to the given send_data() entries, in the same order"""
+        if timeout == -1:
+            timeout = self.reply_timeout_s
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # Entries are compared by identity: two sends of one command are equal lists
+        waiting = {id(entry) for entry in entries}
         try:
-            self.log(f"Send to {self.ip}:{self.port}: {string}")
-            self.socket_dobot.send(str.encode(string, 'utf-8'))
-        except Exception as e:
-            print(e)
-
-    def wait_reply(self):
-        """
-    Read the return value
-    """
-        data = ""
-        try:
-            data = self.socket_dobot.recv(1024)
-        except Exception as e:
-            print(e)
-
+            while any(id(entry) in waiting for entry in self._outstanding):
+                self._dispatch_reply(DobotReply(self._next_reply(deadline)))
         finally:
-            if len(data) == 0:
-                data_str = data
-            else:
-                data_str = str(data, encoding="utf-8")
-                self.log(f'Receive from {self.ip}:{self.port}: {data_str}')
-            return data_str
+            # Give up on what is still unanswered: a late reply then matches
+            # nothing and is dropped instead of answering the next command
+            self._outstanding = [entry for entry in self._outstanding
+                                 if id(entry) not in waiting]
+        lost = [entry[0] for entry in entries if entry[1] is None]
+        if lost:
+            raise ConnectionError(f"Replies from {self.ip}:{self.port} lost for: "
+                                  + ", ".join(lost))
+        return [entry[1] for entry in entries]
+
+    def _dispatch_reply(self, reply):
+        """Hand a reply to the outstanding command it answers"""
+        index = match_reply(reply, [entry[0] for entry in self._outstanding])
+        if index is None:
+            self.log(f"Discarding late reply from {self.ip}:{self.port}: {reply}")
+            return
+        # Replies come in send order, so the older commands lost theirs
+        for lost in self._outstanding[:index]:
+            self.log(f"No reply from {self.ip}:{self.port} to {lost[0]}")
+        entry = self._outstanding[index]
+        del self._outstanding[:index + 1]
+        entry[1] = reply
+        self.log(f'Receive from {self.ip}:{self.port}: {reply}')
 
     def close(self):
         """
@@ -165,15 +346,43 @@ class DobotApi:
         if (self.socket_dobot != 0):
             self.socket_dobot.close()
 
-    def sendRecvMsg(self, string):
+    def sendRecvMsg(self, string, timeout=-1):
         """
     send-recv Sync
     """
+        if self._batch_owner == threading.get_ident():
+            # Inside batch(): send only, the replies are read at the end
+            self._batch_sent.append(self.send_data(string))
+            return None
         with self.__globalLock:
             self.send_data(string)
-            recvData = self.wait_reply()
+            recvData = self.wait_reply(timeout)
             return recvData
 
+    @contextlib.contextmanager
+    def batch(self, timeout=-1):
+        """
+    Pipeline commands: inside the with block the command methods only send
+    (and return None); the replies are read once, when the block ends
+
+        with dashboard.batch() as replies:
+            dashboard.SpeedJ(50)
+            dashboard.SpeedL(50)
+        # replies: one DobotReply per command, in order
+
+    Args:
+        timeout: deadline for all the replies (default: reply_timeout_s)
+    """
+        replies = []
+        with self.__globalLock:
+            self._batch_owner = threading.get_ident()
+            self._batch_sent = []
+            try:
+                yield replies
+            finally:
+                self._batch_owner = None
+            replies.extend(self._collect_replies(self._batch_sent, timeout))
+
     def __del__(self):
         self.close()
 
@@ -496,8 +705,8 @@ class DobotApiDashboard(DobotApi):
         string = "DOGroup("
         for params in dynParams:
             string = string + str(params) + ","
-        string = string + ")"
-        return self.wait_reply()
+        string = string.rstrip(",") + ")"
+        return self.sendRecvMsg(string)
 
     def BrakeControl(self, offset1, offset2):
         string = "BrakeControl({:d},{:d}".format(offset1, offset2) + ")"
@@ -578,8 +787,22 @@ class DobotApiMove(DobotApi):
         print(string)
         return self.sendRecvMsg(string)
 
-    def Jump(self):
-        print("待定")
+    def Jump(self, x, y, z, r, *dynParams):
+        """
+    Door-type (arch) motion: lift, traverse and descend as one move
+    x: A number in the Cartesian coordinate system x
+    y: A number in the Cartesian coordinate system y
+    z: A number in the Cartesian coordinate system z
+    r: A number in the Cartesian coordinate system R
+    Note: lift heights come from the Arch index and LimZ set on the dashboard
+    """
+        string = "Jump({:f},{:f},{:f},{:f}".format(
+            x, y, z, r)
+        for params in dynParams:
+            string = string + "," + str(params)
+        string = string + ")"
+        print(string)
+        return self.sendRecvMsg(string)
 
     def RelMovJ(self, x, y, z, r, *dynParams):
         """
@@ -710,7 +933,7 @@ class DobotApiMove(DobotApi):
     The blocking program executes the queue instruction and returns after all the queue instructions are executed
     """
         string = "Sync()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(string, timeout=None)
 
     def RelMovJUser(self, offset_x, offset_y, offset_z, offset_r, user, *dynParams):
         """
@@ -779,5 +1002,5 @@ class DobotApiMove(DobotApi):
 
     def SyncAll(self):
         string = "SyncAll()"
-        return self.sendRecvMsg(string)
+        return self.sendRecvMsg(string, timeout=None)
 
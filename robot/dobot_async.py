@@ -0,0 +1,400 @@
+"""
+asyncio client for the Dobot MG400 TCP ports
+
+The classes here reuse the command builders of robot/dobot_api.py: every
+DobotApiDashboard / DobotApiMove method formats its command string and
+hands it to sendRecvMsg(), which is overridden to write the command at
+once and return an asyncio.Future for the reply. Several commands can be
+in flight on one socket. A command sent while none is in flight is written
+at once; those sent while replies are pending are written with one send at
+the end of the event loop pass. Each reply is framed, parsed into
+DobotReply and matched to the pending command it echoes, like the blocking
+client, straight from the protocol callback.
+
+    dashboard, move, feed = await ConnectRobotAsync("192.168.1.6")
+    await asyncio.gather(dashboard.SpeedJ(50), dashboard.SpeedL(50),
+                         dashboard.AccJ(50), dashboard.AccL(50))
+    await move.MovJ(300, 0, -75, 0)
+    await WaitStateAsync(feed.state, lambda s: not s.running, ("running",))
+
+AsyncDobotFeed reads the feedback port on the same event loop, with the
+FeedbackReader buffers, and updates a RobotState.
+
+What it pays off for: commands in flight together (a burst of queries,
+a pick sequence queued before the arm starts it) and keeping one thread
+free while the arm moves. Awaiting commands one by one is not faster than
+the blocking DobotApi: each round-trip still goes through the event loop
+(benchmarks/bench_async.py, 500 queries against the simulator: about
+35 ms awaited one by one, 25 ms blocking, 10 ms pipelined).
+"""
+
+import asyncio
+import socket
+import time
+from collections import deque
+from robot.dobot_api import (DobotApiDashboard, DobotApiMove, DobotReply, match_reply,
+                             reply_key, split_replies)
+from robot.dobot_controller import ApplyFeedback, FeedbackReader
+from robot.state import RobotState
+
+
+class AsyncDobotApi:
+    """
+    One command port (29999 or 30003) driven by asyncio
+
+    Args:
+        ip: robot address
+        port: 29999 (dashboard) or 30003 (move)
+        timeout_s: connect timeout
+        log: print every command and reply, like DobotApi
+        reply_timeout_s: reply deadline per command, None: wait forever
+    """
+
+    def __init__(self, ip, port, timeout_s=5.0, log=True, reply_timeout_s=10.0):
+        if port not in (29999, 30003):
+            raise Exception(f"Connect to dashboard server need use port {port} !")
+        self.ip = ip
+        self.port = port
+        self.timeout_s = timeout_s
+        self.reply_timeout_s = reply_timeout_s
+        self.logging = log
+        self.text_log = None
+        self._transport = None
+        self._closed = None  # Future set when the connection is lost
+        self._received = bytearray()
+        self._pending = deque()  # (command key, Future, loop deadline or None) in send order
+        self._outgoing = bytearray()  # commands written at the end of this loop pass
+        self._expiry = None  # one timer, at the earliest deadline pending
+        self._last_reply = None
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        try:
+            # Replies are handled in the protocol's callbacks: no reader
+            # task to wake up between a reply and the command awaiting it
+            self._transport, _ = await asyncio.wait_for(
+                loop.create_connection(lambda: _ReplyProtocol(self), self.ip, self.port),
+                self.timeout_s)
+        except asyncio.TimeoutError as e:
+            raise TimeoutError(f"Timeout connecting to {self.ip}:{self.port} "
+                               f"after {self.timeout_s}s") from e
+        except OSError as e:
+            raise Exception(f"Unable to set socket connection use port {self.port} !") from e
+        sock = self._transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._closed = loop.create_future()
+        return self
+
+    def log(self, text):
+        if self.logging:
+            print(text)
+
+    def send_data(self, string, timeout=-1):
+        """Write a command now; its reply future is kept for wait_reply()"""
+        if self._transport is None or self._transport.is_closing():
+            raise ConnectionError(f"Not connected to {self.ip}:{self.port}")
+        if timeout == -1:
+            timeout = self.reply_timeout_s
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        deadline = None
+        if timeout is not None:
+            deadline = loop.time() + timeout
+            if self._expiry is None or deadline < self._expiry.when():
+                if self._expiry is not None:
+                    self._expiry.cancel()
+                self._expiry = loop.call_at(deadline, self._expire)
+        idle = not self._pending and not self._outgoing
+        self._pending.append((reply_key(string), future, deadline))
+        if self.logging:
+            self.log(f"Send to {self.ip}:{self.port}: {string}")
+        if idle:
+            # Nothing in flight (one command at a time): no reason to wait
+            self._transport.write(string.encode("utf-8"))
+        else:
+            if not self._outgoing:
+                loop.call_soon(self._flush)
+            self._outgoing += string.encode("utf-8")
+        self._last_reply = future
+
+    def _flush(self):
+        """Write every command sent during this loop pass at once"""
+        if self._transport is not None and not self._transport.is_closing():
+            self._transport.write(bytes(self._outgoing))
+        self._outgoing.clear()
+
+    def _expire(self):
+        # Forget the commands past their deadline: their late replies then
+        # match nothing and are dropped instead of answering the next ones.
+        # A single timer, re-armed at the next deadline, rather than one
+        # per command
+        self._expiry = None
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        expired = [entry for entry in self._pending
+                   if entry[2] is not None and entry[2] <= now]
+        for entry in expired:
+            self._pending.remove(entry)
+            self._fail(entry, TimeoutError(f"No reply from {self.ip}:{self.port} "
+                                           f"to {entry[0]} in time"))
+        deadlines = [entry[2] for entry in self._pending if entry[2] is not None]
+        if deadlines:
+            self._expiry = loop.call_at(min(deadlines), self._expire)
+
+    def wait_reply(self):
+        """Future of the reply to the last command sent"""
+        return self._last_reply
+
+    def sendRecvMsg(self, string, timeout=-1):
+        """
+        Send without waiting for earlier replies
+
+        Args:
+            timeout: reply deadline in seconds, None to wait forever
+                (default: reply_timeout_s)
+
+        Returns:
+            asyncio.Future: resolves to the DobotReply, or raises
+            TimeoutError after the deadline (a late reply is discarded)
+        """
+        self.send_data(string, timeout)
+        return self._last_reply
+
+    def batch(self, timeout=-1):
+        """Not available: every command is already pipelined, gather the futures"""
+        raise NotImplementedError("Async clients pipeline every command: send them "
+                                  "and await asyncio.gather() of the replies instead of batch()")
+
+    @property
+    def in_flight(self):
+        """Commands sent whose reply has not arrived yet"""
+        return len(self._pending)
+
+    def _data_received(self, data):
+        self._received += data
+        for text in split_replies(self._received):
+            self._dispatch_reply(DobotReply(text))
+
+    def _connection_lost(self, error):
+        if error is None:
+            closed_by = " by client" if self._transport is None else ""
+            error = ConnectionError(f"Connection to {self.ip}:{self.port} closed{closed_by}")
+        while self._pending:
+            self._fail(self._pending.popleft(), error)
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def _dispatch_reply(self, reply):
+        """Resolve the pending command a reply answers"""
+        if self.logging:
+            self.log(f"Receive from {self.ip}:{self.port}: {reply}")
+        if self._pending and (not reply.command
+                              or self._pending[0][0] == reply_key(reply.command)):
+            index = 0  # the usual case: the oldest command
+        else:
+            index = match_reply(reply, [entry[0] for entry in self._pending])
+        if index is None:
+            self.log(f"Discarding late reply from {self.ip}:{self.port}: {reply}")
+            return
+        # Replies come in send order, so the older commands lost theirs
+        for _ in range(index):
+            lost = self._pending.popleft()
+            self._fail(lost, ConnectionError(
+                f"Reply from {self.ip}:{self.port} to {lost[0]} lost"))
+        future = self._pending.popleft()[1]
+        if not future.done():
+            future.set_result(reply)
+
+    @staticmethod
+    def _fail(entry, error):
+        future = entry[1]
+        if not future.done():
+            future.set_exception(error)
+
+    async def drain(self):
+        """Wait until every reply in flight has arrived"""
+        futures = [future for _, future, _ in self._pending]
+        if futures:
+            await asyncio.gather(*futures, return_exceptions=True)
+
+    def close(self):
+        try:
+            if self._expiry is not None:
+                self._expiry.cancel()
+            transport, self._transport = self._transport, None
+            if transport is not None:
+                transport.close()
+        except RuntimeError:  # event loop already closed
+            pass
+        self._transport = None
+        self._expiry = None
+
+    async def aclose(self):
+        self.close()
+        if self._closed is not None:
+            await self._closed
+
+
+class _ReplyProtocol(asyncio.Protocol):
+    """Hands the bytes of a command port to its AsyncDobotApi"""
+
+    def __init__(self, api):
+        self.api = api
+
+    def data_received(self, data):
+        self.api._data_received(data)
+
+    def connection_lost(self, exc):
+        self.api._connection_lost(exc)
+
+
+class AsyncDobotApiDashboard(AsyncDobotApi, DobotApiDashboard):
+    """DobotApiDashboard whose methods return awaitable replies"""
+
+    def __init__(self, ip, port=29999, timeout_s=5.0, log=True, reply_timeout_s=10.0):
+        AsyncDobotApi.__init__(self, ip, port, timeout_s, log, reply_timeout_s)
+
+
+class AsyncDobotApiMove(AsyncDobotApi, DobotApiMove):
+    """DobotApiMove whose methods return awaitable replies"""
+
+    def __init__(self, ip, port=30003, timeout_s=5.0, log=True, reply_timeout_s=10.0):
+        AsyncDobotApi.__init__(self, ip, port, timeout_s, log, reply_timeout_s)
+
+
+class AsyncDobotFeed:
+    """
+    Feedback port (30004) read on the event loop
+
+    Args:
+        ip: robot address
+        state: RobotState updated with every packet (default: a new one)
+        telemetry: optional sinks with append(packet, timestamp)
+    """
+
+    def __init__(self, ip, port=30004, timeout_s=5.0, state=None, telemetry=()):
+        self.ip = ip
+        self.port = port
+        self.timeout_s = timeout_s
+        self.state = state if state is not None else RobotState()
+        self.telemetry = list(telemetry)
+        self._sock = None
+        self._task = None
+        self.reader = None
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setblocking(False)
+        try:
+            await asyncio.wait_for(loop.sock_connect(self._sock, (self.ip, self.port)),
+                                   self.timeout_s)
+        except asyncio.TimeoutError as e:
+            self.close()
+            raise TimeoutError(f"Timeout connecting to {self.ip}:{self.port} "
+                               f"after {self.timeout_s}s") from e
+        except BaseException:
+            self.close()
+            raise
+        self.reader = FeedbackReader(None)
+        return self
+
+    async def read(self):
+        """Next valid packet (the reader's reusable field views)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            n = await loop.sock_recv_into(self._sock, self.reader.pending())
+            fields = self.reader.received(n)
+            if fields is not None:
+                return fields
+
+    async def run(self):
+        """Apply packets to the state until the connection closes or is cancelled"""
+        while True:
+            try:
+                packet = await self.read()
+            except OSError:  # includes ConnectionError
+                return
+            received = time.monotonic()
+            for sink in self.telemetry:
+                sink.append(self.reader.packet, received)
+            ApplyFeedback(self.state, packet, received)
+
+    def start(self):
+        """Run the feedback loop as a task; returns it"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    async def aclose(self):
+        self.close()
+
+
+async def WaitStateAsync(state, predicate, fields=None, timeout=None):
+    """
+    Await predicate(state) without blocking the event loop
+
+    The predicate is checked now and on every packet that changes one of
+    fields (None: every packet). Safe whether the state is fed from the
+    event loop (AsyncDobotFeed) or from a feedback thread.
+
+    Returns:
+        bool: True once the predicate holds, False on timeout
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def on_packet(_state, _changed):
+        loop.call_soon_threadsafe(changed.set)
+
+    handle = state.subscribe(on_packet, fields)
+    try:
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            changed.clear()
+            if state.check(predicate):
+                return True
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+    finally:
+        state.unsubscribe(handle)
+
+
+async def ConnectRobotAsync(ip="192.168.1.6", timeout_s=5.0, log=True, state=None):
+    """
+    Open the three ports concurrently and start reading feedback
+
+    If one port fails, the ports that did connect are closed and the first
+    error is raised.
+
+    Returns:
+        tuple: (dashboard, move, feed)
+    """
+    dashboard = AsyncDobotApiDashboard(ip, timeout_s=timeout_s, log=log)
+    move = AsyncDobotApiMove(ip, timeout_s=timeout_s, log=log)
+    feed = AsyncDobotFeed(ip, timeout_s=timeout_s, state=state)
+    ports = (dashboard, move, feed)
+    results = await asyncio.gather(*(port.connect() for port in ports), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        for port, result in zip(ports, results):
+            if not isinstance(result, BaseException):
+                await port.aclose()
+        print(f"Connection failed: {errors[0]}")
+        raise errors[0]
+    feed.start()
+    return dashboard, move, feed
@@ -5,19 +5,26 @@ Contains functions for robot connection, movement, and feedback monitoring
 Uses Dobot Python API from https://github.com/Dobot-Arm/TCP-IP-4Axis-Python
 """
 
+import socket
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from robot.dobot_api import DobotApiDashboard, DobotApi, DobotApiMove, MyType, alarmAlarmJsonFile
-from time import sleep
+from robot.state import RobotState
+from time import sleep, monotonic
 import numpy as np
 
-# Global variables for robot feedback
-current_actual = None
-algorithm_queue = None
-enableStatus_robot = None
-robotErrorState = False
-globalLockValue = threading.Lock()
+# Feedback of the connected robot; waiters are woken by GetFeed
+robot_state = RobotState()
+
+# Stops the feedback threads started without their own stop_event
 stop_threads = False
 
+# Feedback packet layout
+FEEDBACK_SIZE = MyType.itemsize  # 1440 bytes
+FEEDBACK_MAGIC = 0x123456789abcdef  # test_value of every valid packet
+_MAGIC_OFFSET = MyType.fields["test_value"][1]
+_MAGIC_BYTES = FEEDBACK_MAGIC.to_bytes(8, "little")
+
 
 def ConnectRobot(ip="192.168.1.6", timeout_s=5.0):
     """
@@ -27,92 +34,242 @@ def ConnectRobot(ip="192.168.1.6", timeout_s=5.0):
         ip: Robot IP address
         timeout_s: Connection timeout in seconds
 
+    The three ports are connected concurrently.
+
     Returns:
         tuple: (dashboard, move, feed) API objects
     """
-    try:
-        dashboardPort = 29999
-        movePort = 30003
-        feedPort = 30004
-        print("Establishing connection...")
-        dashboard = DobotApiDashboard(ip, dashboardPort, timeout_s=timeout_s)
-        move = DobotApiMove(ip, movePort, timeout_s=timeout_s)
-        feed = DobotApi(ip, feedPort, timeout_s=timeout_s)
-        print("Connection successful!")
-        return dashboard, move, feed
-    except Exception as e:
-        print(f"Connection failed: {e}")
-        raise e
-
-
-def GetFeed(feed: DobotApi):
+    dashboardPort = 29999
+    movePort = 30003
+    feedPort = 30004
+    print("Establishing connection...")
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        pending = [pool.submit(DobotApiDashboard, ip, dashboardPort, timeout_s=timeout_s),
+                   pool.submit(DobotApiMove, ip, movePort, timeout_s=timeout_s),
+                   pool.submit(DobotApi, ip, feedPort, timeout_s=timeout_s)]
+    errors = [f.exception() for f in pending if f.exception() is not None]
+    if errors:
+        for f in pending:
+            if f.exception() is None:
+                f.result().close()
+        print(f"Connection failed: {errors[0]}")
+        raise errors[0]
+    print("Connection successful!")
+    dashboard, move, feed = (f.result() for f in pending)
+    return dashboard, move, feed
+
+
+class FeedbackReader:
+    """
+    Reads feedback packets into preallocated buffers
+
+    Each packet is received with recv_into straight into one of a few
+    reusable 1440-byte slots. The MyType view of each slot, and a view per
+    field, are created once, so steady-state reading allocates (almost)
+    nothing. The test_value magic is checked as an integer; if the stream
+    is misaligned the reader searches for the magic and realigns on it.
+
+    Args:
+        sock: any object with recv_into (a socket, a replay source, ...)
+        slots: number of packet buffers used in rotation; a returned packet
+            stays valid until slots - 1 more packets have been read
+    """
+
+    def __init__(self, sock, slots=2):
+        self.sock = sock
+        self._buffers = [bytearray(FEEDBACK_SIZE) for _ in range(slots)]
+        self._views = [memoryview(buf) for buf in self._buffers]
+        self._packets = [np.ndarray((), dtype=MyType, buffer=buf)
+                         for buf in self._buffers]
+        self._fields = [{name: packet[name] for name in MyType.names}
+                        for packet in self._packets]
+        self._magic = [np.ndarray((), dtype="<u8", buffer=buf, offset=_MAGIC_OFFSET)
+                       for buf in self._buffers]
+        self.packet = None  # 0-d MyType view of the last packet
+        self._slot = 0
+        self._filled = 0  # bytes of the current slot received so far
+        self.packets = 0
+        self.resyncs = 0
+
+    def read(self):
+        """
+        Receive the next valid packet
+
+        Returns:
+            dict: field name -> array view into the packet (the same dict
+            and views are reused for the slot), or None if the socket timed
+            out (a partly received packet is kept and completed by the next
+            call)
+
+        Raises:
+            ConnectionError: the peer closed the stream
+        """
+        while True:
+            try:
+                n = self.sock.recv_into(self.pending())
+            except socket.timeout:
+                return None
+            fields = self.received(n)
+            if fields is not None:
+                return fields
+
+    def pending(self):
+        """Writable view of the bytes still missing from the current packet"""
+        view = self._views[self._slot]
+        return view[self._filled:] if self._filled else view
+
+    def received(self, n):
+        """
+        Account for n bytes written into pending()
+
+        Lets other I/O (e.g. an event loop) drive the reader.
+
+        Returns:
+            dict: the packet fields as for read(), once a valid packet is
+            complete, otherwise None
+
+        Raises:
+            ConnectionError: n == 0, the peer closed the stream
+        """
+        if n == 0:
+            raise ConnectionError("Feedback stream closed")
+        self._filled += n
+        if self._filled < FEEDBACK_SIZE:
+            return None
+        slot = self._slot
+        if self._magic[slot] != FEEDBACK_MAGIC:
+            self._resync(slot)
+            return None
+
+        self._filled = 0
+        self._slot = (slot + 1) % len(self._buffers)
+        self.packets += 1
+        self.packet = self._packets[slot]
+        return self._fields[slot]
+
+    def _resync(self, slot):
+        """Keep the bytes from the next plausible packet start onwards"""
+        self.resyncs += 1
+        buf = self._buffers[slot]
+        found = buf.find(_MAGIC_BYTES)
+        if found < 0:
+            # The magic may straddle the end of the buffer
+            start = FEEDBACK_SIZE - (_MAGIC_OFFSET + len(_MAGIC_BYTES) - 1)
+        else:
+            # A magic before offset 48 belongs to a packet that started
+            # earlier; the next one starts FEEDBACK_SIZE bytes after it
+            start = (found - _MAGIC_OFFSET) % FEEDBACK_SIZE
+        tail = bytes(buf[start:])
+        buf[:len(tail)] = tail
+        self._filled = len(tail)
+
+
+def ApplyFeedback(state, packet, timestamp=None):
+    """
+    Push one feedback packet into a RobotState
+
+    Args:
+        state: RobotState to update
+        packet: dict of field views (FeedbackReader.read()) or MyType record
+        timestamp: monotonic receive time
+
+    Returns:
+        dict: the values applied
+    """
+    values = {
+        # The reader's slot is reused, so keep a copy of the pose
+        "pose": packet["tool_vector_actual"].copy(),
+        "queued": bool(packet['isRunQueuedCmd'][0]),
+        "enabled": bool(packet['EnableStatus'][0]),
+        "error": bool(packet['ErrorStatus'][0]),
+        "running": bool(packet['RunningStatus'][0]),
+        "digital_outputs": int(packet['digital_outputs']),
+        "speed_j": int(packet['velocityRatio'][0]),
+        "acc_j": int(packet['accelerationRatio'][0]),
+        "speed_l": int(packet['xyzVelocityRatio'][0]),
+        "acc_l": int(packet['xyzAccelerationRatio'][0]),
+        "payload": float(packet['load'][0]),
+    }
+    state.update(timestamp, **values)
+    return values
+
+
+def GetFeed(feed: DobotApi, state=None, stop_event=None, telemetry=None):
     """
     Continuously read feedback from the robot
     This function should run in a separate thread
 
     Args:
         feed: DobotApi object for feedback port
+        state: RobotState to update (default: robot_state)
+        stop_event: threading.Event stopping this thread only (default:
+            the global stop_threads flag)
+        telemetry: optional sink, or list of sinks, with an
+            append(packet, timestamp) method (TelemetryBuffer,
+            FeedbackRecorder) receiving every packet as a MyType record
     """
-    global current_actual, algorithm_queue, enableStatus_robot, robotErrorState, stop_threads
-    hasRead = 0
+    global stop_threads
 
-    # Set a timeout on the socket so recv() doesn't block forever
+    # Set a timeout on the socket so recv_into() doesn't block forever
     # This allows the loop to check the 'stop_threads' flag
     feed.socket_dobot.settimeout(1.0)
-
-    while not stop_threads:  # Check the flag here
+    reader = FeedbackReader(feed.socket_dobot)
+    if telemetry is None:
+        telemetry = ()
+    elif not isinstance(telemetry, (list, tuple)):
+        telemetry = (telemetry,)
+    if state is None:
+        state = robot_state
+
+    def stopped():
+        if stop_event is not None:
+            return stop_event.is_set()
+        return stop_threads
+
+    while not stopped():  # Check the flag here
         try:
-            data = bytes()
-            while hasRead < 1440 and not stop_threads:
-                try:
-                    temp = feed.socket_dobot.recv(1440 - hasRead)
-                    if len(temp) > 0:
-                        hasRead += len(temp)
-                        data += temp
-                except socket.timeout:
-                    # Timeout reached, loop back to check stop_threads
-                    continue
-
-            if stop_threads:
-                break
-
-            hasRead = 0
-            feedInfo = np.frombuffer(data, dtype=MyType)
-
-            if hex((feedInfo['test_value'][0])) == '0x123456789abcdef':
-                globalLockValue.acquire()
-                current_actual = feedInfo["tool_vector_actual"][0]
-                algorithm_queue = feedInfo['isRunQueuedCmd'][0]
-                enableStatus_robot = feedInfo['EnableStatus'][0]
-                robotErrorState = feedInfo['ErrorStatus'][0]
-                globalLockValue.release()
-            sleep(0.001)
+            packet = reader.read()
+            if packet is None or stopped():
+                continue
+            received = monotonic()
+            for sink in telemetry:
+                sink.append(reader.packet, received)
+
+            ApplyFeedback(state, packet, received)
 
         except Exception as e:
-            if not stop_threads:
+            if not stopped():
                 print(f"Feed Error: {e}")
             sleep(0.1)
 
 
-def StartFeedbackThread(feed: DobotApi):
+def StartFeedbackThread(feed: DobotApi, state=None, stop_event=None, telemetry=None):
     """
     Start the feedback monitoring thread
 
     Args:
         feed: DobotApi object for feedback port
+        state: RobotState to update (default: robot_state)
+        stop_event: threading.Event that stops only this thread (default:
+            the global stop_threads flag)
+        telemetry: optional sink or list of sinks, see GetFeed
 
     Returns:
         threading.Thread: The started thread object
     """
-    feed_thread = threading.Thread(target=GetFeed, args=(feed,))
+    state = state or robot_state
+    feed_thread = threading.Thread(target=GetFeed, args=(feed, state, stop_event, telemetry))
     feed_thread.daemon = True
     feed_thread.start()
     print("Feedback thread started")
-    sleep(1)  # Give feedback thread time to initialize
+    # Wait for the first packet instead of a fixed delay
+    first = state.packets
+    if not state.wait_for(lambda s: s.packets > first, timeout=1.0):
+        print("No feedback received yet")
     return feed_thread
 
 
-def WaitArrive(target_point, tolerance=1.0, timeout=30.0):
+def WaitArrive(target_point, tolerance=1.0, timeout=30.0, state=None):
     """
     Wait until the robot reaches the target point
 
@@ -120,36 +277,64 @@ def WaitArrive(target_point, tolerance=1.0, timeout=30.0):
         target_point: [x, y, z, r] coordinates
         tolerance: acceptable position error in mm
         timeout: maximum wait time in seconds
+        state: RobotState to wait on (default: robot_state)
 
     Returns:
         bool: True if robot arrived, False if timeout
     """
     print(f"Waiting for robot to reach target: {target_point}")
-    start_time = sleep(0)  # Using sleep to track time
-    elapsed = 0
-
-    while elapsed < timeout:
-        is_arrive = True
-        globalLockValue.acquire()
-        if current_actual is not None:
-            # Check if all coordinates are within tolerance
-            for index in range(4):
-                if abs(current_actual[index] - target_point[index]) > tolerance:
-                    is_arrive = False
-                    break
-
-            if is_arrive:
-                globalLockValue.release()
-                print("Robot reached target position!")
-                return True
-        globalLockValue.release()
-        sleep(0.001)
-        elapsed += 0.001
+    if (state or robot_state).wait_arrive(target_point, tolerance, timeout):
+        print("Robot reached target position!")
+        return True
 
     print(f"Timeout: Robot did not reach target within {timeout}s")
     return False
 
 
+def WaitMotionDone(target_point, tolerance=1.0, timeout=10.0, state=None):
+    """
+    Wait until a queued move has finished, using the feedback stream
+
+    The move is done when tool_vector_actual is within tolerance of the
+    target and the controller reports neither a running motion
+    (RunningStatus) nor pending queued commands (isRunQueuedCmd).
+
+    Args:
+        target_point: [x, y, z] or [x, y, z, r] coordinates
+        tolerance: acceptable position error in mm
+        timeout: maximum wait time in seconds
+        state: RobotState to wait on (default: robot_state)
+
+    Returns:
+        bool: True if the move finished, False on timeout or robot error
+    """
+    state = state or robot_state
+    if state.wait_motion_done(target_point, tolerance, timeout):
+        return True
+    if state.error:
+        print("Robot error while waiting for motion")
+    else:
+        print(f"Timeout: Motion to {target_point} not done within {timeout}s")
+    return False
+
+
+def WaitDigitalOutput(output_index, status, timeout=5.0, state=None):
+    """
+    Wait until the feedback stream shows a digital output in the given state
+
+    DO is a queue instruction, so it only takes effect once the moves queued
+    before it have finished.
+
+    Returns:
+        bool: True once the output matches, False on timeout
+    """
+    if (state or robot_state).wait_digital_output(output_index, status, timeout):
+        return True
+
+    print(f"Timeout: DO{output_index} did not become {status} within {timeout}s")
+    return False
+
+
 def MoveJ(move: DobotApiMove, point):
     """
     Move robot to specified point using Joint movement
@@ -174,35 +359,61 @@ def MoveL(move: DobotApiMove, point):
     move.MovL(point[0], point[1], point[2], point[3])
 
 
-def SetupRobot(dashboard: DobotApiDashboard, speed_ratio=50, acc_ratio=50, payload_weight=50):
+def SetupRobot(dashboard: DobotApiDashboard, speed_ratio=50, acc_ratio=50, payload_weight=50,
+               state=None, timeout=5.0):
     """
     Initialize and configure the robot
 
+    The commands go out as one pipelined batch, skipping those whose value
+    the feedback already shows (no error to clear, already enabled, ratios
+    and payload already set). Setup is complete when the feedback reports
+    the robot enabled, not after fixed delays.
+
     Args:
         dashboard: DobotApiDashboard object
         speed_ratio: Speed ratio percentage (1-100)
         acc_ratio: Acceleration ratio percentage (1-100)
         payload_weight: Payload weight (in grams) (0-750)
-    """
-    print("Clearing any errors...")
-    dashboard.ClearError()
-    sleep(0.5)
-
-    print("Enabling robot...")
-    dashboard.EnableRobot()
-    sleep(2)
-
-    # Set speed and acceleration ratios
-    print(
-        f"Setting speed parameters (speed: {speed_ratio}%, acc: {acc_ratio}%)...")
-    dashboard.SpeedJ(speed_ratio)  # Joint speed ratio
-    dashboard.SpeedL(speed_ratio)  # Linear speed ratio
-    dashboard.AccJ(acc_ratio)      # Joint acceleration
-    dashboard.AccL(acc_ratio)      # Linear acceleration
-
-    dashboard.PayLoad(payload_weight, 0)
+        state: RobotState fed by the feedback thread (default: robot_state)
+        timeout: seconds to wait for the robot to report enabled
 
+    Returns:
+        bool: True if the robot is enabled and every command was accepted
+    """
+    state = state or robot_state
+    current = state.snapshot()
+    known = current["packets"] > 0  # nothing can be skipped without feedback
+
+    with dashboard.batch() as replies:
+        if not known or current["error"]:
+            print("Clearing any errors...")
+            dashboard.ClearError()
+        if not known or not current["enabled"]:
+            print("Enabling robot...")
+            dashboard.EnableRobot()
+
+        # Set speed and acceleration ratios
+        print(
+            f"Setting speed parameters (speed: {speed_ratio}%, acc: {acc_ratio}%)...")
+        for command, field, value in ((dashboard.SpeedJ, "speed_j", speed_ratio),  # Joint speed ratio
+                                      (dashboard.SpeedL, "speed_l", speed_ratio),  # Linear speed ratio
+                                      (dashboard.AccJ, "acc_j", acc_ratio),        # Joint acceleration
+                                      (dashboard.AccL, "acc_l", acc_ratio)):       # Linear acceleration
+            if not known or current[field] != value:
+                command(value)
+
+        if not known or abs(current["payload"] - payload_weight) > 1e-6:
+            dashboard.PayLoad(payload_weight, 0)
+
+    rejected = [reply for reply in replies if not reply.ok]
+    for reply in rejected:
+        print(f"Setup command rejected: {reply}")
+
+    if not state.wait_for(lambda s: s.enabled, fields=("enabled",), timeout=timeout):
+        print("Robot did not report enabled")
+        return False
     print("Robot setup complete!")
+    return not rejected
 
 
 def ControlDigitalOutput(dashboard: DobotApiDashboard, output_index, status):
@@ -223,20 +434,17 @@ def ControlDigitalOutput(dashboard: DobotApiDashboard, output_index, status):
     return result
 
 
-def GetCurrentPosition():
+def GetCurrentPosition(state=None):
     """
     Get the current robot position from feedback
 
     Returns:
         numpy.ndarray or None: Current [x, y, z, r, rx, ry] position
     """
-    globalLockValue.acquire()
-    pos = current_actual
-    globalLockValue.release()
-    return pos
+    return (state or robot_state).snapshot()["pose"]
 
 
-def DisconnectRobot(dashboard, move, feed, feed_thread=None):
+def DisconnectRobot(dashboard, move, feed, feed_thread=None, stop_event=None):
     """
     Safely disconnect from the robot
 
@@ -244,10 +452,16 @@ def DisconnectRobot(dashboard, move, feed, feed_thread=None):
         dashboard: DobotApiDashboard object
         move: DobotApiMove object
         feed: DobotApi object
+        feed_thread: feedback thread to join
+        stop_event: the Event the feedback thread was started with; without
+            it the global stop_threads flag stops every legacy feed thread
     """
     global stop_threads
     print("Stopping feedback thread...")
-    stop_threads = True  # Signal the thread to stop
+    if stop_event is not None:
+        stop_event.set()  # Signal this robot's thread only
+    else:
+        stop_threads = True  # Signal the thread to stop
 
     if feed_thread:
         feed_thread.join(timeout=2.0)  # Wait for thread to finish
@@ -5,60 +5,115 @@ from robot.dobot_controller import (
     MoveJ,
     MoveL,
     WaitArrive,
+    WaitMotionDone,
+    WaitDigitalOutput,
     ControlDigitalOutput,
     GetCurrentPosition,
     DisconnectRobot
 )
+from robot.state import RobotState
+from robot.telemetry import TelemetryBuffer
+from robot.recorder import FeedbackRecorder
 from time import sleep
+import threading
 ROBOT_IP = "192.168.1.6"
+# Drop bins [X, Y, Z]; the first one is the default drop location
+DROP_LOCATIONS = [[275, -125, -75]]
 
 
 class MG400Controller:
-    def __init__(self, ip="192.168.1.6"):
+    def __init__(self, ip=ROBOT_IP, transit="segments", arch_index=0,
+                 telemetry_seconds=60.0, record_path=None):
         self.ip = ip
         self.safe_z = -75.0  # Height for moving across the table (mm)
         self.pick_z = -165.0  # Height to touch/grab the object (mm)
-        self.place_z = -125.0  # Height to release in the box
+        # Height to release in the box, used by every transit mode (the
+        # part is dropped from hover height, as the original sequence did)
+        self.place_z = self.safe_z
         self.safe_r = 0
         # Box coordinates [X, Y, Z]
-        self.drop_location = [275, -125, -75]
+        self.drop_location = DROP_LOCATIONS[0]
+        # Feedback-driven motion completion
+        self.arrive_tolerance = 1.0  # mm
+        self.move_timeout = 10.0  # s
+        self.grip_time = 0.3  # s for the suction to grip after DO1 is on
+        self.release_time = 0.3  # s of blow-off (DO2) to release the part
+        # Transit between hover heights: "segments" (MovL up, MovJ across,
+        # MovL down) or "arch" (one blended Jump lifting to lim_z)
+        if transit not in ("segments", "arch"):
+            raise ValueError(f"Unknown transit mode: {transit}")
+        self.transit = transit
+        self.arch_index = arch_index  # controller Arch parameter set (0-9)
+        self.lim_z = self.safe_z  # highest point of the arch (mm)
 
-        self.dashboard, self.move, self.feed = ConnectRobot(ip=ROBOT_IP, timeout_s=5.0)
+        self.dashboard, self.move, self.feed = ConnectRobot(ip=self.ip, timeout_s=5.0)
+        # Feedback state and thread belong to this robot, so several
+        # controllers can run in one process
+        self.state = RobotState()
+        self._stop_feed = threading.Event()
+        # Full-rate history of the last telemetry_seconds of feedback
+        self.telemetry = TelemetryBuffer(telemetry_seconds) if telemetry_seconds else None
+        # Raw packets to a memory-mapped file for offline analysis / replay
+        self.recorder = FeedbackRecorder(record_path) if record_path else None
+        sinks = [sink for sink in (self.telemetry, self.recorder) if sink is not None]
         # Start feedback monitoring thread
-        self.feed_thread = StartFeedbackThread(self.feed)
+        self.feed_thread = StartFeedbackThread(self.feed, self.state, self._stop_feed,
+                                               sinks)
         # Setup and enable robot
-        SetupRobot(self.dashboard, speed_ratio=50, acc_ratio=50)
+        SetupRobot(self.dashboard, speed_ratio=50, acc_ratio=50, state=self.state)
+        if self.transit == "arch":
+            self.setup_arch()
 
         print(f"Connecting to Dobot MG400 at {self.ip}...")
 
-    def pick_and_place(self, target_x, target_y):        
+    def _move(self, move_fn, point):
+        """Send a move and wait for the feedback stream to report it done"""
+        move_fn(self.move, point)
+        return WaitMotionDone(point, tolerance=self.arrive_tolerance,
+                              timeout=self.move_timeout, state=self.state)
+
+    def _set_output(self, output_index, status):
+        """Set a DO (queue instruction) and wait until feedback shows it"""
+        ControlDigitalOutput(self.dashboard, output_index=output_index, status=status)
+        return WaitDigitalOutput(output_index, status, timeout=self.move_timeout,
+                                 state=self.state)
+
+    def setup_arch(self):
+        """Select the Jump arch parameters and lift height on the controller"""
+        print(f"Setting arch index {self.arch_index}, LimZ {self.lim_z}")
+        with self.dashboard.batch():
+            self.dashboard.Arch(self.arch_index)
+            self.dashboard.LimZ(int(round(self.lim_z)))
+
+    def pick_and_place(self, target_x, target_y, drop=None):
+        """Standard sequence: Move -> Descend -> Grab -> Lift -> Move -> Drop
+
+        drop: [X, Y, Z] of the bin for this pick (default: drop_location)
+        """
+        if self.transit == "arch":
+            return self.pick_and_place_arch(target_x, target_y, drop)
 
-        """Standard sequence: Move -> Descend -> Grab -> Lift -> Move -> Drop"""
         print(
             f"--- Executing Pick-and-Place at ({target_x:.1f}, {target_y:.1f}) ---")
 
         # 1. Move to Safe Height above target
         print(f"Moving to Hover: {target_x, target_y, self.safe_z}")
-        MoveJ(self.move, [target_x, target_y, self.safe_z, self.safe_r])
-        sleep(1)
+        self._move(MoveJ, [target_x, target_y, self.safe_z, self.safe_r])
 
         # 2. Descend to Pick Height
         print("Descending to Pick...")
-        MoveL(self.move, [target_x, target_y, self.pick_z, self.safe_r])
-        # arrived = WaitArrive(
-        #    [target_x, target_y, self.pick_z], tolerance=1.0, timeout=30.0)
-        arrived = True
+        arrived = self._move(MoveL, [target_x, target_y, self.pick_z, self.safe_r])
         if arrived:
             # Turn on Digital Output 1
             # 3. Close Gripper / Turn on Suction
             print("\n--- Activating Digital Output 1 ---")
-            ControlDigitalOutput(self.dashboard, output_index=1, status=1)
+            self._set_output(1, 1)
 
-            # Wait for the command to execute
-            sleep(1)
+            # Give the suction time to grip
+            sleep(self.grip_time)
 
             print("\n=== move to PICK point OK ===")
-            current_pos = GetCurrentPosition()
+            current_pos = GetCurrentPosition(self.state)
             print(f"Robot is at position: {current_pos}")
 
         else:
@@ -66,24 +121,18 @@ class MG400Controller:
 
         # 4. Lift back to Safe Height
         print("Lifting...")
-        MoveL(self.move, [target_x, target_y, self.safe_z, self.safe_r])
-        sleep(1)
+        self._move(MoveL, [target_x, target_y, self.safe_z, self.safe_r])
 
         # 5. Move to Place Location
-        px, py, pz = self.drop_location
+        px, py, pz = drop or self.drop_location
         print(f"Moving to Box at ({px}, {py})")
-        MoveJ(self.move, [px, py, self.safe_z, self.safe_r])
-        sleep(1)
+        self._move(MoveJ, [px, py, self.safe_z, self.safe_r])
 
         # 6. Descend to Place Height
-        px, py, pz = self.drop_location
         print(f"Moving to Box at ({px}, {py})")
-        MoveL(self.move, [px, py, self.safe_z, self.safe_r])
-        sleep(1)
+        arrived = self._move(MoveL, [px, py, self.place_z, self.safe_r])
 
         # Wait for robot to reach the point
-        # arrived = WaitArrive([px, py, self.place_z], tolerance=1.0)
-        arrived = True
         if arrived:
             print("\n=== move to PLACE point OK ===")
         else:
@@ -92,19 +141,133 @@ class MG400Controller:
         # 7. Release
         # Turn off Digital Output 1
         print("ACTION: Opening Gripper")
-        ControlDigitalOutput(self.dashboard, output_index=1, status=0)
-        ControlDigitalOutput(self.dashboard, output_index=2, status=1)
-        sleep(1)
-        ControlDigitalOutput(self.dashboard, output_index=2, status=0)
-        sleep(1)
+        self._set_output(1, 0)
+        self._set_output(2, 1)
+        sleep(self.release_time)
+        self._set_output(2, 0)
         print("Item Placed.")
 
         # 8. Move to Place Location
-        px, py, pz = self.drop_location
         print(f"Moving to transform position at ({px}, {py})")
-        MoveJ(self.move, [px, py, self.safe_z, self.safe_r])
-        sleep(1)
+        self._move(MoveJ, [px, py, self.safe_z, self.safe_r])
+
+    def pick_and_place_arch(self, target_x, target_y, drop=None):
+        """Arch sequence: Jump to pick -> Grab -> Jump to box -> Drop
+
+        Each Jump lifts to lim_z, traverses and descends as one blended
+        motion instead of three stop-and-go segments.
+        """
+        print(
+            f"--- Executing Arch Pick-and-Place at ({target_x:.1f}, {target_y:.1f}) ---")
+
+        # 1. Arch over to the pick point
+        pick = [target_x, target_y, self.pick_z, self.safe_r]
+        self.move.Jump(*pick)
+        if not WaitMotionDone(pick, self.arrive_tolerance, self.move_timeout, self.state):
+            print("\n*** FAIL to reach target position ***")
+
+        # 2. Grab
+        self._set_output(1, 1)
+        sleep(self.grip_time)
+
+        # 3. Arch over to the box, down to the place height
+        px, py, pz = drop or self.drop_location
+        place = [px, py, self.place_z, self.safe_r]
+        self.move.Jump(*place)
+        if not WaitMotionDone(place, self.arrive_tolerance, self.move_timeout, self.state):
+            print("\n*** FAIL PLACE point ***")
+
+        # 4. Release
+        self._set_output(1, 0)
+        self._set_output(2, 1)
+        sleep(self.release_time)
+        self._set_output(2, 0)
+        print("Item Placed.")
+
+        # 5. Back up to the safe height, as the segment sequence ends
+        self._move(MoveJ, [px, py, self.safe_z, self.safe_r])
+
+    def pick_and_place_queued(self, target_x, target_y, sync=True, drop=None):
+        """
+        Same pick-and-place, sent as one batch of queued commands
+
+        Every move, DO and dwell goes into the controller's motion queue
+        without waiting for the previous step, so the arm never idles on a
+        TCP round-trip between segments. The release is scheduled inside the
+        transit move with MovJIO (DO1 off, DO2 on on arrival). Only the
+        gripper dwells are real waits, and they run in the queue too.
+
+        Args:
+            sync: block with Sync() until the queue has drained; pass False
+                to keep queueing further picks behind this one
+            drop: [X, Y, Z] of the bin for this pick (default: drop_location)
+        """
+        print(
+            f"--- Queueing Pick-and-Place at ({target_x:.1f}, {target_y:.1f}) ---")
+        px, py, pz = drop or self.drop_location
+        grip_ms = int(self.grip_time * 1000)
+        release_ms = int(self.release_time * 1000)
+
+        if self.transit == "arch":
+            # Arch over to the pick, grab, arch over to the box, release
+            self.move.Jump(target_x, target_y, self.pick_z, self.safe_r)
+            self.dashboard.DO(1, 1)
+            self.dashboard.wait(grip_ms)
+            self.move.Jump(px, py, self.place_z, self.safe_r)
+            self.dashboard.DO(1, 0)
+            self.dashboard.DO(2, 1)
+            self.dashboard.wait(release_ms)
+            self.dashboard.DO(2, 0)
+            if self.place_z != self.safe_z:
+                self.move.MovL(px, py, self.safe_z, self.safe_r)
+            if sync:
+                self.move.Sync()
+            return
+
+        # 1-2. Hover above the target, then descend
+        self.move.MovJ(target_x, target_y, self.safe_z, self.safe_r)
+        self.move.MovL(target_x, target_y, self.pick_z, self.safe_r)
+
+        # 3. Suction on, dwell in the queue until it grips
+        self.dashboard.DO(1, 1)
+        self.dashboard.wait(grip_ms)
+
+        # 4-6. Lift, transit to the box and down to the place height; on
+        # arrival DO1 off + DO2 on
+        self.move.MovL(target_x, target_y, self.safe_z, self.safe_r)
+        if self.place_z != self.safe_z:
+            self.move.MovJ(px, py, self.safe_z, self.safe_r)
+            self.move.MovLIO(px, py, self.place_z, self.safe_r,
+                             "{0,100,1,0}", "{0,100,2,1}")
+        else:
+            self.move.MovJIO(px, py, self.safe_z, self.safe_r,
+                             "{0,100,1,0}", "{0,100,2,1}")
+
+        # 7. Blow-off dwell, then close DO2
+        self.dashboard.wait(release_ms)
+        self.dashboard.DO(2, 0)
+
+        # 8. Back up to the safe height
+        if self.place_z != self.safe_z:
+            self.move.MovL(px, py, self.safe_z, self.safe_r)
+
+        if sync:
+            self.move.Sync()
+
+    def run_queued(self, targets, drops=None):
+        """Queue every pick in targets back to back and Sync once at the end
+
+        drops: optional [X, Y, Z] bin per target (default: drop_location)
+        """
+        drops = drops or [None] * len(targets)
+        for (x, y), drop in zip(targets, drops):
+            self.pick_and_place_queued(x, y, sync=False, drop=drop)
+        self.move.Sync()
+        print(f"{len(targets)} items placed.")
 
-def disconnect(self):
-    # Disconnect
-    DisconnectRobot(self.dashboard, self.move, self.feed, self.feed_thread)
+    def disconnect(self):
+        # Disconnect
+        DisconnectRobot(self.dashboard, self.move, self.feed, self.feed_thread,
+                        self._stop_feed)
+        if self.recorder is not None:
+            self.recorder.close()
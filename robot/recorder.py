@@ -0,0 +1,273 @@
+"""
+Memory-mapped feedback recorder and replay
+
+A recording is a small header followed by fixed-size records: a float64
+monotonic receive time and the raw 1440-byte feedback packet. The file is
+memory mapped, both for writing (grown in chunks) and for reading, so a
+recording opens instantly as a structured array and the packets are a
+zero-copy MyType view:
+
+    times, packets = load_recording("run.feed")
+    packets["tool_vector_actual"]  # (N, 6), straight from the page cache
+
+ReplaySource serves a recording through recv_into like the feedback
+socket, in real time or as fast as possible, so FeedbackReader can read it
+back deterministically.
+
+Command line (run from the project root):
+    python -m robot.recorder record run.feed --ip 127.0.0.1 --seconds 10
+    python -m robot.recorder info run.feed
+    python -m robot.recorder replay run.feed [--speed 1.0 | --max]
+"""
+
+import argparse
+import os
+import socket
+import time
+import numpy as np
+from robot.dobot_api import MyType
+from robot.dobot_controller import FeedbackReader
+
+FILE_MAGIC = b"MG4FEED"  # null-padded to 8 bytes in the header
+FILE_VERSION = 1
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("version", "<u4"),
+                         ("record_size", "<u4"), ("count", "<u8")])
+RECORD_DTYPE = np.dtype([("timestamp", "<f8"), ("packet", MyType)])
+
+
+class FeedbackRecorder:
+    """
+    Appends feedback packets to a memory-mapped recording
+
+    Has the same append(packet, timestamp) method as TelemetryBuffer, so it
+    can be handed to GetFeed / MG400Controller as a telemetry sink.
+
+    Args:
+        path: file to create (overwritten)
+        chunk_records: records added each time the file grows (7500 is one
+            minute at 125 Hz)
+    """
+
+    def __init__(self, path, chunk_records=7500):
+        self.path = path
+        self.chunk_records = chunk_records
+        self.count = 0
+        self._file = open(path, "w+b")
+        self._capacity = 0
+        self._map = None
+        self._grow()
+
+    def _grow(self):
+        self._capacity += self.chunk_records
+        self._file.truncate(HEADER_SIZE + self._capacity * RECORD_DTYPE.itemsize)
+        if self._map is not None:
+            self._map.flush()
+        self._map = np.memmap(self._file, dtype=np.uint8, mode="r+")
+        self._header = self._map[:HEADER_DTYPE.itemsize].view(HEADER_DTYPE)
+        self._header["magic"] = FILE_MAGIC
+        self._header["version"] = FILE_VERSION
+        self._header["record_size"] = RECORD_DTYPE.itemsize
+        self._header["count"] = self.count
+        self._records = self._map[HEADER_SIZE:].view(RECORD_DTYPE)
+
+    def append(self, packet, timestamp=None):
+        """
+        Record one packet
+
+        Args:
+            packet: MyType record (e.g. FeedbackReader.packet) or the raw
+                1440 bytes
+            timestamp: monotonic receive time (default: now)
+        """
+        if self._map is None:
+            raise ValueError("Recorder is closed")
+        if self.count == self._capacity:
+            self._grow()
+        if not isinstance(packet, np.ndarray):
+            packet = np.frombuffer(packet, dtype=MyType)[0]
+        record = self._records[self.count:self.count + 1]
+        record["timestamp"] = time.monotonic() if timestamp is None else timestamp
+        record["packet"] = packet
+        self.count += 1
+        self._header["count"] = self.count
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        """Flush and trim the unused preallocated tail"""
+        if self._map is None:
+            return
+        self._map.flush()
+        self._map = self._header = self._records = None
+        self._file.truncate(HEADER_SIZE + self.count * RECORD_DTYPE.itemsize)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_recording(path):
+    """
+    Map a recording read-only
+
+    Returns:
+        numpy.memmap: structured array of RECORD_DTYPE records
+    """
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) == 0 or header["magic"][0] != FILE_MAGIC:
+        raise ValueError(f"{path} is not a feedback recording")
+    if header["record_size"][0] != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path}: unexpected record size {header['record_size'][0]}")
+    count = int(header["count"][0])
+    # A recorder that was not closed leaves preallocated records behind
+    available = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    count = min(count, available)
+    if count == 0:
+        return np.zeros(0, RECORD_DTYPE)
+    return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE,
+                     shape=(count,))
+
+
+def load_recording(path):
+    """
+    Returns:
+        tuple: (timestamps, packets) - float64 (N,) and MyType (N,) views
+        of the mapped file
+    """
+    records = open_recording(path)
+    return records["timestamp"], records["packet"]
+
+
+class ReplaySource:
+    """
+    Serves a recording's packets like the feedback socket
+
+    Args:
+        path: recording file
+        speed: playback rate relative to the recorded timing (1.0 = real
+            time); None replays as fast as the reader takes the data
+        loop: start over at the end instead of reporting end of stream
+    """
+
+    def __init__(self, path, speed=1.0, loop=False):
+        records = open_recording(path)
+        self.times = records["timestamp"]
+        self._raw = records.view(np.uint8).reshape(len(records), RECORD_DTYPE.itemsize)
+        self.speed = speed
+        self.loop = loop
+        self._offset = RECORD_DTYPE.fields["packet"][1]
+        self._index = 0       # next packet
+        self._position = 0    # bytes of it already served
+        self._started = None  # (wall clock, first recorded time)
+
+    def __len__(self):
+        return len(self.times)
+
+    def settimeout(self, timeout):
+        pass
+
+    def _wait_due(self):
+        if self.speed is None:
+            return
+        now = time.monotonic()
+        if self._started is None:
+            self._started = (now, self.times[self._index])
+        due = self._started[0] + (self.times[self._index] - self._started[1]) / self.speed
+        if due > now:
+            time.sleep(due - now)
+
+    def recv_into(self, buffer, nbytes=0):
+        if self._index >= len(self.times):
+            if not self.loop or len(self.times) == 0:
+                return 0
+            self._index = 0
+            self._started = None
+        if self._position == 0:
+            self._wait_due()
+        packet = self._raw[self._index, self._offset + self._position:]
+        n = min(len(packet), len(buffer) if not nbytes else nbytes)
+        memoryview(buffer)[:n] = packet[:n]
+        self._position += n
+        if self._position == MyType.itemsize:
+            self._index += 1
+            self._position = 0
+        return n
+
+    def recv(self, size):
+        buffer = bytearray(size)
+        n = self.recv_into(buffer)
+        return bytes(buffer[:n])
+
+    def close(self):
+        self._raw = None
+
+
+def record(path, ip, seconds, port=30004):
+    """Record the feedback port of a controller (or simulator) for seconds"""
+    sock = socket.create_connection((ip, port), timeout=5.0)
+    sock.settimeout(1.0)
+    reader = FeedbackReader(sock)
+    end = time.monotonic() + seconds
+    with FeedbackRecorder(path) as recorder:
+        while time.monotonic() < end:
+            if reader.read() is not None:
+                recorder.append(reader.packet, time.monotonic())
+        count = recorder.count
+    sock.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Feedback recorder and replay")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="Record the feedback port")
+    rec.add_argument("path")
+    rec.add_argument("--ip", default="192.168.1.6")
+    rec.add_argument("--seconds", type=float, default=10.0)
+    info = sub.add_parser("info", help="Summarize a recording")
+    info.add_argument("path")
+    rep = sub.add_parser("replay", help="Read a recording back through FeedbackReader")
+    rep.add_argument("path")
+    rep.add_argument("--speed", type=float, default=1.0)
+    rep.add_argument("--max", action="store_true", help="Replay as fast as possible")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        count = record(args.path, args.ip, args.seconds)
+        print(f"Recorded {count} packets to {args.path}")
+    elif args.command == "info":
+        times, packets = load_recording(args.path)
+        if not len(times):
+            print("Empty recording")
+            return
+        duration = times[-1] - times[0]
+        pose = packets["tool_vector_actual"]
+        print(f"{len(times)} packets over {duration:.1f} s "
+              f"({len(times) / max(duration, 1e-9):.0f} packets/s)")
+        print(f"Moving {np.mean(packets['RunningStatus'] != 0) * 100:.0f}% of the time, "
+              f"X {pose[:, 0].min():.1f}..{pose[:, 0].max():.1f} mm, "
+              f"Y {pose[:, 1].min():.1f}..{pose[:, 1].max():.1f} mm, "
+              f"Z {pose[:, 2].min():.1f}..{pose[:, 2].max():.1f} mm")
+    else:
+        source = ReplaySource(args.path, speed=None if args.max else args.speed)
+        reader = FeedbackReader(source)
+        start = time.monotonic()
+        while True:
+            try:
+                reader.read()
+            except ConnectionError:
+                break
+        elapsed = time.monotonic() - start
+        print(f"Replayed {reader.packets} packets in {elapsed:.3f} s "
+              f"({reader.packets / max(elapsed, 1e-9):.0f} packets/s, "
+              f"{reader.resyncs} resyncs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,681 @@
+"""
+Local Dobot MG400 TCP simulator
+
+Serves the three ports robot/dobot_api.py talks to, so MG400Controller can
+be exercised (and timed) without the physical arm:
+
+    29999  dashboard commands  ("EnableRobot()", "DO(1,1)", ...)
+    30003  motion commands     ("MovJ(...)", "MovL(...)", "Sync()", ...)
+    30004  1440-byte MyType feedback packets, streamed every 8 ms
+
+Replies use the controller's "ErrorID,{values},Cmd(...);" form. Motion and
+DO commands go through one queue, like on the real controller, and
+tool_vector_actual is animated toward each target with a trapezoidal
+velocity profile.
+
+The kinematics are simplified: MovL moves in a straight line at the linear
+speed/acceleration, MovJ interpolates (J1 angle, radius, z, r) using the
+joint speed for the angles and the linear speed for radius and z, and Jump
+follows the lift / traverse / descend polyline up to LimZ as one blended
+move (corners are passed without stopping). q_actual reports J1 and J4 only.
+
+Run standalone (Ctrl+C to stop):
+    python -m robot.simulator --ip 127.0.0.1
+"""
+
+import argparse
+import math
+import re
+import socket
+import threading
+import time
+from collections import deque
+import numpy as np
+from robot.dobot_api import MyType
+
+DASHBOARD_PORT = 29999
+MOVE_PORT = 30003
+FEED_PORT = 30004
+
+FEEDBACK_TEST_VALUE = 0x123456789abcdef
+
+# robot_mode values reported on the feedback port / by RobotMode()
+MODE_DISABLED = 4
+MODE_ENABLED = 5
+MODE_RUNNING = 7
+MODE_ERROR = 9
+
+_COMMAND_RE = re.compile(r"\s*([A-Za-z_]\w*)\s*\(")
+_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def split_commands(buffer):
+    """
+    Split received text into complete "Name(args)" commands
+
+    Returns:
+        tuple: (list of (name, args_string, raw_command), unparsed remainder)
+    """
+    commands = []
+    pos = 0
+    while True:
+        match = _COMMAND_RE.search(buffer, pos)
+        if match is None:
+            # Keep a command name cut off at the end of the received data
+            tail = buffer[pos:]
+            return commands, tail[max(tail.rfind(";"), tail.rfind(")")) + 1:].lstrip()
+        depth = 0
+        end = None
+        for i in range(match.end() - 1, len(buffer)):
+            if buffer[i] in "({":
+                depth += 1
+            elif buffer[i] in ")}":
+                depth -= 1
+                if depth == 0:
+                    end = i
+                    break
+        if end is None:
+            return commands, buffer[match.start():]
+        args = buffer[match.end():end]
+        commands.append((match.group(1), args, buffer[match.start():end + 1].strip()))
+        pos = end + 1
+
+
+def parse_numbers(text):
+    return [float(x) for x in _NUMBER_RE.findall(text)]
+
+
+def trapezoid_duration(distance, speed, acc):
+    """Duration of a rest-to-rest move with a trapezoidal velocity profile"""
+    if distance <= 0:
+        return 0.0
+    if speed * speed / acc >= distance:  # never reaches full speed
+        return 2.0 * math.sqrt(distance / acc)
+    return distance / speed + speed / acc
+
+
+def trapezoid_progress(t, duration, distance, speed, acc):
+    """Distance covered after t seconds on the profile of trapezoid_duration"""
+    if t >= duration:
+        return distance
+    if speed * speed / acc >= distance:
+        t_acc = duration / 2.0
+        if t <= t_acc:
+            return 0.5 * acc * t * t
+        t_dec = duration - t
+        return distance - 0.5 * acc * t_dec * t_dec
+    t_acc = speed / acc
+    if t <= t_acc:
+        return 0.5 * acc * t * t
+    if t <= duration - t_acc:
+        return 0.5 * acc * t_acc * t_acc + speed * (t - t_acc)
+    t_dec = duration - t
+    return distance - 0.5 * acc * t_dec * t_dec
+
+
+def to_cylindrical(pose):
+    x, y, z, r = pose
+    return np.array([math.degrees(math.atan2(y, x)), math.hypot(x, y), z, r])
+
+
+def from_cylindrical(c):
+    theta, rho, z, r = c
+    return np.array([rho * math.cos(math.radians(theta)),
+                     rho * math.sin(math.radians(theta)), z, r])
+
+
+class Motion:
+    """One queued motion, parametrized by a normalized path coordinate s in [0, 1]"""
+
+    def __init__(self, kind, start, target, speed, acc, ios=(), waypoints=None):
+        self.kind = kind
+        self.start = np.array(start, dtype=float)
+        self.target = np.array(target, dtype=float)
+        self.ios = list(ios)  # [mode, distance, index, status]
+        self.started_at = None
+
+        if kind == "Jump":
+            # waypoints: start, lifted start, lifted target, target
+            self._points = [np.array(p, dtype=float) for p in waypoints]
+            lengths = [np.linalg.norm(b[:3] - a[:3])
+                       for a, b in zip(self._points, self._points[1:])]
+            self._cumulative = np.concatenate([[0.0], np.cumsum(lengths)])
+            self.length = float(self._cumulative[-1])
+            scale = self.length if self.length > 0 else 1.0
+            self._speed = speed / scale
+            self._acc = acc / scale
+        elif kind == "MovJ":
+            c0, c1 = to_cylindrical(self.start), to_cylindrical(self.target)
+            c1[0] = c0[0] + (c1[0] - c0[0] + 180.0) % 360.0 - 180.0
+            self._c0, self._c1 = c0, c1
+            deltas = np.abs(c1 - c0)
+            # speed/acc are (angular deg/s, linear mm/s) pairs for MovJ
+            limits_v = np.array([speed[0], speed[1], speed[1], speed[0]])
+            limits_a = np.array([acc[0], acc[1], acc[1], acc[0]])
+            durations = [trapezoid_duration(d, v, a)
+                         for d, v, a in zip(deltas, limits_v, limits_a)]
+            axis = int(np.argmax(durations))
+            # All axes follow the slowest axis' profile, normalized to 1
+            scale = deltas[axis] if deltas[axis] > 0 else 1.0
+            self._speed = limits_v[axis] / scale
+            self._acc = limits_a[axis] / scale
+            self.length = float(np.linalg.norm(self.target[:3] - self.start[:3]))
+        else:
+            self.length = float(np.linalg.norm(self.target[:3] - self.start[:3]))
+            rot = abs(self.target[3] - self.start[3])
+            scale = self.length if self.length > 0 else max(rot, 1.0)
+            self._speed = speed / scale
+            self._acc = acc / scale
+        self.duration = trapezoid_duration(1.0, self._speed, self._acc)
+
+    def progress(self, t):
+        return trapezoid_progress(t, self.duration, 1.0, self._speed, self._acc)
+
+    def pose(self, s):
+        if self.kind == "Jump":
+            d = s * self.length
+            i = int(np.searchsorted(self._cumulative, d, side="right")) - 1
+            i = min(max(i, 0), len(self._points) - 2)
+            seg = self._cumulative[i + 1] - self._cumulative[i]
+            f = (d - self._cumulative[i]) / seg if seg > 0 else 1.0
+            pose = self._points[i] + (self._points[i + 1] - self._points[i]) * f
+            # r turns evenly over the whole move
+            pose[3] = self.start[3] + (self.target[3] - self.start[3]) * s
+            return pose
+        if self.kind == "MovJ":
+            return from_cylindrical(self._c0 + (self._c1 - self._c0) * s)
+        return self.start + (self.target - self.start) * s
+
+
+class MG400Simulator:
+    """
+    Args:
+        ip: address to bind the three ports to (use 127.0.0.x to run
+            several simulators side by side)
+        joint_speed: J1/J4 speed at SpeedJ(100), deg/s
+        joint_acc: J1/J4 acceleration at AccJ(100), deg/s^2
+        linear_speed: Cartesian speed at SpeedL(100), mm/s
+        linear_acc: Cartesian acceleration at AccL(100), mm/s^2
+        feedback_period: seconds between feedback packets
+        enable_time: seconds between EnableRobot() and EnableStatus == 1
+        home: initial [x, y, z, r]
+    """
+
+    def __init__(self, ip="127.0.0.1", joint_speed=300.0, joint_acc=1500.0,
+                 linear_speed=1000.0, linear_acc=4000.0, feedback_period=0.008,
+                 enable_time=0.2, home=(300.0, 0.0, 0.0, 0.0)):
+        self.ip = ip
+        self.joint_speed = joint_speed
+        self.joint_acc = joint_acc
+        self.linear_speed = linear_speed
+        self.linear_acc = linear_acc
+        self.feedback_period = feedback_period
+        self.enable_time = enable_time
+
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._servers = []
+        self._clients = []
+
+        # Robot state (guarded by _lock)
+        self.pose = np.array(home, dtype=float)
+        self.tcp_speed = np.zeros(6)
+        self.enabled = False
+        self._enable_at = None
+        self.error = False
+        self.digital_outputs = 0
+        self.speed_factor = 100
+        self.speed_j = 100
+        self.speed_l = 100
+        self.acc_j = 100
+        self.acc_l = 100
+        self.payload = 0.0
+        self.arch_index = 0
+        self.lim_z = None  # Jump lift height; None = 50 mm above the higher end
+        self.queue = deque()
+        self.current = None  # active Motion or ("wait", end_time)
+        self.commands_received = 0
+        self.started_at = time.monotonic()
+
+    # -- lifecycle -------------------------------------------------------
+
+    def start(self):
+        for port, handler in ((DASHBOARD_PORT, self._serve_commands),
+                              (MOVE_PORT, self._serve_commands),
+                              (FEED_PORT, self._serve_feedback)):
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.ip, port))
+            server.listen(4)
+            server.settimeout(0.2)
+            self._servers.append(server)
+            self._spawn(self._accept_loop, server, handler)
+        self._spawn(self._motion_loop)
+        print(f"MG400 simulator listening on {self.ip} "
+              f"({DASHBOARD_PORT}/{MOVE_PORT}/{FEED_PORT})")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for sock in self._servers + self._clients:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+        self._servers = []
+        self._clients = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _spawn(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _accept_loop(self, server, handler):
+        while not self._stop.is_set():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._clients.append(conn)
+            self._spawn(handler, conn)
+
+    # -- ports -----------------------------------------------------------
+
+    def _serve_commands(self, conn):
+        buffer = ""
+        conn.settimeout(0.2)
+        while not self._stop.is_set():
+            try:
+                data = conn.recv(4096)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data.decode("utf-8", errors="replace")
+            commands, buffer = split_commands(buffer)
+            for name, args, raw in commands:
+                reply = self.execute(name, args, raw)
+                try:
+                    conn.sendall(reply.encode("utf-8"))
+                except OSError:
+                    return
+
+    def _serve_feedback(self, conn):
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                conn.sendall(self.feedback_packet().tobytes())
+            except OSError:
+                return
+            next_time += self.feedback_period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+
+    def feedback_packet(self):
+        """Current state as a 1440-byte MyType record"""
+        packet = np.zeros(1, dtype=MyType)
+        with self._lock:
+            self._update_enable()
+            running = self.current is not None
+            packet["len"] = MyType.itemsize
+            packet["test_value"] = FEEDBACK_TEST_VALUE
+            packet["robot_mode"] = self._robot_mode()
+            packet["controller_timer"] = int((time.monotonic() - self.started_at) * 1000)
+            packet["digital_outputs"] = self.digital_outputs
+            packet["tool_vector_actual"][0, :4] = self.pose
+            packet["Tool_vector_target"][0, :4] = self._target_pose()
+            packet["TCP_speed_actual"] = self.tcp_speed
+            theta = math.degrees(math.atan2(self.pose[1], self.pose[0]))
+            packet["q_actual"][0, 0] = theta
+            packet["q_actual"][0, 3] = self.pose[3]
+            packet["EnableStatus"] = int(self.enabled)
+            packet["RunningStatus"] = int(running)
+            packet["isRunQueuedCmd"] = int(running or bool(self.queue))
+            packet["ErrorStatus"] = int(self.error)
+            packet["velocityRatio"] = self.speed_j
+            packet["accelerationRatio"] = self.acc_j
+            packet["xyzVelocityRatio"] = self.speed_l
+            packet["xyzAccelerationRatio"] = self.acc_l
+            packet["load"] = self.payload
+        return packet
+
+    # -- command handling ------------------------------------------------
+
+    def execute(self, name, args, raw):
+        """Run one command and return the reply string"""
+        handler = getattr(self, "_cmd_" + name.lower(), None)
+        with self._lock:
+            self.commands_received += 1
+            if handler is None:
+                return f"-10000,{{}},{raw};"
+            try:
+                error_id, values = handler(args)
+            except (ValueError, IndexError):
+                return f"-10000,{{}},{raw};"
+        if name.lower() in ("sync", "syncall"):
+            self._wait_idle()
+        return f"{error_id},{{{values}}},{raw};"
+
+    def _wait_idle(self):
+        with self._lock:
+            self._lock.wait_for(
+                lambda: self.current is None and not self.queue or self._stop.is_set())
+
+    def _robot_mode(self):
+        if self.error:
+            return MODE_ERROR
+        if not self.enabled:
+            return MODE_DISABLED
+        if self.current is not None or self.queue:
+            return MODE_RUNNING
+        return MODE_ENABLED
+
+    def _update_enable(self):
+        if self._enable_at is not None and time.monotonic() >= self._enable_at:
+            self.enabled = True
+            self._enable_at = None
+
+    def _target_pose(self):
+        if self.current is not None and isinstance(self.current, Motion):
+            return self.current.target
+        return self.pose
+
+    def _queue_end_pose(self):
+        for item in reversed(self.queue):
+            if item[0] == "move":
+                return np.array(item[2], dtype=float)
+        if isinstance(self.current, Motion):
+            return self.current.target
+        return self.pose.copy()
+
+    def _queue_motion(self, kind, target, ios=()):
+        self._update_enable()
+        if not self.enabled or self.error:
+            return -1, ""
+        self.queue.append(("move", kind, list(target), list(ios)))
+        self._lock.notify_all()
+        return 0, ""
+
+    # Dashboard port
+
+    def _cmd_enablerobot(self, args):
+        if not self.enabled and self._enable_at is None:
+            self._enable_at = time.monotonic() + self.enable_time
+        return 0, ""
+
+    def _cmd_disablerobot(self, args):
+        self.enabled = False
+        self._enable_at = None
+        self.queue.clear()
+        self.current = None
+        self.tcp_speed[:] = 0
+        self._lock.notify_all()
+        return 0, ""
+
+    def _cmd_clearerror(self, args):
+        self.error = False
+        return 0, ""
+
+    def _cmd_resetrobot(self, args):
+        self.queue.clear()
+        self.current = None
+        self.tcp_speed[:] = 0
+        self._lock.notify_all()
+        return 0, ""
+
+    def _cmd_emergencystop(self, args):
+        self._cmd_resetrobot(args)
+        self.error = True
+        return 0, ""
+
+    def _cmd_speedfactor(self, args):
+        self.speed_factor = int(parse_numbers(args)[0])
+        return 0, ""
+
+    def _cmd_speedj(self, args):
+        self.speed_j = int(parse_numbers(args)[0])
+        return 0, ""
+
+    def _cmd_speedl(self, args):
+        self.speed_l = int(parse_numbers(args)[0])
+        return 0, ""
+
+    def _cmd_accj(self, args):
+        self.acc_j = int(parse_numbers(args)[0])
+        return 0, ""
+
+    def _cmd_accl(self, args):
+        self.acc_l = int(parse_numbers(args)[0])
+        return 0, ""
+
+    def _cmd_payload(self, args):
+        self.payload = parse_numbers(args)[0]
+        return 0, ""
+
+    def _cmd_cp(self, args):
+        return 0, ""
+
+    def _cmd_user(self, args):
+        return 0, ""
+
+    def _cmd_tool(self, args):
+        return 0, ""
+
+    def _cmd_do(self, args):
+        # DO is a queue instruction: it takes effect after the queued motions
+        index, status = (int(x) for x in parse_numbers(args)[:2])
+        self.queue.append(("do", index, status))
+        self._lock.notify_all()
+        return 0, ""
+
+    def _cmd_doexecute(self, args):
+        index, status = (int(x) for x in parse_numbers(args)[:2])
+        self._set_do(index, status)
+        return 0, ""
+
+    def _cmd_wait(self, args):
+        self.queue.append(("wait", parse_numbers(args)[0] / 1000.0))
+        self._lock.notify_all()
+        return 0, ""
+
+    def _cmd_arch(self, args):
+        self.arch_index = int(parse_numbers(args)[0])
+        return 0, ""
+
+    def _cmd_limz(self, args):
+        self.lim_z = parse_numbers(args)[0]
+        return 0, ""
+
+    def _cmd_robotmode(self, args):
+        self._update_enable()
+        return 0, str(self._robot_mode())
+
+    def _cmd_getpose(self, args):
+        return 0, ",".join(f"{v:f}" for v in list(self.pose) + [0.0, 0.0])
+
+    def _cmd_getangle(self, args):
+        theta = math.degrees(math.atan2(self.pose[1], self.pose[0]))
+        return 0, f"{theta:f},0.000000,0.000000,{self.pose[3]:f},0.000000,0.000000"
+
+    def _cmd_geterrorid(self, args):
+        return 0, "[" + ",".join(["[]"] * 7) + "]"
+
+    # Motion port
+
+    def _cmd_movj(self, args):
+        return self._queue_motion("MovJ", parse_numbers(args)[:4])
+
+    def _cmd_movl(self, args):
+        return self._queue_motion("MovL", parse_numbers(args)[:4])
+
+    def _cmd_relmovj(self, args):
+        target = self._queue_end_pose() + parse_numbers(args)[:4]
+        return self._queue_motion("MovJ", target)
+
+    def _cmd_relmovl(self, args):
+        target = self._queue_end_pose() + parse_numbers(args)[:4]
+        return self._queue_motion("MovL", target)
+
+    def _cmd_jump(self, args):
+        return self._queue_motion("Jump", parse_numbers(args)[:4])
+
+    def _cmd_movjio(self, args):
+        return self._queue_io_motion("MovJ", args)
+
+    def _cmd_movlio(self, args):
+        return self._queue_io_motion("MovL", args)
+
+    def _queue_io_motion(self, kind, args):
+        # "x,y,z,r,{Mode,Distance,Index,Status},..." (tuples also accepted)
+        head = re.split(r"[({]", args, maxsplit=1)[0]
+        groups = re.findall(r"[({]([^)}]*)[)}]", args)
+        ios = [parse_numbers(group)[:4] for group in groups]
+        return self._queue_motion(kind, parse_numbers(head)[:4], ios)
+
+    def _cmd_sync(self, args):
+        return 0, ""
+
+    def _cmd_syncall(self, args):
+        return 0, ""
+
+    # -- motion ----------------------------------------------------------
+
+    def _set_do(self, index, status):
+        bit = 1 << (index - 1)
+        if status:
+            self.digital_outputs |= bit
+        else:
+            self.digital_outputs &= ~bit
+
+    def _start_next(self, now):
+        """Pop queued items until a motion or wait is active (lock held)"""
+        while self.current is None and self.queue:
+            item = self.queue.popleft()
+            if item[0] == "do":
+                self._set_do(item[1], item[2])
+            elif item[0] == "wait":
+                self.current = ("wait", now + item[1])
+            else:
+                _, kind, target, ios = item
+                target = np.array(target + [0.0] * (4 - len(target)))[:4]
+                self.current = self._make_motion(kind, target, ios)
+                self.current.started_at = now
+
+    def _make_motion(self, kind, target, ios):
+        factor = self.speed_factor / 100.0
+        if kind == "MovJ":
+            speed = (self.joint_speed * self.speed_j / 100.0 * factor,
+                     self.linear_speed * self.speed_j / 100.0 * factor)
+            acc = (self.joint_acc * self.acc_j / 100.0,
+                   self.linear_acc * self.acc_j / 100.0)
+        else:
+            speed = self.linear_speed * self.speed_l / 100.0 * factor
+            acc = self.linear_acc * self.acc_l / 100.0
+        waypoints = None
+        if kind == "Jump":
+            top = max(self.pose[2], target[2])
+            if self.lim_z is None:
+                top += 50.0
+            else:
+                top = max(top, self.lim_z)
+            lifted_start = np.array([self.pose[0], self.pose[1], top, self.pose[3]])
+            lifted_target = np.array([target[0], target[1], top, target[3]])
+            waypoints = [self.pose, lifted_start, lifted_target, target]
+        return Motion(kind, self.pose, target, speed, acc, ios, waypoints)
+
+    def _step(self, now, dt):
+        self._update_enable()
+        self._start_next(now)
+        current = self.current
+        if current is None:
+            self.tcp_speed[:] = 0
+            return
+        if isinstance(current, tuple):  # queued wait
+            if now >= current[1]:
+                self.current = None
+                self._start_next(now)
+                self._lock.notify_all()
+            return
+
+        t = now - current.started_at
+        s = current.progress(t)
+        previous = self.pose.copy()
+        self.pose = current.pose(s)
+        if dt > 0:
+            self.tcp_speed[:4] = (self.pose - previous) / dt
+
+        # IO triggers of MovLIO/MovJIO
+        for io in list(current.ios):
+            mode, distance, index, status = io
+            if mode == 0:
+                reached = s * 100.0 >= distance
+            elif distance >= 0:
+                reached = s * current.length >= distance
+            else:
+                reached = (1.0 - s) * current.length <= -distance
+            if reached:
+                self._set_do(int(index), int(status))
+                current.ios.remove(io)
+
+        if t >= current.duration:
+            for mode, distance, index, status in current.ios:
+                self._set_do(int(index), int(status))
+            self.pose = current.target.copy()
+            self.current = None
+            self._start_next(now)
+            self._lock.notify_all()
+
+    def _motion_loop(self):
+        last = time.monotonic()
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                self._step(now, now - last)
+            last = now
+            time.sleep(0.001)
+        with self._lock:
+            self._lock.notify_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dobot MG400 TCP simulator")
+    parser.add_argument("--ip", default="127.0.0.1", help="Address to bind")
+    parser.add_argument("--joint-speed", type=float, default=300.0, help="deg/s at SpeedJ(100)")
+    parser.add_argument("--linear-speed", type=float, default=1000.0, help="mm/s at SpeedL(100)")
+    parser.add_argument("--feedback-period", type=float, default=0.008,
+                        help="Seconds between feedback packets")
+    args = parser.parse_args()
+
+    sim = MG400Simulator(args.ip, joint_speed=args.joint_speed,
+                         linear_speed=args.linear_speed,
+                         feedback_period=args.feedback_period).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
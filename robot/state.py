@@ -0,0 +1,184 @@
+"""
+Event-driven robot state
+
+RobotState holds the latest feedback values of one robot. The feedback
+thread pushes every packet through update(); waiters block on a predicate
+and are woken only when a field they depend on actually changed, and
+subscribers get a callback with the set of changed fields. Nothing polls.
+"""
+
+import threading
+from time import monotonic
+import numpy as np
+
+FIELDS = ("pose", "queued", "enabled", "error", "running", "digital_outputs",
+          "speed_j", "acc_j", "speed_l", "acc_l", "payload")
+
+
+class RobotState:
+    """
+    Latest feedback of one robot
+
+    Attributes (read them under a wait predicate, or via snapshot()):
+        pose: [x, y, z, r, rx, ry] tool pose (tool_vector_actual), or None
+        queued: isRunQueuedCmd, commands are pending in the motion queue
+        enabled: EnableStatus
+        error: ErrorStatus
+        running: RunningStatus, a motion is in progress
+        digital_outputs: DO bit mask (bit 0 = DO1)
+        speed_j, acc_j: joint speed / acceleration ratio (velocityRatio,
+            accelerationRatio), as set by SpeedJ / AccJ
+        speed_l, acc_l: linear speed / acceleration ratio (xyzVelocityRatio,
+            xyzAccelerationRatio), as set by SpeedL / AccL
+        payload: load set by PayLoad
+        packets: number of feedback packets applied
+        timestamp: monotonic time of the last packet
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = []       # (fields or None, Condition on _lock)
+        self._subscribers = []   # (fields or None, callback)
+        self.pose = None
+        self.queued = None
+        self.enabled = None
+        self.error = False
+        self.running = None
+        self.digital_outputs = None
+        self.speed_j = None
+        self.acc_j = None
+        self.speed_l = None
+        self.acc_l = None
+        self.payload = None
+        self.packets = 0
+        self.timestamp = None
+
+    def update(self, timestamp=None, **values):
+        """
+        Apply one feedback packet
+
+        Wakes the waiters and calls the subscribers whose fields changed,
+        and those registered without fields on every packet.
+
+        Returns:
+            set: names of the fields that changed
+        """
+        changed = set()
+        with self._lock:
+            for name, value in values.items():
+                old = getattr(self, name)
+                if name == "pose":
+                    if old is None or not np.array_equal(old, value):
+                        changed.add(name)
+                elif old != value:
+                    changed.add(name)
+                setattr(self, name, value)
+            self.packets += 1
+            self.timestamp = monotonic() if timestamp is None else timestamp
+            for fields, cond in self._waiters:
+                if fields is None or not fields.isdisjoint(changed):
+                    cond.notify()
+            subscribers = [callback for fields, callback in self._subscribers
+                           if fields is None or not fields.isdisjoint(changed)]
+
+        for callback in subscribers:
+            callback(self, changed)
+        return changed
+
+    def snapshot(self):
+        """Consistent copy of all fields as a dict"""
+        with self._lock:
+            values = {name: getattr(self, name) for name in FIELDS}
+            values["packets"] = self.packets
+            values["timestamp"] = self.timestamp
+        return values
+
+    def check(self, predicate):
+        """Evaluate predicate(state) once, under the state lock"""
+        with self._lock:
+            return bool(predicate(self))
+
+    def subscribe(self, callback, fields=None):
+        """
+        Call callback(state, changed_fields) from the feedback thread for
+        every packet that changes one of fields (None: every packet)
+
+        Returns:
+            the handle to pass to unsubscribe()
+        """
+        entry = (None if fields is None else frozenset(fields), callback)
+        with self._lock:
+            self._subscribers.append(entry)
+        return entry
+
+    def unsubscribe(self, handle):
+        with self._lock:
+            if handle in self._subscribers:
+                self._subscribers.remove(handle)
+
+    def wait_for(self, predicate, fields=None, timeout=None):
+        """
+        Block until predicate(state) is true
+
+        The predicate runs under the state lock, first immediately and then
+        only when a packet changes one of fields (None: on every packet).
+
+        Returns:
+            bool: True if the predicate became true, False on timeout
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        cond = threading.Condition(self._lock)
+        entry = (None if fields is None else frozenset(fields), cond)
+        with self._lock:
+            if predicate(self):
+                return True
+            self._waiters.append(entry)
+            try:
+                while True:
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    cond.wait(remaining)
+                    if predicate(self):
+                        return True
+            finally:
+                self._waiters.remove(entry)
+
+    # Common waits
+
+    def near(self, target_point, tolerance=1.0):
+        """True if the pose is within tolerance of target_point (call under a wait)"""
+        if self.pose is None:
+            return False
+        return all(abs(self.pose[i] - target_point[i]) <= tolerance
+                   for i in range(len(target_point)))
+
+    def wait_arrive(self, target_point, tolerance=1.0, timeout=30.0):
+        """Wait until the pose is within tolerance of target_point"""
+        return self.wait_for(lambda s: s.near(target_point, tolerance),
+                             fields=("pose",), timeout=timeout)
+
+    def wait_motion_done(self, target_point, tolerance=1.0, timeout=10.0):
+        """
+        Wait until the pose is at target_point and the controller reports
+        neither a running motion nor pending queued commands
+
+        Returns:
+            bool: True if the move finished, False on timeout or robot error
+        """
+        def done(s):
+            return s.error or (not s.running and not s.queued
+                               and s.near(target_point, tolerance))
+
+        if not self.wait_for(done, fields=("pose", "running", "queued", "error"),
+                             timeout=timeout):
+            return False
+        return not self.error
+
+    def wait_digital_output(self, output_index, status, timeout=5.0):
+        """Wait until DO output_index (1-based) reads status"""
+        bit = 1 << (output_index - 1)
+        return self.wait_for(
+            lambda s: s.digital_outputs is not None
+            and bool(s.digital_outputs & bit) == bool(status),
+            fields=("digital_outputs",), timeout=timeout)
@@ -0,0 +1,155 @@
+"""
+Feedback telemetry history
+
+TelemetryBuffer keeps the last N seconds of selected MyType feedback
+fields at the full feedback rate in one preallocated structured array used
+as a ring buffer. GetFeed appends every packet; the query methods return
+time-ordered copies, and moves() derives per-move statistics (duration,
+distance, peak TCP speed, settle time) to show where cycle time goes.
+"""
+
+import threading
+from time import monotonic
+import numpy as np
+from robot.dobot_api import MyType
+
+DEFAULT_FIELDS = ("tool_vector_actual", "TCP_speed_actual", "q_actual",
+                  "qd_actual", "i_actual", "motor_temperatures",
+                  "digital_outputs", "RunningStatus", "isRunQueuedCmd")
+
+
+class TelemetryBuffer:
+    """
+    Args:
+        seconds: history length kept
+        rate: feedback packets per second (125 on the MG400)
+        fields: MyType field names recorded with every packet
+    """
+
+    def __init__(self, seconds=60.0, rate=125.0, fields=DEFAULT_FIELDS):
+        self.fields = tuple(fields)
+        dtype = np.dtype([("timestamp", np.float64)]
+                         + [(name, MyType.fields[name][0]) for name in self.fields])
+        self.capacity = max(1, int(round(seconds * rate)))
+        self.data = np.zeros(self.capacity, dtype)
+        self._columns = {name: self.data[name] for name in dtype.names}
+        self._count = 0  # packets ever appended
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, packet, timestamp=None):
+        """
+        Record one packet
+
+        Args:
+            packet: MyType record (FeedbackReader.packet), or a dict of
+                field views as returned by FeedbackReader.read()
+            timestamp: monotonic receive time (default: now)
+        """
+        with self._lock:
+            slot = self._count % self.capacity
+            self._columns["timestamp"][slot] = monotonic() if timestamp is None else timestamp
+            for name in self.fields:
+                self._columns[name][slot] = packet[name]
+            self._count += 1
+
+    def _ordered(self):
+        """Time-ordered copy of the valid rows (call with the lock held)"""
+        if self._count <= self.capacity:
+            return self.data[:self._count].copy()
+        slot = self._count % self.capacity
+        return np.concatenate((self.data[slot:], self.data[:slot]))
+
+    def window(self, start=None, end=None):
+        """
+        Rows with start <= timestamp <= end, oldest first
+
+        Args:
+            start, end: monotonic times; None leaves that side open
+        """
+        with self._lock:
+            rows = self._ordered()
+        times = rows["timestamp"]
+        lo = 0 if start is None else np.searchsorted(times, start, side="left")
+        hi = len(rows) if end is None else np.searchsorted(times, end, side="right")
+        return rows[lo:hi]
+
+    def last(self, seconds):
+        """Rows of the last seconds, oldest first"""
+        with self._lock:
+            rows = self._ordered()
+        if not len(rows):
+            return rows
+        times = rows["timestamp"]
+        return rows[np.searchsorted(times, times[-1] - seconds, side="left"):]
+
+    # Derived statistics
+
+    @staticmethod
+    def tcp_speed(rows):
+        """Linear TCP speed (mm/s) per row"""
+        if "TCP_speed_actual" in rows.dtype.names:
+            return np.linalg.norm(rows["TCP_speed_actual"][:, :3], axis=1)
+        # Fall back to differentiating the pose
+        pose = rows["tool_vector_actual"][:, :3]
+        dt = np.diff(rows["timestamp"])
+        speed = np.zeros(len(rows))
+        if len(rows) > 1:
+            speed[1:] = np.linalg.norm(np.diff(pose, axis=0), axis=1) / np.maximum(dt, 1e-9)
+        return speed
+
+    def moves(self, start=None, end=None, tolerance=0.1, speed_threshold=1.0):
+        """
+        Split the window into moves (RunningStatus runs) with statistics
+
+        Settle time is measured from the end of the move (RunningStatus
+        drops) until the pose stays within tolerance (mm) of where it comes
+        to rest and the TCP speed stays below speed_threshold (mm/s).
+
+        Returns:
+            list of dict: "start", "end", "duration", "distance",
+            "peak_speed", "settle_time" and "idle_after" (seconds until the
+            next move starts, None for the last move)
+        """
+        rows = self.window(start, end)
+        if not len(rows):
+            return []
+        times = rows["timestamp"]
+        running = rows["RunningStatus"].reshape(len(rows)) != 0
+        edges = np.diff(np.concatenate(([0], running.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)  # first row after the move
+        pose = rows["tool_vector_actual"][:, :3]
+        speed = self.tcp_speed(rows)
+
+        moves = []
+        for k, (i0, i1) in enumerate(zip(starts, ends)):
+            following = starts[k + 1] if k + 1 < len(starts) else len(rows)
+            rest = pose[following - 1]
+            # Last sample of move + rest period still away from the rest pose
+            away = ((np.linalg.norm(pose[i0:following] - rest, axis=1) > tolerance)
+                    | (speed[i0:following] > speed_threshold))
+            unsettled = np.flatnonzero(away)
+            end_time = times[min(i1, len(rows) - 1)]
+            settled_at = times[min(i0 + unsettled[-1] + 1, following - 1)] if len(unsettled) else end_time
+            path = np.linalg.norm(np.diff(pose[i0:min(i1 + 1, len(rows))], axis=0), axis=1).sum()
+            moves.append({"start": float(times[i0]),
+                          "end": float(end_time),
+                          "duration": float(end_time - times[i0]),
+                          "distance": float(path),
+                          "peak_speed": float(speed[i0:i1].max()),
+                          "settle_time": float(max(0.0, settled_at - end_time)),
+                          "idle_after": (float(times[following] - end_time)
+                                         if following < len(rows) else None)})
+        return moves
+
+    def utilization(self, start=None, end=None):
+        """Fraction of the window in which a motion was running"""
+        rows = self.window(start, end)
+        if len(rows) < 2:
+            return 0.0
+        running = rows["RunningStatus"].reshape(len(rows)) != 0
+        dt = np.diff(rows["timestamp"])
+        return float((dt * running[:-1]).sum() / dt.sum())
@@ -1,14 +1,132 @@
 import cv2
+import threading
+import time
+import numpy as np
+
+
+class FrameRingBuffer:
+    """Fixed-size buffer of the most recent (frame, timestamp) pairs"""
+
+    def __init__(self, size=4):
+        self.size = size
+        self._frames = [None] * size
+        self._timestamps = [0.0] * size
+        self._count = 0  # total frames ever written
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, frame, timestamp):
+        with self._cond:
+            slot = self._count % self.size
+            self._frames[slot] = frame
+            self._timestamps[slot] = timestamp
+            self._count += 1
+            self._cond.notify_all()
+
+    def close(self):
+        """No more frames will come: wake up and fail pending next_after calls"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def latest(self):
+        """Newest (frame, timestamp), or (None, None) before the first frame"""
+        with self._cond:
+            if self._count == 0:
+                return None, None
+            slot = (self._count - 1) % self.size
+            return self._frames[slot], self._timestamps[slot]
+
+    def next_after(self, timestamp, timeout=None):
+        """
+        Block until a frame newer than timestamp is available
+
+        Returns:
+            tuple: (frame, timestamp), or (None, None) on timeout or once
+            the buffer is closed
+        """
+        with self._cond:
+            def newer():
+                if self._count == 0:
+                    return False
+                slot = (self._count - 1) % self.size
+                return self._timestamps[slot] > timestamp
+
+            if not self._cond.wait_for(lambda: newer() or self._closed, timeout) or not newer():
+                return None, None
+            slot = (self._count - 1) % self.size
+            return self._frames[slot], self._timestamps[slot]
+
+
+class SyntheticFrameSource:
+    """
+    Stand-in for cv2.VideoCapture that replays frames at a fixed rate
+
+    Args:
+        frames: list of BGR images, cycled forever (default: one gray frame)
+        fps: frames per second delivered by read()
+    """
+
+    def __init__(self, frames=None, fps=30.0):
+        if frames is None:
+            frames = [np.full((1080, 1920, 3), 128, np.uint8)]
+        self.frames = frames
+        self.interval = 1.0 / fps
+        self._index = 0
+        self._next_time = time.monotonic()
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        delay = self._next_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_time = max(self._next_time, time.monotonic()) + self.interval
+        frame = self.frames[self._index % len(self.frames)].copy()
+        self._index += 1
+        return True, frame
+
+    def set(self, prop_id, value):
+        return False
+
+    def release(self):
+        self._opened = False
 
 
 class Camera:
-    def __init__(self, index=0):
-        self.cam = cv2.VideoCapture(index)
-        self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
-        self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
+    """
+    Args:
+        index: cv2 device index, opened here (RuntimeError if it does not open)
+        source: any object with read()/release() to use instead of a device
+        buffer_size: frames kept in streaming mode
+        max_failures: consecutive failed reads after which the streaming
+            grabber gives up and records the error
+    """
+
+    def __init__(self, index=0, source=None, buffer_size=4, max_failures=20):
+        if source is not None:
+            self.cam = source
+        else:
+            self.cam = cv2.VideoCapture(index)
+            if not self.cam.isOpened():
+                self.cam.release()
+                raise RuntimeError(f"Camera {index} could not be opened.")
+            self.cam.set(cv2.CAP_PROP_FRAME_WIDTH, 1920)
+            self.cam.set(cv2.CAP_PROP_FRAME_HEIGHT, 1080)
         # self.cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         # self.cam.set(cv2.CAP_PROP_AUTOFOCUS, 0)
 
+        # Streaming mode state
+        self.buffer = FrameRingBuffer(buffer_size)
+        self._grab_thread = None
+        self._stop_grabbing = threading.Event()
+        self.max_failures = max_failures
+        self.error = None  # why the grabber stopped, if it did
+
     def get_frame(self):
         ret, frame = self.cam.read()
         if not ret:
@@ -18,3 +136,80 @@ class Camera:
         cv2.imwrite(img_name, frame)
 
         self.cam.release()
+        return frame
+
+    def capture(self, timeout=1.0, latency=0.0):
+        """
+        Grab one frame in memory, without touching the disk
+
+        In streaming mode this waits for the first frame captured after the
+        call, otherwise it reads straight from the device. Once the grabber
+        has given up, it fails at once and self.error says why.
+
+        Args:
+            timeout: seconds to wait for the frame, on top of latency
+            latency: seconds from exposure to the frame's timestamp; frames
+                exposed before the call are skipped
+
+        Returns:
+            tuple: (frame, monotonic timestamp), or (None, None) on failure
+        """
+        if self._grab_thread is not None:
+            if self.error is not None:
+                print(self.error)
+                return None, None
+            return self.next_after(time.monotonic() + latency, timeout + latency)
+        ret, frame = self.cam.read()
+        if not ret:
+            print("failed to grab frame")
+            return None, None
+        return frame, time.monotonic()
+
+    def start(self):
+        """Keep the device open and grab continuously on a background thread"""
+        if self._grab_thread is not None:
+            return
+        self._stop_grabbing.clear()
+        if self.error is not None:
+            # The last grabber gave up and closed its buffer
+            self.buffer = FrameRingBuffer(self.buffer.size)
+            self.error = None
+        self._grab_thread = threading.Thread(target=self._grab_loop)
+        self._grab_thread.daemon = True
+        self._grab_thread.start()
+
+    def _grab_loop(self):
+        failures = 0
+        while not self._stop_grabbing.is_set():
+            ret, frame = self.cam.read()
+            timestamp = time.monotonic()
+            if ret:
+                failures = 0
+                self.buffer.put(frame, timestamp)
+                continue
+            failures += 1
+            if failures == 1:
+                print("failed to grab frame, retrying")
+            if failures >= self.max_failures:
+                self.error = f"Camera stopped after {failures} failed reads in a row."
+                print(self.error)
+                self.buffer.close()
+                return
+            # Back off: 10 ms doubling up to 0.5 s
+            self._stop_grabbing.wait(min(0.01 * 2 ** (failures - 1), 0.5))
+
+    def latest(self):
+        """Newest frame without blocking: (frame, monotonic timestamp)"""
+        return self.buffer.latest()
+
+    def next_after(self, timestamp, timeout=None):
+        """Block until a frame captured after timestamp arrives"""
+        return self.buffer.next_after(timestamp, timeout)
+
+    def stop(self):
+        """Stop the grabber thread and release the device"""
+        self._stop_grabbing.set()
+        if self._grab_thread is not None:
+            self._grab_thread.join(timeout=2.0)
+            self._grab_thread = None
+        self.cam.release()
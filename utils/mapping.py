@@ -1,5 +1,13 @@
+import cv2
 import numpy as np
 import json
+import os
+
+# Reachable robot workspace used for picking: (x_min, x_max, y_min, y_max) in mm
+ROBOT_WORKSPACE = (250, 425, -150, 125)
+
+# Cached workspace polygons, keyed by calibration file
+_roi_cache = {}
 
 
 def load_calibration(filename="calibration.json"):
@@ -8,11 +16,124 @@ def load_calibration(filename="calibration.json"):
     return np.array(data["homography"])
 
 
+def pixels_to_robot(points, H):
+    """
+    Transform an (N, 2) array of pixel (u, v) points to Robot (X, Y)
+
+    One float64 matrix multiply for the whole batch.
+
+    Returns:
+        numpy.ndarray: (N, 2) float64 robot coordinates
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    H = np.asarray(H, dtype=np.float64)
+    pr = points @ H[:, :2].T + H[:, 2]
+    # Homogeneous divide (Lesson 4, Slide 24)
+    return pr[:, :2] / pr[:, 2:3]
+
+
 def pixel_to_robot(u, v, H):
     """Transform pixel (u, v) to Robot (X, Y) using Matrix H"""
-    p = np.array([u, v, 1.0], dtype=np.float32).reshape(3, 1)
-    pr = H @ p
-    # Homogeneous divide (Lesson 4, Slide 24)
-    X = pr[0, 0] / pr[2, 0]
-    Y = pr[1, 0] / pr[2, 0]
+    X, Y = pixels_to_robot([(u, v)], H)[0]
     return X, Y
+
+
+def robot_to_pixel(x, y, H):
+    """Transform Robot (X, Y) back to pixel (u, v) using the inverse of H"""
+    pr = np.linalg.inv(H) @ np.array([x, y, 1.0])
+    return pr[0] / pr[2], pr[1] / pr[2]
+
+
+def robot_to_pixels(points, H):
+    """Transform an (N, 2) array of Robot (X, Y) points to pixel (u, v)"""
+    return pixels_to_robot(points, np.linalg.inv(H))
+
+
+def arm_footprint(tool_xy, H, tool_radius=40.0, arm_width=80.0, base_xy=(0.0, 0.0),
+                  points=16):
+    """
+    Pixel polygons the arm may cover with its tool at tool_xy
+
+    A disc around the tool (suction cup and a carried part) and a band of
+    arm_width along the links from the base to the tool, built in robot mm
+    and projected through the inverse homography. For
+    ObjectDetector.find_objects(exclude=...).
+
+    Returns:
+        list: (N, 2) int32 pixel polygons
+    """
+    tool = np.asarray(tool_xy, dtype=np.float64)[:2]
+    base = np.asarray(base_xy, dtype=np.float64)
+    angles = np.linspace(0.0, 2.0 * np.pi, points, endpoint=False)
+    disc = tool + tool_radius * np.column_stack((np.cos(angles), np.sin(angles)))
+    polygons = [disc]
+    length = np.linalg.norm(tool - base)
+    if length > 0:
+        normal = np.array([-(tool - base)[1], (tool - base)[0]]) / length * (arm_width / 2.0)
+        polygons.append(np.array([base + normal, tool + normal, tool - normal, base - normal]))
+    return [np.round(robot_to_pixels(p, H)).astype(np.int32) for p in polygons]
+
+
+def arm_covers(points, tool_xy, tool_radius=40.0, arm_width=80.0, base_xy=(0.0, 0.0)):
+    """
+    Which robot (X, Y) points lie under the arm_footprint of a tool position
+
+    Returns:
+        numpy.ndarray: (N,) bool
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    tool = np.asarray(tool_xy, dtype=np.float64)[:2]
+    base = np.asarray(base_xy, dtype=np.float64)
+    near_tool = np.linalg.norm(points - tool, axis=1) <= tool_radius
+    link = tool - base
+    t = np.clip((points - base) @ link / max(link @ link, 1e-9), 0.0, 1.0)
+    near_link = np.linalg.norm(points - (base + t[:, None] * link), axis=1) <= arm_width / 2.0
+    return near_tool | near_link
+
+
+def workspace_roi(H, workspace=ROBOT_WORKSPACE, image_size=None):
+    """
+    Pixel polygon covering the robot workspace box
+
+    A homography maps straight lines to straight lines, so mapping the four
+    corners of the box through the inverse of H gives the exact polygon.
+
+    Args:
+        H: 3x3 pixel -> robot homography
+        workspace: (x_min, x_max, y_min, y_max) in robot mm
+        image_size: optional (width, height) to clip the polygon to
+
+    Returns:
+        numpy.ndarray: (N, 2) int32 polygon in pixel coordinates (4 corners
+        unless clipping to the image adds some)
+    """
+    x_min, x_max, y_min, y_max = workspace
+    corners = [(x_min, y_min), (x_max, y_min), (x_max, y_max), (x_min, y_max)]
+    polygon = np.array([robot_to_pixel(x, y, H) for x, y in corners], np.float32)
+    if image_size is not None:
+        # Intersect with the image rectangle (clamping each corner on its
+        # own would bend the edges and cut off visible workspace)
+        width, height = image_size
+        image = np.array([(0, 0), (width - 1, 0), (width - 1, height - 1), (0, height - 1)],
+                         np.float32)
+        area, clipped = cv2.intersectConvexConvex(polygon, image)
+        if area <= 0 or clipped is None:
+            raise ValueError("The robot workspace is outside the image")
+        polygon = clipped.reshape(-1, 2)
+    return np.round(polygon).astype(np.int32)
+
+
+def load_workspace_roi(filename="calibration.json", workspace=ROBOT_WORKSPACE):
+    """Workspace polygon for a calibration file, recomputed only when the file changes"""
+    mtime = os.stat(filename).st_mtime_ns
+    key = (os.path.abspath(filename), tuple(workspace))
+    cached = _roi_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(filename, 'r') as f:
+        data = json.load(f)
+    roi = workspace_roi(np.array(data["homography"]), workspace,
+                        data.get("image_size"))
+    _roi_cache[key] = (mtime, roi)
+    return roi
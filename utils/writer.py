@@ -0,0 +1,105 @@
+"""
+Background writer for annotated detection images
+
+Annotation and image encoding run on a worker thread fed by a bounded
+queue, so robot dispatch never waits on cv2.imwrite. When the queue is full
+the oldest pending frame is dropped in favour of the newest one.
+"""
+
+import os
+import queue
+import threading
+import cv2
+
+FORMAT_EXTENSIONS = {"png": ".png", "jpg": ".jpg", "skip": None}
+
+
+def annotate(frame, detections, targets):
+    """Return a copy of frame with each detection and its robot target drawn"""
+    display_img = frame.copy()
+    for obj, (rx, ry) in zip(detections, targets):
+        u, v = obj["pixel_center"]
+        cv2.circle(display_img, (u, v), 12, (0, 255, 0), 2)
+        text = f"{obj['shape']} | X:{rx:.1f} Y:{ry:.1f}"
+        cv2.putText(display_img, text, (u+15, v-15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    return display_img
+
+
+class AsyncImageWriter:
+    """
+    Args:
+        path: output file; the extension is replaced to match fmt
+        fmt: "png", "jpg" or "skip" (annotate nothing, write nothing)
+        png_compression: PNG compression level (0-9, lower is faster)
+        jpeg_quality: JPEG quality (0-100)
+        max_queue: pending frames kept before the oldest is dropped
+
+    The writer is also a VisionPipeline sink: calling it with a pipeline
+    result queues that result for annotation.
+    """
+
+    def __init__(self, path, fmt="png", png_compression=1, jpeg_quality=90,
+                 max_queue=2):
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"Unknown image format: {fmt}")
+        self.fmt = fmt
+        self.path = None
+        if fmt != "skip":
+            self.path = os.path.splitext(path)[0] + FORMAT_EXTENSIONS[fmt]
+        if fmt == "png":
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        else:
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __call__(self, result):
+        self.submit(result["frame"], result["detections"], result["targets"])
+
+    def submit(self, frame, detections=(), targets=()):
+        """Queue a frame for annotation and writing; never blocks"""
+        if self.fmt == "skip":
+            return
+        item = (frame, list(detections), list(targets))
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                # Backpressure: drop the oldest pending frame
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                frame, detections, targets = item
+                cv2.imwrite(self.path, annotate(frame, detections, targets),
+                            self.params)
+                self.written += 1
+            except Exception as e:
+                print(f"Image writer error: {e}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Block until every queued frame has been written"""
+        self._queue.join()
+
+    def close(self, timeout=5.0):
+        """Write the pending frames and stop the worker thread"""
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)